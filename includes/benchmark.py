@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging
+import processdump, revisionprocessor, revisioncontent, processinghelper
+import rpedits, epTurtleFileWriter, epKbFileWriter, entityDataFilter, dumpgenerator
+import time, cStringIO
+
+# Class for measuring the throughput of the main parts of the processing
+# on a (decompressed) MediaWiki dump that is held in memory, e.g., one
+# written by dumpgenerator.DumpGenerator. Each benchmark is run several
+# times and the best time is reported, together with the amount of data
+# (in bytes) and the number of pages that were processed:
+#
+# 'processFile lines', 'processFile buffers': scanning the whole dump with
+# 	DumpProcessor.processFile() and the respective scanner (RPStats only).
+# 'getVal': decoding the content of the latest revision of each entity
+# 	with ProcessingHelper.getVal() (the data is the size of the content).
+# 'EPTurtleFile', 'EPKbFile': serializing the decoded latest revision of
+# 	each entity (the data is the size of the content).
+# 'RPEditCount': counting all revisions of all entities (the data is the
+# 	size of the dump), with the bot accounts of DumpGenerator as bots.
+#
+# Only the processing itself is measured; the entity processors and
+# RPEditCount are given data that was read from the dump beforehand.
+class Benchmark:
+
+	def __init__(self, data, repeat = 3):
+		self.data = data
+		self.repeat = repeat
+		self.results = [] # list of (name, seconds, bytes, pages)
+		self.benchmarks = ( ('processFile lines', self.benchmarkLines), ('processFile buffers', self.benchmarkBuffers),\
+			('getVal', self.benchmarkGetVal), ('EPTurtleFile', self.benchmarkTurtle), ('EPKbFile', self.benchmarkKb),\
+			('RPEditCount', self.benchmarkEditCount) )
+		self.pages = None
+		self.latestContents = None
+
+	# Return the names of all benchmarks.
+	def getNames(self):
+		return [name for (name, method) in self.benchmarks]
+
+	# Run the benchmarks of the given names (default: all), and return the
+	# list of results (see getResults()).
+	def run(self, names = None):
+		self.__readDump()
+		for (name, method) in self.benchmarks:
+			if names is not None and name not in names:
+				continue
+			logging.log('Running benchmark ' + name + ' ...')
+			bestTime = None
+			for i in range(self.repeat):
+				(seconds, size, pages) = method()
+				if bestTime is None or seconds < bestTime:
+					bestTime = seconds
+			logging.log(' ... best time: ' + str(round(bestTime, 3)) + ' seconds.')
+			self.results.append((name, bestTime, size, pages))
+		return self.getResults()
+
+	# Return the results of all benchmarks that have been run as a list of
+	# dictionaries that can be written as JSON.
+	def getResults(self):
+		results = []
+		for (name, seconds, size, pages) in self.results:
+			results.append({ 'name': name, 'seconds': round(seconds, 6), 'bytes': size, 'pages': pages,\
+				'mbPerSecond': round(size / 1024.0 / 1024.0 / max(seconds, 1e-9), 3),\
+				'pagesPerSecond': round(pages / max(seconds, 1e-9), 1) })
+		return results
+
+	# Write a table of the results to the given file.
+	def writeReport(self, file):
+		file.write('%-20s %9s %9s %10s\n' % ('Benchmark', 'Seconds', 'MB/s', 'Pages/s'))
+		for result in self.getResults():
+			file.write('%-20s %9.3f %9.2f %10.0f\n' % (result['name'], result['seconds'], result['mbPerSecond'], result['pagesPerSecond']))
+
+	def benchmarkLines(self):
+		return self.__benchmarkScanner('lines')
+
+	def benchmarkBuffers(self):
+		return self.__benchmarkScanner('buffers')
+
+	def __benchmarkScanner(self, scanner):
+		dp = processdump.DumpProcessor()
+		dp.setScanner(scanner)
+		dp.registerProcessor(revisionprocessor.RPStats())
+		startTime = time.time()
+		dp.processFile(cStringIO.StringIO(self.data))
+		return (time.time() - startTime, len(self.data), dp.pagecount)
+
+	def benchmarkGetVal(self):
+		contents = [(revId, revisioncontent.RevisionContent(rawText)) for (title, revId, isItem, rawText) in self.latestContents]
+		helper = processinghelper.ProcessingHelper()
+		startTime = time.time()
+		for (revId, content) in contents:
+			helper.getVal(revId, content)
+		return (time.time() - startTime, self.__getContentSize(), len(contents))
+
+	def benchmarkTurtle(self):
+		return self.__benchmarkEntityProcessor(epTurtleFileWriter.EPTurtleFile(cStringIO.StringIO(), entityDataFilter.EntityDataFilter()))
+
+	def benchmarkKb(self):
+		return self.__benchmarkEntityProcessor(epKbFileWriter.EPKbFile(cStringIO.StringIO()))
+
+	def __benchmarkEntityProcessor(self, ep):
+		entities = []
+		helper = processinghelper.ProcessingHelper()
+		for (title, revId, isItem, rawText) in self.latestContents:
+			entities.append((title, revId, isItem, helper.getVal(revId, revisioncontent.RevisionContent(rawText))))
+		startTime = time.time()
+		for (title, revId, isItem, data) in entities:
+			ep.processEntity(title, revId, isItem, data)
+		return (time.time() - startTime, self.__getContentSize(), len(entities))
+
+	def benchmarkEditCount(self):
+		rpedcount = rpedits.RPEditCount(processinghelper.ProcessingHelper(), list(dumpgenerator.DumpGenerator.BOTS))
+		startTime = time.time()
+		for (title, isItem, isNew, revisions) in self.pages:
+			rpedcount.startPageBlock(title, isItem, isNew)
+			if revisions:
+				rpedcount.processRevisionBatch(*(zip(*revisions) + [(None,) * len(revisions)]))
+			rpedcount.endPageBlock()
+		return (time.time() - startTime, len(self.data), len(self.pages))
+
+	def __getContentSize(self):
+		return sum([len(rawText) for (title, revId, isItem, rawText) in self.latestContents])
+
+	# Read the pages and revisions of the dump, and the contents of the
+	# latest revisions of all entities, as used by the benchmarks.
+	def __readDump(self):
+		if self.pages is not None:
+			return
+		logging.logMore('Reading dump for benchmarks ... ')
+		self.pages = []
+		self.latestContents = []
+		dp = processdump.DumpProcessor()
+		dp.setScanner('buffers')
+		for page in dp.iterPages(cStringIO.StringIO(self.data)):
+			revisions = []
+			latest = None
+			for (revId, timestamp, user, isIp, rawContent) in page:
+				revisions.append((revId, timestamp, user, isIp))
+				if latest is None or int(revId) > int(latest[0]):
+					latest = (revId, rawContent)
+			self.pages.append((page.title, page.isItem, page.isNew, revisions))
+			if latest is not None and page.isNew:
+				self.latestContents.append((page.title, int(latest[0]), page.isItem, latest[1].getRawText()))
+		logging.log('found ' + str(len(self.pages)) + ' pages.')
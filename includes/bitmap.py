@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import array, bisect
+
+# Class for a set of non-negative integer ids, used like a bit array that
+# grows as needed: bitmap[id] = True marks an id and bitmap[id] tells if
+# it is marked.
+#
+# The ids are split into chunks of 2^16 ids by their upper bits (similar
+# to "roaring" bitmaps). A chunk is only allocated once it contains an id.
+# Chunks with few ids store the lower 16 bits of their ids in a sorted
+# array; once a chunk has more than SPARSE_LIMIT ids it is converted to a
+# plain bit array of 8 KB. Memory therefore depends on the ids that are
+# actually used rather than on the largest possible id.
+class ChunkedBitmap:
+
+	CHUNK_BITS = 16
+	CHUNK_MASK = (1 << CHUNK_BITS) - 1
+	SPARSE_LIMIT = 4096 # at this size, a sorted array of 16 bit values needs as much space as a bit array
+
+	def __init__(self):
+		self.chunks = {}
+
+	def __getitem__(self, id):
+		chunk = self.chunks.get(id >> ChunkedBitmap.CHUNK_BITS)
+		if chunk is None:
+			return False
+		low = id & ChunkedBitmap.CHUNK_MASK
+		if type(chunk) is bytearray:
+			return chunk[low >> 3] & (1 << (low & 7)) != 0
+		else:
+			i = bisect.bisect_left(chunk, low)
+			return i < len(chunk) and chunk[i] == low
+
+	def __setitem__(self, id, value):
+		if id < 0:
+			raise IndexError('bitmap index out of range')
+		if value:
+			self.add(id)
+		else:
+			self.remove(id)
+
+	def __contains__(self, id):
+		return self.__getitem__(id)
+
+	# Mark the given id.
+	def add(self, id):
+		high = id >> ChunkedBitmap.CHUNK_BITS
+		low = id & ChunkedBitmap.CHUNK_MASK
+		chunk = self.chunks.get(high)
+		if chunk is None:
+			self.chunks[high] = array.array('H', (low,))
+		elif type(chunk) is bytearray:
+			chunk[low >> 3] |= 1 << (low & 7)
+		else:
+			i = bisect.bisect_left(chunk, low)
+			if i < len(chunk) and chunk[i] == low:
+				return
+			chunk.insert(i, low)
+			if len(chunk) > ChunkedBitmap.SPARSE_LIMIT:
+				self.chunks[high] = self.__toDense(chunk)
+
+	# Unmark the given id.
+	def remove(self, id):
+		high = id >> ChunkedBitmap.CHUNK_BITS
+		low = id & ChunkedBitmap.CHUNK_MASK
+		chunk = self.chunks.get(high)
+		if chunk is None:
+			return
+		elif type(chunk) is bytearray:
+			chunk[low >> 3] &= ~(1 << (low & 7)) & 0xFF
+		else:
+			i = bisect.bisect_left(chunk, low)
+			if i < len(chunk) and chunk[i] == low:
+				del chunk[i]
+				if not chunk:
+					del self.chunks[high]
+
+	# Return the number of marked ids.
+	def count(self):
+		total = 0
+		for chunk in self.chunks.itervalues():
+			if type(chunk) is bytearray:
+				total += sum(ChunkedBitmap.BIT_COUNTS[byte] for byte in chunk)
+			else:
+				total += len(chunk)
+		return total
+
+	# Return the approximate number of bytes used for storing the ids.
+	def getMemorySize(self):
+		size = 0
+		for chunk in self.chunks.itervalues():
+			if type(chunk) is bytearray:
+				size += len(chunk)
+			else:
+				size += len(chunk) * chunk.itemsize
+		return size
+
+	def __toDense(self, sparseChunk):
+		chunk = bytearray((ChunkedBitmap.CHUNK_MASK + 1) / 8)
+		for low in sparseChunk:
+			chunk[low >> 3] |= 1 << (low & 7)
+		return chunk
+
+ChunkedBitmap.BIT_COUNTS = [ bin(byte).count('1') for byte in range(256) ]
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os, struct, zlib, cStringIO
+
+# Block files store a dump in blocks of about BLOCK_SIZE decompressed bytes,
+# which are compressed independently with zlib. This decompresses many times
+# faster than bz2, so that processing is limited by parsing rather than by
+# decompression. Blocks only end before the <page> element of a page (or at
+# the end of the dump), so every block but the first starts with a page.
+#
+# File layout: MAGIC, the compressed blocks, one INDEX_RECORD per block
+# (offset and size of the compressed block, size of the decompressed block),
+# a TRAILER (offset of the index, number of blocks, size and modification
+# time of the dump file that was transcoded), and MAGIC again. Files are
+# written completely before they are renamed, so incomplete files do not
+# occur.
+MAGIC = 'WDABLOCKS01\n'
+INDEX_RECORD = struct.Struct('>QII')
+TRAILER = struct.Struct('>QIQd')
+
+# Decompressed size after which a block ends at the next page.
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# zlib compression level of blocks.
+COMPRESSION_LEVEL = 6
+
+# Class for reading a block file line by line, like a bz2.BZ2File, so that
+# objects of this class can be used for DumpProcessor.processFile().
+class BlockFile:
+
+	def __init__(self, filename):
+		self.filename = filename
+		self.file = open(filename, 'rb')
+		self.size = os.path.getsize(filename)
+		(self.index, self.source) = _readIndex(self.file, self.size, filename)
+		self.lines = None
+		self.chunks = None # see read()
+		self.rest = ''
+		self.startBlock = 0 # block where reading starts (see seekPosition())
+		self.skipBytes = 0 # decompressed bytes to skip in this block
+		self.position = (0, 0)
+		self.bytecount = 0 # decompressed bytes that have been returned
+
+	# Return the number of blocks of the file.
+	def getBlockCount(self):
+		return len(self.index)
+
+	# Return the decompressed data of the block with the given number.
+	# Blocks can be read in any order, e.g., to process parts of the file
+	# independently.
+	def readBlock(self, number):
+		(offset, compressedSize, size) = self.index[number]
+		self.file.seek(offset)
+		data = zlib.decompress(self.file.read(compressedSize))
+		if len(data) != size:
+			raise IOError('invalid block ' + str(number) + ' in ' + self.filename)
+		return data
+
+	def __iter__(self):
+		if self.lines is None:
+			if self.chunks is not None:
+				raise IOError('cannot read lines after reading data')
+			self.lines = self.__iterLines()
+		return self.lines
+
+	def next(self):
+		return self.__iter__().next()
+
+	# Read the next line; returns '' at the end of the file.
+	def readline(self):
+		try:
+			return self.next()
+		except StopIteration:
+			return ''
+
+	# Read at most size bytes of the decompressed data, or all remaining
+	# data if size is negative; returns '' at the end of the file. This is
+	# an alternative to reading lines and cannot be mixed with it.
+	def read(self, size = -1):
+		if self.chunks is None:
+			if self.lines is not None:
+				raise IOError('cannot read data after reading lines')
+			self.chunks = self.__iterData()
+		data = [self.rest]
+		length = len(self.rest)
+		while size < 0 or length < size:
+			try:
+				chunk = self.chunks.next()
+			except StopIteration:
+				break
+			data.append(chunk)
+			length += len(chunk)
+		data = ''.join(data)
+		if size < 0 or length <= size:
+			self.rest = ''
+		else:
+			self.rest = data[size:]
+			data = data[:size]
+		self.bytecount += len(data)
+		return data
+
+	# Return the number of decompressed bytes that have been read.
+	def tell(self):
+		return self.bytecount
+
+	# Return the position of the next line that will be read, as a pair of
+	# the number of its block and its offset in the decompressed block, or
+	# None if the file is read with read() rather than line by line.
+	def getPosition(self):
+		if self.chunks is not None:
+			return None
+		return self.position
+
+	# Continue reading at a position that was returned by getPosition(),
+	# possibly for another object of the same file. This must be called
+	# before the first line is read.
+	def seekPosition(self, position):
+		if self.lines is not None or self.chunks is not None:
+			raise IOError('cannot seek after reading has started')
+		(self.startBlock, self.skipBytes) = position
+		self.position = position
+
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+		self.lines = None
+		self.chunks = None
+
+	# Private generator for the lines of the decompressed file.
+	def __iterLines(self):
+		rest = ''
+		for number in range(self.startBlock, len(self.index)):
+			data = self.readBlock(number)
+			if number == self.startBlock and self.skipBytes > 0:
+				data = data[self.skipBytes:]
+				offset = self.skipBytes
+			else:
+				offset = 0
+			buffer = cStringIO.StringIO(rest + data)
+			offset -= len(rest)
+			rest = ''
+			for line in buffer:
+				if line.endswith('\n'):
+					offset += len(line)
+					if offset >= self.index[number][2]:
+						self.position = (number + 1, 0)
+					else:
+						self.position = (number, offset)
+					self.bytecount += len(line)
+					yield line
+				else:
+					rest = line
+		if rest:
+			self.bytecount += len(rest)
+			yield rest
+
+	# Private generator for the decompressed data, starting at the current
+	# position.
+	def __iterData(self):
+		for number in range(self.startBlock, len(self.index)):
+			data = self.readBlock(number)
+			if number == self.startBlock and self.skipBytes > 0:
+				data = data[self.skipBytes:]
+			yield data
+
+# Transcode a dump into a block file of the given name.
+#
+# input: file object of the dump (e.g., a bz2.BZ2File), read line by line
+# sourceFilename: string, path of the dump file, whose size and modification
+# 	time are recorded to recognize outdated block files (see isTranscoded())
+# filename: string, path of the block file
+def transcode(input, sourceFilename, filename):
+	sourceStat = os.stat(sourceFilename)
+	write(input, filename, (sourceStat.st_size, sourceStat.st_mtime))
+
+# Write the given lines of a dump into a block file of the given name.
+#
+# source: pair of the size and the modification time of the dump file that
+# 	the lines are from (see transcode()), if any
+def write(lines, filename, source = (0, 0)):
+	output = open(filename + '.tmp', 'wb')
+	output.write(MAGIC)
+	index = []
+	block = []
+	size = 0
+	for line in lines:
+		if size >= BLOCK_SIZE and line.startswith('  <page>'):
+			_writeBlock(output, index, block)
+			block = []
+			size = 0
+		block.append(line)
+		size += len(line)
+	if block:
+		_writeBlock(output, index, block)
+	indexOffset = output.tell()
+	for record in index:
+		output.write(INDEX_RECORD.pack(*record))
+	output.write(TRAILER.pack(indexOffset, len(index), source[0], source[1]))
+	output.write(MAGIC)
+	output.close()
+	os.rename(filename + '.tmp', filename)
+
+# Return True if the block file of the given name exists and has been
+# transcoded from the current version of the given dump file.
+def isTranscoded(filename, sourceFilename):
+	if not os.path.exists(filename) or not os.path.exists(sourceFilename):
+		return False
+	file = open(filename, 'rb')
+	try:
+		(index, source) = _readIndex(file, os.path.getsize(filename), filename)
+	except IOError:
+		return False
+	finally:
+		file.close()
+	sourceStat = os.stat(sourceFilename)
+	return source == (sourceStat.st_size, sourceStat.st_mtime)
+
+# Compress the given lines as one block, append it to the given file, and
+# add its record to the given index.
+def _writeBlock(output, index, lines):
+	data = ''.join(lines)
+	compressed = zlib.compress(data, COMPRESSION_LEVEL)
+	index.append((output.tell(), len(compressed), len(data)))
+	output.write(compressed)
+
+# Read the index of the given block file. Returns the list of index records
+# and the size and modification time of the dump file that was transcoded.
+def _readIndex(file, size, filename):
+	if size < 2 * len(MAGIC) + TRAILER.size:
+		raise IOError('not a block file: ' + filename)
+	if file.read(len(MAGIC)) != MAGIC:
+		raise IOError('not a block file: ' + filename)
+	file.seek(size - len(MAGIC) - TRAILER.size)
+	data = file.read(TRAILER.size + len(MAGIC))
+	if data[TRAILER.size:] != MAGIC:
+		raise IOError('incomplete block file: ' + filename)
+	(indexOffset, count, sourceSize, sourceTime) = TRAILER.unpack(data[:TRAILER.size])
+	file.seek(indexOffset)
+	data = file.read(count * INDEX_RECORD.size)
+	if len(data) != count * INDEX_RECORD.size:
+		raise IOError('incomplete block file: ' + filename)
+	index = [ INDEX_RECORD.unpack_from(data, i * INDEX_RECORD.size) for i in range(count) ]
+	return (index, (sourceSize, sourceTime))
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os, time, gzip
+import cPickle as pickle
+import logging
+
+# Class for saving the state of a long run through several dump files at
+# regular intervals, so that a run that was interrupted can be resumed.
+# A checkpoint records the list of files of the run, the file that is being
+# processed, the position within this file, and the state of the
+# DumpProcessor (see DumpProcessor.setCheckpoint()).
+#
+# The checkpoint is written to a new file that then replaces the old one,
+# so a crash while saving does not destroy the last checkpoint.
+class Checkpoint:
+
+	# Constructor.
+	#
+	# fileName: string, path of the file to store the checkpoint in
+	# interval: int, minimal number of seconds between two checkpoints
+	def __init__(self, fileName, interval = 900):
+		self.fileName = os.path.abspath(fileName)
+		self.interval = interval
+		self.lastTime = time.time()
+		self.fileList = None
+		self.currentFile = None
+		self.data = None
+
+	# Load the last checkpoint, if any, for a run through the given list of
+	# files. Returns True if a checkpoint for the same list of files was found.
+	def load(self, fileList):
+		self.fileList = fileList
+		if not os.path.exists(self.fileName):
+			return False
+		file = open(self.fileName, 'rb')
+		data = pickle.load(file)
+		file.close()
+		if data['fileList'] != fileList:
+			logging.log('*** Warning: ignoring checkpoint of ' + data['time'] + ', which was made for other dump files.')
+			return False
+		self.data = data
+		logging.log('Found checkpoint of ' + self.data['time'] + ' in file ' + self.data['currentFile'] + '.')
+		return True
+
+	# Return True if a checkpoint has been loaded.
+	def isResuming(self):
+		return self.data is not None
+
+	# Set the name of the file that is processed now.
+	def setCurrentFile(self, fileName):
+		self.currentFile = fileName
+
+	# Return True if enough time has passed since the last checkpoint.
+	def isDue(self):
+		return time.time() - self.lastTime >= self.interval
+
+	# Start a new interval without saving a checkpoint, e.g., if the
+	# checkpoint is saved by another process.
+	def restartInterval(self):
+		self.lastTime = time.time()
+
+	# Save a new checkpoint.
+	#
+	# position: position in the current file, as used by DumpProcessor
+	# state: state of the DumpProcessor
+	def save(self, position, state):
+		data = { 'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'fileList': self.fileList,\
+			'currentFile': self.currentFile, 'position': position, 'state': state }
+		tmpFileName = self.fileName + '.tmp'
+		file = open(tmpFileName, 'wb')
+		pickle.dump(data, file, pickle.HIGHEST_PROTOCOL)
+		file.close()
+		os.rename(tmpFileName, self.fileName)
+		self.lastTime = time.time()
+		logging.log(' ... saved checkpoint in file ' + str(self.currentFile) + '.')
+
+	# Delete the checkpoint, e.g., after the run has been completed.
+	def remove(self):
+		if os.path.exists(self.fileName):
+			os.remove(self.fileName)
+		self.data = None
+
+	# Return the position in the given file where processing should
+	# resume, or None if the file was not reached in the loaded checkpoint.
+	def getResumePosition(self, fileName):
+		if self.data is None or self.data['currentFile'] != fileName:
+			return None
+		return self.data['position']
+
+	# Return True if the given file was completely processed before the
+	# loaded checkpoint.
+	def isCompleted(self, fileName):
+		if self.data is None:
+			return False
+		return self.data['fileList'].index(fileName) < self.data['fileList'].index(self.data['currentFile'])
+
+	# Return the saved state of the DumpProcessor.
+	def getState(self):
+		return self.data['state']
+
+# Prepare an output file for a checkpoint and return the file to continue
+# writing to together with its current size. Gzip files are closed and
+# reopened for appending, so that everything up to the checkpoint is a
+# complete gzip member. Output written after the checkpoint can then be
+# cut off by truncateOutputFile() when resuming.
+def syncOutputFile(file):
+	if isinstance(file, gzip.GzipFile):
+		fileName = file.name
+		file.close()
+		return (gzip.open(fileName, 'ab'), os.path.getsize(fileName))
+	else:
+		file.flush()
+		os.fsync(file.fileno())
+		return (file, file.tell())
+
+# Drop everything that was written to an output file after the given size
+# (as returned by syncOutputFile()) and return the file to continue writing to.
+def truncateOutputFile(file, size):
+	fileName = file.name
+	isGzip = isinstance(file, gzip.GzipFile)
+	mode = file.mode
+	file.close()
+	rawFile = open(fileName, 'r+b')
+	rawFile.truncate(size)
+	rawFile.close()
+	if isGzip:
+		return gzip.open(fileName, 'ab')
+	else:
+		return open(fileName, 'a' + mode.replace('w', '').replace('a', ''))
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import bitmap, blockfile
+
+# Functions for compacting several daily dumps into one bundle, a block file
+# (see blockfile) that contains the pages of all dailies in the order in
+# which DataFetcher.processRecentDumps() processes them, newest daily first.
+#
+# Revisions that occur in a newer daily already are dropped, as are pages
+# that are not about items or properties and pages without any remaining
+# revisions. Processors therefore get the same revisions from the bundle as
+# from the dailies, only without the duplicates.
+#
+# Bundles can also keep only the latest revision with content of every
+# entity. Such bundles only serve processors that need nothing but the latest
+# revisions without a maximal timestamp (see
+# RevisionProcessor.needsLatestRevisionOnly()).
+
+# Write the bundle of the given dailies to a block file of the given name.
+# Returns a dictionary of counts of the pages and revisions that have been
+# kept and dropped.
+#
+# inputs: iterable of file objects of the dailies, newest first, read line by line
+# latestOnly: bool, if True then only the latest revision of each entity is kept
+def compact(inputs, filename, latestOnly = False):
+	counts = { 'pages': 0, 'revisions': 0, 'duplicateRevisions': 0, 'olderRevisions': 0, 'droppedPages': 0 }
+	blockfile.write(_iterBundleLines(inputs, latestOnly, counts), filename)
+	return counts
+
+# Generator for the lines of the bundle of the given dailies (see compact()).
+def _iterBundleLines(inputs, latestOnly, counts):
+	processedRevisions = bitmap.ChunkedBitmap()
+	processedEntities = set() # entities with a latest revision, if latestOnly
+	first = True
+	for input in inputs:
+		for (kind, title, lines, revisions) in _iterParts(input):
+			if kind == 'header':
+				if first:
+					for line in lines:
+						yield line
+				continue
+			if not _isEntity(title) or (latestOnly and title in processedEntities):
+				counts['droppedPages'] += 1
+				continue
+			keep = []
+			for (revId, hasContent, revisionLines) in revisions:
+				if processedRevisions[revId]:
+					counts['duplicateRevisions'] += 1
+				else:
+					processedRevisions[revId] = True
+					keep.append((revId, hasContent, revisionLines))
+			if latestOnly:
+				latest = [ revision for revision in keep if revision[1] ]
+				if latest:
+					latest = [ max(latest) ]
+					processedEntities.add(title)
+				counts['olderRevisions'] += len(keep) - len(latest)
+				keep = latest
+			if not keep:
+				counts['droppedPages'] += 1
+				continue
+			counts['pages'] += 1
+			counts['revisions'] += len(keep)
+			for line in lines[0]:
+				yield line
+			for revision in keep:
+				for line in revision[2]:
+					yield line
+			for line in lines[1]:
+				yield line
+		first = False
+	yield '</mediawiki>\n'
+
+# Generator for the parts of a dump: first a tuple ('header', None, lines,
+# None) for the lines before the first page, then a tuple ('page', title,
+# (startLines, endLines), revisions) for every page, where revisions is a
+# list of tuples (revId, hasContent, lines). The lines after the last page
+# are not returned.
+def _iterParts(input):
+	lines = []
+	title = None
+	revisions = None
+	revision = None
+	for line in input:
+		if line == '  <page>\n':
+			if revisions is None:
+				yield ('header', None, lines, None)
+			lines = [line]
+			startLines = lines
+			revisions = []
+		elif revisions is None:
+			lines.append(line)
+		elif line == '    <revision>\n':
+			revision = [0, False, [line]]
+		elif revision is not None:
+			revision[2].append(line)
+			if line == '    </revision>\n':
+				revisions.append(tuple(revision))
+				revision = None
+				lines = []
+			elif line.startswith('      <id>') and not revision[0]:
+				revision[0] = int(line[10:-6])
+			elif line.startswith('      <text '):
+				revision[1] = _hasContent(line)
+		elif line == '  </page>\n':
+			lines.append(line)
+			yield ('page', title, (startLines, lines), revisions)
+			lines = []
+			revisions = []
+		else:
+			if line.startswith('    <title>'):
+				title = line[11:-9]
+			lines.append(line)
+	if revisions is None:
+		yield ('header', None, lines, None)
+
+# Return True if the given text line of a revision, of a full or a stub
+# dump, shows that the revision has content (see DumpProcessor.scanFile()).
+def _hasContent(line):
+	if 'xml:space="preserve"' in line:
+		return line.startswith('      <text xml:space="preserve">') and line.endswith('</text>\n') and len(line) > 41
+	return ' bytes="0"' not in line and ' deleted=' not in line
+
+# Return True if the page of the given title is about an item or a property.
+def _isEntity(title):
+	return (title.startswith('Q') and not title.startswith('Qu')) or title.startswith('Property:P')
@@ -1,44 +1,74 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import os, urllib, re, gzip, bz2
+import os, re, gzip, bz2, json, shutil, sys, threading, Queue
 import logging
+import parallelbz2, blockfile, dailybundle, downloader, httppool, metadatacache
 
 # Class for fetching and managing MediaWiki dump files.
 # If can download required dumps (and daily dumps) and produce
 # a list of the relevant files for other components to process.
 # Main entry points are getNewerDailyDates(), getDailyFile(),
 # getLatestDumpFile(), and (easiest) processRecentDumps().
+#
+# All files are accessed by their paths below the data directory; the
+# working directory of the process is never changed.
 class DataFetcher:
 
 	# Constructor.
 	#
 	# offline: bool, if True then only previously downloaded dumps will be used
 	# current: bool, if True then dumps with only current versions instead of full history will be used
+	# stubs: bool, if True then stub dumps without revision texts will be used, which
+	# 	are much smaller; only for processors that need no contents (see
+	# 	processdump.DumpProcessor.setStubs())
 	#
 	# Note that "current" only affects which main dump to get, without any
 	# impact on the dailies. Processors therefore must never assume that
 	# the data contains only one (most recent) revision of each file.
-	def __init__(self, offline = False, current = False):
+	def __init__(self, offline = False, current = False, stubs = False):
 		self.basePath = os.getcwd()
+		self.dataPath = os.path.join(self.basePath, 'data')
 		self.dailies = False
 		self.newerdailies = False # Dates of dailies that are more recent than the dump
 		self.latestdump = False
 		self.maxrevid = False
 		self.stopdaily = False
 		self.offline = offline
+		self.decompressionWorkers = 1
+		self.prefetch = 0
+		self.transcode = False
+		self.useBundles = False
+		self.useLatestBundles = False
+		# All requests use keep-alive connections of one pool. Small files of
+		# the dump servers are cached (see setMetadataTTL()).
+		self.pool = httppool.ConnectionPool()
+		self.downloader = downloader.Downloader(pool = self.pool)
+		self.metadata = metadatacache.MetadataCache(os.path.join(self.dataPath, 'metadata-cache.json'), self.pool)
 		self.maxdumpdate = 'ANYTIME' # only consider dates before that time (ANYTIME sorts after all real dates)
+		self.stubs = stubs
 		# Select which main dump files to get
-		if current:
+		if stubs:
+			kind = 'current' if current else 'history'
+			self.dumpPostFix = '-stub-meta-' + kind + '.xml.gz'
+			self.dumpDirName = 'stubcurdump' if current else 'stubdump'
+			self.dumpFileName = 'stub-meta-' + kind + '.xml.gz'
+			self.dumpName = 'stub dump of current revisions' if current else 'stub dump of all revisions'
+			self.dailyFileName = 'stubs-meta-hist-incr.xml.gz'
+		elif current:
 			self.dumpPostFix = '-pages-meta-current.xml.bz2'
 			self.dumpDirName = 'curdump'
 			self.dumpFileName = 'pages-meta-current.xml.bz2'
 			self.dumpName = 'dump of current revisions'
+			self.dailyFileName = 'pages-meta-hist-incr.xml.bz2'
 		else:
 			self.dumpPostFix = '-pages-meta-history.xml.bz2'
 			self.dumpDirName = 'dump'
 			self.dumpFileName = 'pages-meta-history.xml.bz2'
 			self.dumpName = 'dump of all revisions'
+			self.dailyFileName = 'pages-meta-hist-incr.xml.bz2'
+		self.decompressedDailyFileName = os.path.splitext(self.dailyFileName)[0] # see setPrefetch()
+		self.bundleFileName = self.decompressedDailyFileName + '.blocks' # see compactDailies()
 		# Note: to find existing directories easily, the dirname
 		# must not be a prefix of any other possible dirname.
 
@@ -47,13 +77,71 @@ class DataFetcher:
 	def setMaxDumpDate(self,date):
 		self.maxdumpdate = date
 
+	# Set the number of worker processes used to decompress dump files.
+	# If more than one worker is used, the files returned by getLatestDumpFile()
+	# and getDailyFile() decompress blocks of the file in parallel. This is not
+	# used for stub dumps, which are compressed with gzip.
+	def setDecompressionWorkers(self,workers):
+		self.decompressionWorkers = workers
+
+	# Set the number of parallel connections used to download dump files
+	# (see downloader.Downloader).
+	def setDownloadWorkers(self,workers):
+		self.downloader.workers = workers
+
+	# Set the number of dailies that processRecentDumps() fetches ahead. If
+	# it is more than 0, dailies are not downloaded before processing
+	# starts. Instead, while one daily is processed, the next ones are
+	# downloaded, verified and decompressed by as many background threads.
+	# The decompressed files need some space on disk; they are removed when
+	# they have been processed.
+	def setPrefetch(self,count):
+		self.prefetch = count
+
+	# Set whether dump files are transcoded into block files after they have
+	# been downloaded (see blockfile). Block files decompress much faster
+	# than bz2 files, which pays off if the same dumps are processed several
+	# times, e.g., in offline mode. Block files that exist are always used
+	# instead of their dump files, unless the dump files have changed.
+	def setTranscode(self,transcode):
+		self.transcode = transcode
+
+	# Set whether processRecentDumps() processes bundles of dailies (see
+	# compactDailies()) instead of the dailies that they contain. Bundles
+	# that only contain the latest revisions of the entities are only used if
+	# latestOnly is True; they only work for processors that need nothing but
+	# the latest revisions (see RevisionProcessor.needsLatestRevisionOnly()).
+	def setUseBundles(self,useBundles,latestOnly=False):
+		self.useBundles = useBundles
+		self.useLatestBundles = useBundles and latestOnly
+
+	# Set the number of seconds for which cached directory listings and other
+	# files of the dump servers are used (default: 3600). Files of dumps that
+	# are complete are cached forever.
+	def setMetadataTTL(self,seconds):
+		self.metadata.ttl = seconds
+
+	# Open a bz2 or gzip (stub dumps) compressed dump file for reading lines,
+	# or a block file, or a dump file that has been decompressed before.
+	def __openDumpFile(self,fileName):
+		if fileName.endswith('.gz'):
+			return gzip.open(fileName)
+		elif fileName.endswith('.blocks'):
+			return blockfile.BlockFile(fileName)
+		elif not fileName.endswith('.bz2'):
+			return open(fileName)
+		elif self.decompressionWorkers > 1:
+			return parallelbz2.ParallelBZ2File(fileName,self.decompressionWorkers)
+		else:
+			return bz2.BZ2File(fileName)
+
 	# Find out which daily dump files are available, either locally or online.
 	def getDailyDates(self):
 		if not self.dailies:
 			self.dailies = []
 			if self.offline:
 				logging.logMore("Finding daily exports available locally ")
-				dataDirs = os.listdir("data")
+				dataDirs = os.listdir(self.dataPath) if os.path.isdir(self.dataPath) else []
 				for dirName in dataDirs:
 					if not dirName.startswith('daily'): continue
 					date = dirName[5:]
@@ -63,12 +151,13 @@ class DataFetcher:
 				self.dailies = sorted(self.dailies)
 			else:
 				logging.logMore("Finding daily exports online ")
-				for line in urllib.urlopen('http://dumps.wikimedia.org/other/incr/wikidatawiki/') :
+				for line in self.metadata.getLines('http://dumps.wikimedia.org/other/incr/wikidatawiki/') :
 					if not line.startswith('<tr><td class="n">') : continue
 					date = line[27:35]
 					if not re.match('\d\d\d\d\d\d\d\d', date) : continue
 					logging.logMore('.')
 					self.dailies.append(date)
+				self.metadata.save()
 			logging.log(" found " + str(len(self.dailies)) + " daily exports.")
 		return self.dailies
 
@@ -80,29 +169,158 @@ class DataFetcher:
 		else:
 			return self.getLatestDumpDate()
 
+	# Return a list of names for all files that processRecentDumps() processes,
+	# in the order of processing.
+	def getDumpFileList(self):
+		fileList = self.__getDailyDirNames()
+		if self.getLatestDumpDate() != '00000000':
+			fileList.append(self.dumpDirName + self.latestdump)
+		return fileList
+
 	# Convenience method to iterate over all available dump data,
 	# most recent first, using the given processor.
-	def processRecentDumps(self,dumpProcessor):
+	#
+	# checkpoint: optional checkpoint.Checkpoint object; if it has loaded a
+	# checkpoint, processing continues from there, skipping all files that
+	# were completed before. The checkpoint is removed when all files are done.
+	def processRecentDumps(self,dumpProcessor,checkpoint=None):
+		dumpProcessor.setStubs(self.stubs)
+		if checkpoint is not None:
+			dumpProcessor.setCheckpoint(checkpoint)
+			if checkpoint.isResuming():
+				dumpProcessor.restoreCheckpointState(checkpoint.getState())
+
 		if self.latestdump == '00000000':
 			logging.log('*** Warning: no latest ' + self.dumpName + ' found.\n*** Analysing dailies only now.\n*** Results might be incomplete.')
-		for daily in self.getNewerDailyDates() :
-			logging.log('Analysing daily ' + daily + ' ...')
-			try:
-				file = self.getDailyFile(daily)
-				dumpProcessor.processFile(file)
-				file.close()
-			except EOFError as e:
-				logging.log('*** Error while reading file (' + str(e) + ").\n" + '*** Try deleting the daily directory for ' + daily + ' and download a new version.')
-				file.close()
+		dirNames = []
+		for dirName in self.__getDailyDirNames() :
+			if checkpoint is not None and checkpoint.isCompleted(dirName):
+				logging.log('Skipping ' + dirName + ' (completed before the checkpoint).')
+			else:
+				dirNames.append(dirName)
+		if [ dirName for dirName in dirNames if dirName.startswith('bundle') and dirName.endswith('-latest') ]:
+			dumpProcessor.configureRevisions()
+			if not dumpProcessor.latestOnly or dumpProcessor.maxTimestamp is not None:
+				raise ValueError('bundles with only the latest revisions cannot be used, since a registered processor needs other revisions')
+		dailies = [ dirName[5:] for dirName in dirNames if dirName.startswith('daily') ]
+		if self.prefetch > 0:
+			dailyFiles = self.__iterPrefetchedDailies(dailies)
+		else:
+			dailyFiles = ( (daily, self.__getInputPath(self.__getDailyPath(daily, self.dailyFileName))) for daily in dailies )
+		try:
+			for dirName in dirNames :
+				if dirName.startswith('bundle'):
+					(name, fileName) = ('bundle ' + dirName[6:], os.path.join(self.dataPath, dirName, self.bundleFileName))
+				else:
+					(daily, fileName) = dailyFiles.next()
+					name = 'daily ' + daily
+				if fileName is None:
+					logging.log('*** Warning: ' + name + ' is not available; skipping it.')
+					continue
+				position = self.__startCheckpointFile(checkpoint,dirName)
+				logging.log('Analysing ' + name + ' ...')
+				file = self.__openDumpFile(fileName)
+				try:
+					dumpProcessor.processFile(file,position)
+				except EOFError as e:
+					logging.log('*** Error while reading file (' + str(e) + ").\n" + '*** Try deleting the directory ' + dirName + ' and download a new version.')
+				finally:
+					file.close()
+				if dirName.startswith('daily') and fileName == self.__getDailyPath(daily, self.decompressedDailyFileName):
+					os.remove(fileName) # decompressed by the prefetching
+		finally:
+			dailyFiles.close() # stops the prefetching if processing failed
 
 		# Finally also process the latest main dump:
 		if self.latestdump == '00000000':
 			logging.log('*** Warning: no latest ' + self.dumpName + ' found.')
 		else:
+			position = self.__startCheckpointFile(checkpoint,self.dumpDirName + self.latestdump)
 			logging.log('Analysing latest ' + self.dumpName + ' ' + self.getLatestDumpDate() + ' ...')
 			file = self.getLatestDumpFile()
-			dumpProcessor.processFile(file)
+			try:
+				dumpProcessor.processFile(file,position)
+			finally:
+				file.close()
+
+		if checkpoint is not None:
+			checkpoint.remove()
+
+	# Return the names of the directories of the newer dailies (see
+	# getNewerDailyDates()), in the order of processing. If bundles are used
+	# (see setUseBundles()), the directories of consecutive dailies are
+	# replaced by the directory of a bundle of them, preferring larger bundles.
+	def __getDailyDirNames(self):
+		dirNames = [ 'daily' + daily for daily in self.getNewerDailyDates() ]
+		if not self.useBundles:
+			return dirNames
+		bundles = []
+		for dirName in (os.listdir(self.dataPath) if os.path.isdir(self.dataPath) else []):
+			if not dirName.startswith('bundle'): continue
+			if dirName.endswith('-latest') and not self.useLatestBundles: continue
+			infoFileName = os.path.join(self.dataPath, dirName, self.bundleFileName + '.json')
+			if not os.path.exists(infoFileName): continue
+			file = open(infoFileName)
+			info = json.load(file)
 			file.close()
+			bundles.append((-len(info['dailies']), dirName, [ 'daily' + str(daily) for daily in info['dailies'] ]))
+		for (size, dirName, bundleDirNames) in sorted(bundles):
+			if bundleDirNames[0] not in dirNames: continue
+			start = dirNames.index(bundleDirNames[0])
+			if dirNames[start:start + len(bundleDirNames)] == bundleDirNames:
+				dirNames[start:start + len(bundleDirNames)] = [dirName]
+		return dirNames
+
+	# Compact the newer dailies (see getNewerDailyDates()) from firstDate to
+	# lastDate (both optional, formatted as YYYYMMDD) into a bundle (see
+	# dailybundle), which processRecentDumps() can use instead of these
+	# dailies (see setUseBundles()). Returns the name of the directory of the
+	# bundle, or None if there is nothing to compact.
+	#
+	# latestOnly: bool, if True then only the latest revision of each entity is kept
+	def compactDailies(self,firstDate=None,lastDate=None,latestOnly=False):
+		dailies = [ daily for daily in self.getNewerDailyDates() if (firstDate is None or daily >= firstDate) and (lastDate is None or daily <= lastDate) ]
+		if len(dailies) < 2:
+			logging.log('*** Warning: there are fewer than two dailies to compact.')
+			return None
+		for daily in dailies:
+			if self.prefetch > 0 and not self.__fetchDaily(daily): # see setPrefetch()
+				logging.log('*** Warning: daily ' + daily + ' is not available; no bundle is made.')
+				return None
+		dirName = 'bundle' + dailies[-1] + '-' + dailies[0] + ('-latest' if latestOnly else '')
+		logging.log('Compacting ' + str(len(dailies)) + ' dailies into ' + dirName + ' ...')
+		if not os.path.exists(os.path.join(self.dataPath, dirName)):
+			os.makedirs(os.path.join(self.dataPath, dirName))
+		fileName = os.path.join(self.dataPath, dirName, self.bundleFileName)
+		counts = dailybundle.compact(self.__iterDailyFiles(dailies), fileName, latestOnly)
+		file = open(fileName + '.json.tmp', 'w')
+		json.dump({ 'dailies': dailies, 'latestOnly': latestOnly, 'counts': counts }, file)
+		file.close()
+		os.rename(fileName + '.json.tmp', fileName + '.json')
+		logging.log('Bundle ' + dirName + ' has ' + str(counts['pages']) + ' pages with ' + str(counts['revisions']) + ' revisions; ' +\
+			str(counts['duplicateRevisions']) + ' duplicate and ' + str(counts['olderRevisions']) + ' older revisions were dropped.')
+		return dirName
+
+	# Generator for the opened files of the given dailies. Each file is closed
+	# when the next one is asked for.
+	def __iterDailyFiles(self,dailies):
+		for daily in dailies:
+			file = self.getDailyFile(daily)
+			try:
+				yield file
+			finally:
+				file.close()
+
+	# Tell the checkpoint (if any) which file is processed next. Returns the
+	# position where processing of the file should start (None to start at
+	# the beginning), or False if the file was done before the checkpoint.
+	def __startCheckpointFile(self,checkpoint,fileName):
+		if checkpoint is None:
+			return None
+		if checkpoint.isCompleted(fileName):
+			return False
+		checkpoint.setCurrentFile(fileName)
+		return checkpoint.getResumePosition(fileName)
 
 	# Find out when the last successful dump happened, and which is not later
 	# than self.maxdumpdate.
@@ -111,7 +329,7 @@ class DataFetcher:
 			self.latestdump = '00000000'
 			if self.offline:
 				logging.logMore('Checking for the date of the last local ' + self.dumpName + ' ')
-				dataDirs = os.listdir("data")
+				dataDirs = os.listdir(self.dataPath) if os.path.isdir(self.dataPath) else []
 				for dirName in dataDirs:
 					if not dirName.startswith(self.dumpDirName): continue
 					date = dirName[len(self.dumpDirName):]
@@ -121,20 +339,29 @@ class DataFetcher:
 						self.latestdump = date
 			else:
 				logging.logMore('Checking for the date of the last online ' + self.dumpName + ' ')
-				for line in urllib.urlopen('http://dumps.wikimedia.org/wikidatawiki/') :
+				dates = []
+				for line in self.metadata.getLines('http://dumps.wikimedia.org/wikidatawiki/') :
 					if not line.startswith('<tr><td class="n">') : continue
 					date = line[27:35]
 					if not re.match('\d\d\d\d\d\d\d\d', date) : continue
+					if date <= self.maxdumpdate:
+						dates.append(date)
+				# Check the newest dates first; older dumps need not be checked
+				for date in sorted(dates, reverse=True):
 					logging.logMore('.')
 					#logging.log("Checking dump of " + date)
 					# check if dump is finished
+					md5Source = 'http://dumps.wikimedia.org/wikidatawiki/' + date + '/wikidatawiki-' + date + '-md5sums.txt'
 					finished = False
-					for md5 in urllib.urlopen('http://dumps.wikimedia.org/wikidatawiki/' + date + '/wikidatawiki-' + date + '-md5sums.txt') :
+					for md5 in self.metadata.getLines(md5Source) :
 						if md5.endswith(self.dumpPostFix + "\n") :
 							finished = True
 							break
-					if finished and date > self.latestdump and date <= self.maxdumpdate:
+					if finished:
+						self.metadata.setPermanent(md5Source) # finished dumps do not change
 						self.latestdump = date
+						break
+				self.metadata.save()
 
 			if self.latestdump == '00000000':
 				logging.log('-- Warning: no latest ' + self.dumpName + ' found.')
@@ -142,16 +369,15 @@ class DataFetcher:
 				logging.log(' latest ' + self.dumpName + ' is ' + self.latestdump)
 		return self.latestdump
 
-	# Change to the data directory.
-	def __cdData(self):
-		self.__cdBase()
-		if not os.path.exists('data') :
-			os.makedirs('data')
-		os.chdir('data')
+	# Return the path of the directory of the latest main dump, or of the
+	# file of the given name in that directory.
+	def __getDumpPath(self,fileName = ''):
+		return os.path.join(self.dataPath, self.dumpDirName + self.latestdump, fileName)
 
-	# Change back to the base directory.
-	def __cdBase(self):
-		os.chdir(self.basePath)
+	# Return the path of the directory of the daily of the given date, or
+	# of the file of the given name in that directory.
+	def __getDailyPath(self,daily,fileName = ''):
+		return os.path.join(self.dataPath, 'daily' + daily, fileName)
 
 	# Download the latest dump file, unless it is already available locally.
 	def fetchLatestDump(self):
@@ -161,36 +387,41 @@ class DataFetcher:
 			return # give up
 		# The rest we do even in offline mode to get the latest revision id:
 
-		self.__cdData()
-		if not os.path.exists(self.dumpDirName + self.latestdump) :
-			os.makedirs(self.dumpDirName + self.latestdump)
-		os.chdir(self.dumpDirName + self.latestdump)
+		if not os.path.exists(self.__getDumpPath()) :
+			os.makedirs(self.__getDumpPath())
 
-		if not os.path.exists('site_stats.sql.gz') :
+		statsFileName = self.__getDumpPath('site_stats.sql.gz')
+		if not os.path.exists(statsFileName) :
 			logging.log('Downloading stats of the latest dump (' + self.latestdump + ') ...')
-			urllib.urlretrieve('http://dumps.wikimedia.org/wikidatawiki/' + self.latestdump + '/wikidatawiki-' + self.latestdump + '-site_stats.sql.gz', 'site_stats.sql.gz')
+			self.downloader.download('http://dumps.wikimedia.org/wikidatawiki/' + self.latestdump + '/wikidatawiki-' + self.latestdump + '-site_stats.sql.gz', statsFileName)
 		else:
 			logging.log('Stats of the latest dump (' + self.latestdump + ') found. No download needed.')
 
 		# download the latest dump if needed
-		if not os.path.exists(self.dumpFileName) :
+		fileName = self.__getDumpPath(self.dumpFileName)
+		checksum = self.__getChecksum('http://dumps.wikimedia.org/wikidatawiki/' + self.latestdump + '/wikidatawiki-' + self.latestdump + '-md5sums.txt', self.__getDumpPath(), self.dumpPostFix)
+		if os.path.exists(fileName) and not self.__verifyFile(fileName,checksum):
+			logging.log('*** Warning: the latest ' + self.dumpName + ' (' + self.latestdump + ') is corrupt (wrong checksum) and is downloaded again.')
+			os.remove(fileName)
+		if not os.path.exists(fileName) :
 			logging.log('Downloading latest ' + self.dumpName + ' ...')
-			urllib.urlretrieve('http://dumps.wikimedia.org/wikidatawiki/' + self.latestdump + '/wikidatawiki-' + self.latestdump + self.dumpPostFix, self.dumpFileName) #xxx
+			self.__download('http://dumps.wikimedia.org/wikidatawiki/' + self.latestdump + '/wikidatawiki-' + self.latestdump + self.dumpPostFix, fileName, checksum)
 		else:
 			logging.log('Latest ' + self.dumpName + ' (' + self.latestdump + ') found. No download needed.')
+		self.__transcode(fileName)
 
 		if not self.maxrevid:
-			for line in gzip.open('site_stats.sql.gz'):
+			for line in gzip.open(statsFileName):
 				if not line.startswith('INSERT INTO') : continue
 				stats = eval(line[32:-2])
 				self.maxrevid = int(stats[2])
 				break
 		logging.log('Maximal revision id of the latest ' + self.dumpName + ': ' + str(self.maxrevid))
 
-		self.__cdBase()
-
-	# Download all available daily dump files that are newer than the latest dump,
-	# but not more recent than self.maxdumpdate.
+	# Find all available daily dump files that are newer than the latest dump,
+	# but not more recent than self.maxdumpdate, and download them. If
+	# prefetching is used (see setPrefetch()), they are only downloaded
+	# when processRecentDumps() gets to them.
 	# In offline mode, this will only consider dailies for which there is a local
 	# directory already. Assuming proper donwloads happened earlier, no further
 	# download will be needed.
@@ -199,61 +430,225 @@ class DataFetcher:
 		if not self.maxrevid:
 			self.fetchLatestDump()
 
-		self.__cdData()
 		self.stopdaily = '20121026'
 		self.newerdailies = []
 		for daily in reversed(self.dailies) :
 			logging.logMore('Checking daily ' + daily + ' ... ')
-			if not os.path.exists('daily' + daily) :
-				os.makedirs('daily' + daily)
-			os.chdir('daily' + daily)
+			if not os.path.exists(self.__getDailyPath(daily)) :
+				os.makedirs(self.__getDailyPath(daily))
 
 			if daily > self.maxdumpdate:
 				logging.log('too recent to consider')
-				os.chdir('..')
 				continue
 
-			if not os.path.exists('maxrevid.txt') :
+			# the local file is kept as a cache
+			maxrevFileName = self.__getDailyPath(daily, 'maxrevid.txt')
+			if not os.path.exists(maxrevFileName) and not self.offline :
 				maxrevSource = 'http://dumps.wikimedia.org/other/incr/wikidatawiki/' + daily + '/maxrevid.txt'
-				urllib.urlretrieve(maxrevSource, 'maxrevid.txt')
+				(status, data) = self.pool.read(maxrevSource)
+				if status == 200:
+					file = open(maxrevFileName, 'w')
+					file.write(data)
+					file.close()
 			else:
 				maxrevSource = 'Local Max Rev File'
 			
 			try:
-				dailymaxrevid = int(open('maxrevid.txt').read())
-			except ValueError:
+				dailymaxrevid = int(open(maxrevFileName).read())
+			except (IOError, ValueError):
 				#This happens if a daily dump failed?
 				logging.log(maxrevSource + ' throws ValueError')
 
 			if daily < self.getLatestDumpDate() :
 				logging.log('already in latest ' + self.dumpName)
 				self.stopdaily = daily
-				os.chdir('..')
 				break
 
-			if not os.path.exists('pages-meta-hist-incr.xml.bz2') :
-				if self.offline:
-					logging.log('not downloading daily in offline mode')
-				else:
-					logging.logMore('downloading ... ')
-					if urllib.urlopen('http://dumps.wikimedia.org/other/incr/wikidatawiki/' + daily + '/status.txt').read() == 'done' :
-						urllib.urlretrieve('http://dumps.wikimedia.org/other/incr/wikidatawiki/' + daily + '/wikidatawiki-' + daily + '-pages-meta-hist-incr.xml.bz2', 'pages-meta-hist-incr.xml.bz2') #xxx
-						logging.log('done')
-						self.newerdailies.append(daily)
-					else :
-						logging.log('daily not done yet; download aborted')
-			else:
+			if os.path.exists(self.__getDailyPath(daily, self.dailyFileName)) :
 				logging.log('daily already downloaded')
+			elif self.offline:
+				logging.log('not downloading daily in offline mode')
+				continue
+			else:
+				statusSource = 'http://dumps.wikimedia.org/other/incr/wikidatawiki/' + daily + '/status.txt'
+				if self.metadata.get(statusSource) == 'done' :
+					self.metadata.setPermanent(statusSource)
+					logging.log('daily is available for download')
+				else :
+					logging.log('daily not done yet; download aborted')
+					continue
+
+			if self.prefetch > 0 or self.__fetchDaily(daily):
 				self.newerdailies.append(daily)
 
-			os.chdir('..')
+		self.metadata.save()
+
+	# Make sure that the file of the daily of the given date is available and
+	# not corrupt, downloading it if needed. Returns False if the file is
+	# corrupt in offline mode.
+	#
+	# fileDownloader: optional downloader.Downloader to use instead of
+	# self.downloader, which must not be used by two threads at once
+	def __fetchDaily(self,daily,fileDownloader=None):
+		fileName = self.__getDailyPath(daily, self.dailyFileName)
+		checksum = self.__getChecksum('http://dumps.wikimedia.org/other/incr/wikidatawiki/' + daily + '/md5sums.txt', self.__getDailyPath(daily), '-' + self.dailyFileName)
+		if os.path.exists(fileName) and not self.__verifyFile(fileName,checksum):
+			if self.offline:
+				logging.log('*** Warning: daily ' + daily + ' is corrupt (wrong checksum); not downloading it again in offline mode.')
+				return False
+			logging.log('*** Warning: daily ' + daily + ' is corrupt (wrong checksum) and is downloaded again.')
+			os.remove(fileName)
+		if not os.path.exists(fileName) :
+			logging.log('Downloading daily ' + daily + ' ...')
+			self.__download('http://dumps.wikimedia.org/other/incr/wikidatawiki/' + daily + '/wikidatawiki-' + daily + '-' + self.dailyFileName, fileName, checksum, fileDownloader)
+		self.__transcode(fileName)
+		return True
+
+	# Iterate over the given dailies, yielding the date and the name of the
+	# decompressed file or the block file of each daily (None if it is not
+	# available). The next self.prefetch dailies are fetched (see
+	# __fetchDaily()) and decompressed by background threads while the
+	# current one is processed. Block files are not decompressed.
+	# Errors of the threads are raised when the daily is reached. When the
+	# iteration ends early (e.g., since it is closed after an error in
+	# processing), the dailies that have not been started are dropped and the
+	# threads stop after their current daily.
+	def __iterPrefetchedDailies(self,dailies):
+		tasks = Queue.Queue()
+		prefetches = [ _Prefetch(daily) for daily in dailies ]
+		workers = []
+		for i in range(min(self.prefetch, len(dailies))):
+			worker = threading.Thread(target=self.__runPrefetchWorker, args=(tasks,))
+			worker.daemon = True
+			worker.start()
+			workers.append(worker)
+		try:
+			for i in range(len(prefetches)):
+				for prefetch in prefetches[i:i + self.prefetch + 1]:
+					if not prefetch.queued:
+						prefetch.queued = True
+						tasks.put(prefetch)
+				prefetch = prefetches[i]
+				while not prefetch.done.wait(1):
+					pass
+				if prefetch.error is not None:
+					raise prefetch.error[0], prefetch.error[1], prefetch.error[2]
+				yield (prefetch.daily, prefetch.fileName)
+		finally:
+			while True:
+				try:
+					tasks.get_nowait()
+				except Queue.Empty:
+					break
+			for worker in workers:
+				tasks.put(None)
+			self.metadata.save()
 
-		self.__cdBase()
+	# Fetch and decompress the dailies of the given queue of _Prefetch
+	# objects, until None is taken from the queue.
+	def __runPrefetchWorker(self,tasks):
+		fileDownloader = downloader.Downloader(self.downloader.workers, self.downloader.retries, self.pool)
+		while True:
+			prefetch = tasks.get()
+			if prefetch is None:
+				return
+			try:
+				if self.__fetchDaily(prefetch.daily, fileDownloader):
+					prefetch.fileName = self.__getInputPath(self.__getDailyPath(prefetch.daily, self.dailyFileName))
+					if not prefetch.fileName.endswith('.blocks'):
+						prefetch.fileName = self.__decompressDaily(prefetch.daily)
+			except:
+				prefetch.error = sys.exc_info()
+			prefetch.done.set()
+
+	# Decompress the file of the daily of the given date into a new file in
+	# the same directory, and return its name, or None if the file is damaged.
+	def __decompressDaily(self,daily):
+		fileName = self.__getDailyPath(daily, self.decompressedDailyFileName)
+		input = self.__openDumpFile(self.__getDailyPath(daily, self.dailyFileName))
+		output = open(fileName + '.tmp', 'wb')
+		try:
+			shutil.copyfileobj(input, output, DataFetcher.COPY_SIZE)
+		except EOFError as e:
+			logging.log('*** Error while reading file (' + str(e) + ").\n" + '*** Try deleting the daily directory for ' + daily + ' and download a new version.')
+			output.close()
+			os.remove(fileName + '.tmp')
+			return None
+		finally:
+			input.close()
+		output.close()
+		os.rename(fileName + '.tmp', fileName)
+		return fileName
+
+	# Return the path of the block file of the given dump file if it has been
+	# transcoded (see setTranscode()), and the path of the dump file otherwise.
+	def __getInputPath(self,fileName):
+		blockFileName = os.path.splitext(fileName)[0] + '.blocks'
+		if blockfile.isTranscoded(blockFileName, fileName):
+			return blockFileName
+		return fileName
+
+	# Transcode the given dump file into a block file if this is enabled
+	# (see setTranscode()) and has not been done before.
+	def __transcode(self,fileName):
+		blockFileName = os.path.splitext(fileName)[0] + '.blocks'
+		if not self.transcode or blockfile.isTranscoded(blockFileName, fileName):
+			return
+		logging.log('Transcoding ' + fileName + ' into a block file ...')
+		input = self.__openDumpFile(fileName)
+		try:
+			blockfile.transcode(input, fileName, blockFileName)
+		finally:
+			input.close()
+
+	# Return the MD5 checksum of the dump file whose name ends with the given
+	# suffix as a tuple (algorithm,hexdigest), or None if it is not known.
+	# The list of checksums of the dump is downloaded from the given URL to
+	# the file md5sums.txt in the given directory, unless this has been
+	# done before (or in offline mode). The list is only stored if it has
+	# the checksum, i.e., if the dump file is finished.
+	def __getChecksum(self,url,directory,suffix):
+		fileName = os.path.join(directory, 'md5sums.txt')
+		if not os.path.exists(fileName) and not self.offline:
+			lines = self.metadata.getLines(url)
+			if [ line for line in lines if line.rstrip().endswith(suffix) ]:
+				self.metadata.setPermanent(url)
+				file = open(fileName + '.tmp', 'w')
+				file.writelines(lines)
+				file.close()
+				os.rename(fileName + '.tmp', fileName)
+		if os.path.exists(fileName):
+			for line in open(fileName):
+				fields = line.split()
+				if len(fields) == 2 and fields[1].endswith(suffix):
+					return ('md5', fields[0])
+		return None
+
+	# Return True if the given dump file has the given checksum (see
+	# downloader.verifyFile()), or if the checksum is not known.
+	def __verifyFile(self,fileName,checksum):
+		if checksum is None:
+			return True
+		return downloader.verifyFile(fileName,checksum)
+
+	# Download the given dump file. If its checksum is wrong, it is downloaded
+	# once more before giving up.
+	#
+	# fileDownloader: optional downloader.Downloader to use instead of self.downloader
+	def __download(self,url,fileName,checksum,fileDownloader=None):
+		if fileDownloader is None:
+			fileDownloader = self.downloader
+		try:
+			fileDownloader.download(url,fileName,checksum)
+		except downloader.ChecksumError as e:
+			logging.log('*** Warning: ' + str(e) + '; downloading the file again.')
+			fileDownloader.download(url,fileName,checksum)
 
 	# Get a list of dates of dailies that are more recent than the latest full dump.
 	# The list is ordered to include the most recent dumps at the start of the list.
 	# The method ensures that all daily dumps that are included are also available
-	# locally (and it might trigger a download if not done yet).
+	# locally (and it might trigger a download if not done yet), unless
+	# prefetching is used (see setPrefetch()).
 	def getNewerDailyDates(self):
 		if not self.newerdailies:
 			self.fetchNewerDailies()
@@ -265,21 +660,22 @@ class DataFetcher:
 			logging.log('*** Error: no latest ' + self.dumpName + ' found.')
 			return None
 		else:
-			self.__cdData()
-			os.chdir(self.dumpDirName + self.latestdump)
-			file = bz2.BZ2File(self.dumpFileName)
-			self.__cdBase()
-			return file
+			return self.__openDumpFile(self.__getInputPath(self.__getDumpPath(self.dumpFileName)))
 
 	# Get a file handler for the daily dump of the given date.
 	# There is no error handling; if the file does not exist, an exception will occur.
 	def getDailyFile(self,daily):
-		self.__cdData()
-		os.chdir('daily' + daily)
-		#if not os.path.exists('pages-meta-hist-incr.xml.bz2') :
-			#logging.log('ERROR: Data for daily ' + daily + ' not available.')
-			#os.chdir('../..')
-			#return None
-		file = bz2.BZ2File('pages-meta-hist-incr.xml.bz2')
-		self.__cdBase()
-		return file
+		return self.__openDumpFile(self.__getInputPath(self.__getDailyPath(daily, self.dailyFileName)))
+
+# Size of the buffer used to decompress dailies ahead of time.
+DataFetcher.COPY_SIZE = 1024 * 1024
+
+# A daily that is fetched ahead of time by DataFetcher.
+class _Prefetch:
+
+	def __init__(self, daily):
+		self.daily = daily
+		self.queued = False
+		self.done = threading.Event()
+		self.fileName = None # name of the decompressed file
+		self.error = None # sys.exc_info() of an error, if any
@@ -1,7 +1,6 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from bitarray import bitarray
-from includes import processinghelper, database
+from includes import processinghelper, database, bitmap
 
 
 class DBCurrentAnalyzer:
@@ -14,8 +13,7 @@ class DBCurrentAnalyzer:
 		self.totalItems = 0
 		self.startTime = 0
 
-		self.processeditems = bitarray.bitarray(2**26) # about 30 M items
-		self.processeditems.setall(0)
+		self.processeditems = bitmap.ChunkedBitmap()
 
 	def close(self):
 		self.db.closeDatabase()
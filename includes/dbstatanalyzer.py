@@ -5,7 +5,7 @@ import database
 import processinghelper
 import logging
 import os,time,sys
-import bitarray
+import bitmap
 
 # Class to analyse previously created database contents for historic
 # statistics.
@@ -21,8 +21,7 @@ class DBStatAnalyzer:
 		self.totalItems = 0
 		self.startTime = 0
 
-		self.processeditems = bitarray.bitarray(2**26) # about 30 M items
-		self.processeditems.setall(0)
+		self.processeditems = bitmap.ChunkedBitmap()
 
 	def close(self):
 		self.db.closeDatabase()
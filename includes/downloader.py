@@ -0,0 +1,336 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os, re, json, time, hashlib, threading, httplib, Queue
+import logging
+import httppool
+
+# Class for downloading large files, such as dumps, over HTTP. The file is
+# split into chunks of CHUNK_SIZE bytes, which are downloaded with HTTP
+# Range requests by several worker threads at once. The chunks are written
+# into a file of the full size that is created before the download
+# (fileName + '.part'). The chunks that are complete are recorded in a
+# progress file (fileName + '.part.json'), so a download that was
+# interrupted continues with the missing chunks when it is started again.
+# Only when all chunks are complete is the file renamed to its final name,
+# so a file of that name is always complete.
+#
+# Chunks that fail (e.g., because the connection is lost) are tried again
+# up to the given number of times, waiting RETRY_DELAY seconds longer each
+# time. If a chunk still fails, download() raises an IOError, and the
+# download can be continued later.
+#
+# Files of servers that do not support Range requests are downloaded at
+# once; such downloads start from the beginning when they are continued.
+#
+# Requests are made with the given httppool.ConnectionPool, so that
+# connections are kept for the following chunks and downloads.
+#
+# If a checksum is given, it is computed while the data comes in: at once
+# for downloads in one piece, and otherwise from the chunks at the start of
+# the file that are complete, which are read back while the following
+# chunks are downloaded. A file with a wrong checksum is deleted instead of
+# renamed, and the fact that a file was verified is recorded in a file next
+# to it (see verifyFile()).
+class Downloader:
+
+	def __init__(self, workers = 4, retries = 3, pool = None):
+		self.workers = workers
+		self.retries = retries
+		self.pool = pool if pool is not None else httppool.ConnectionPool(Downloader.TIMEOUT)
+		self.lock = threading.Lock()
+		self.done = None # numbers of the chunks that are complete
+		self.error = None # the first error of a worker thread, if any
+		self.bytecount = 0
+		self.startTime = 0
+		self.lastReport = 0
+		self.hash = None # hash object for computing the checksum, if any
+		self.hashedChunks = 0 # number of chunks at the start that have been hashed
+		self.hashLock = threading.Lock()
+
+	# Download the file at the given URL to the file of the given name,
+	# continuing an earlier download if possible.
+	#
+	# checksum: optional tuple (algorithm,hexdigest), e.g., ('md5','0123...');
+	# 	raises a ChecksumError if the downloaded file does not match it
+	def download(self, url, fileName, checksum = None):
+		partName = fileName + '.part'
+		progressName = partName + '.json'
+		self.startTime = time.time()
+		self.lastReport = self.startTime
+		self.bytecount = 0
+		self.hash = hashlib.new(checksum[0]) if checksum is not None else None
+		self.hashedChunks = 0
+		(size, ranges) = self.__getSize(url)
+		if size is None or not ranges:
+			self.__downloadAll(url, partName)
+		else:
+			self.__downloadChunks(url, partName, progressName, size)
+		if os.path.exists(progressName):
+			os.remove(progressName)
+		if checksum is not None and self.hash.hexdigest() != checksum[1].lower():
+			os.remove(partName)
+			raise ChecksumError('the ' + checksum[0] + ' checksum of ' + url + ' is ' + self.hash.hexdigest() + ' instead of ' + checksum[1])
+		os.rename(partName, fileName)
+		if checksum is not None:
+			_saveVerified(fileName, checksum)
+		seconds = time.time() - self.startTime
+		logging.log('Downloaded ' + str(round(self.bytecount / 1048576.0, 2)) + ' MB in ' + str(round(seconds, 2)) + ' seconds.')
+
+	# Return the size of the file at the given URL (None if unknown), and
+	# whether the server supports Range requests for it.
+	def __getSize(self, url):
+		response = self.__open(url, 0, 0)
+		try:
+			if response.getcode() == 206:
+				match = re.match('bytes 0-0/([0-9]+)$', response.getheader('Content-Range', ''))
+				if match is not None:
+					response.read() # keep the connection
+					return (int(match.group(1)), True)
+			length = response.getheader('Content-Length')
+			if length is not None and response.getcode() == 200:
+				return (int(length), False)
+			if response.getcode() not in (200, 416): # 416: empty file
+				raise IOError('unexpected response ' + str(response.getcode()) + ' for ' + url)
+			return (None, False)
+		finally:
+			response.close()
+
+	# Open the given URL, asking for the given range of bytes (inclusive)
+	# if start is not None.
+	def __open(self, url, start = None, end = None):
+		if start is None:
+			return self.pool.open(url)
+		return self.pool.open(url, { 'Range': 'bytes=' + str(start) + '-' + str(end) })
+
+	# Download the whole file at once, if Range requests cannot be used.
+	def __downloadAll(self, url, partName):
+		response = self.__open(url)
+		try:
+			if response.getcode() != 200:
+				raise IOError('unexpected response ' + str(response.getcode()) + ' for ' + url)
+			file = open(partName, 'wb')
+			try:
+				self.__copy(response, file, None, self.hash)
+			finally:
+				file.close()
+		finally:
+			response.close()
+
+	# Download the chunks of the file that are missing in the progress
+	# file with the worker threads.
+	def __downloadChunks(self, url, partName, progressName, size):
+		chunkCount = (size + Downloader.CHUNK_SIZE - 1) / Downloader.CHUNK_SIZE
+		self.done = self.__loadProgress(progressName, url, size)
+		if self.done is None or not os.path.exists(partName) or os.path.getsize(partName) != size:
+			self.done = set()
+			file = open(partName, 'wb')
+			file.truncate(size)
+			file.close()
+			self.__saveProgress(progressName, url, size)
+		elif self.done:
+			logging.log('Continuing download of ' + url + ' (' + str(len(self.done)) + ' of ' + str(chunkCount) + ' chunks done before).')
+
+		chunks = Queue.Queue()
+		for chunk in range(chunkCount):
+			if chunk not in self.done:
+				chunks.put(chunk)
+		self.error = None
+		threads = []
+		for i in range(min(self.workers, chunks.qsize())):
+			thread = threading.Thread(target = self.__runWorker, args = (url, partName, progressName, size, chunks))
+			thread.daemon = True
+			thread.start()
+			threads.append(thread)
+		for thread in threads:
+			while thread.is_alive():
+				thread.join(1) # do not block KeyboardInterrupt
+		if self.error is not None:
+			raise IOError('download of ' + url + ' failed, it can be continued later: ' + str(self.error))
+		if len(self.done) != chunkCount: # a worker thread ended unexpectedly
+			raise IOError('download of ' + url + ' is incomplete, it can be continued later')
+		self.__hashChunks(partName, size, True)
+
+	# Add the chunks at the start of the file that are complete and have not
+	# been hashed yet to the checksum. Only one thread does this at a time;
+	# the others go on downloading, unless wait is True.
+	def __hashChunks(self, partName, size, wait):
+		if self.hash is None or not self.hashLock.acquire(wait):
+			return
+		try:
+			file = None
+			while self.hashedChunks in self.done:
+				if file is None:
+					file = open(partName, 'rb')
+				start = self.hashedChunks * Downloader.CHUNK_SIZE
+				remaining = min(Downloader.CHUNK_SIZE, size - start)
+				file.seek(start)
+				while remaining > 0:
+					data = file.read(min(Downloader.READ_SIZE, remaining))
+					if not data:
+						raise IOError('unexpected end of file ' + partName)
+					self.hash.update(data)
+					remaining -= len(data)
+				self.hashedChunks += 1
+			if file is not None:
+				file.close()
+		finally:
+			self.hashLock.release()
+
+	# Download chunks from the given queue until it is empty or a chunk has failed.
+	def __runWorker(self, url, partName, progressName, size, chunks):
+		file = open(partName, 'r+b')
+		try:
+			while self.error is None:
+				try:
+					chunk = chunks.get_nowait()
+				except Queue.Empty:
+					break
+				start = chunk * Downloader.CHUNK_SIZE
+				end = min(start + Downloader.CHUNK_SIZE, size) - 1
+				attempt = 0
+				while True:
+					try:
+						self.__downloadChunk(url, file, start, end)
+						break
+					except (EnvironmentError, httplib.HTTPException) as e:
+						attempt += 1
+						if attempt > self.retries or self.error is not None:
+							with self.lock:
+								if self.error is None:
+									self.error = e
+							return
+						logging.log('*** Warning: download of bytes ' + str(start) + '-' + str(end) + ' failed (' + str(e) + '), trying again.')
+						time.sleep(Downloader.RETRY_DELAY * attempt)
+				file.flush()
+				os.fsync(file.fileno())
+				with self.lock:
+					self.done.add(chunk)
+					self.__saveProgress(progressName, url, size)
+				self.__hashChunks(partName, size, False)
+		finally:
+			file.close()
+
+	# Download the given range of bytes (inclusive) into the given file.
+	def __downloadChunk(self, url, file, start, end):
+		response = self.__open(url, start, end)
+		try:
+			contentRange = response.getheader('Content-Range', '')
+			if response.getcode() != 206 or not contentRange.startswith('bytes ' + str(start) + '-' + str(end) + '/'):
+				raise IOError('unexpected response ' + str(response.getcode()) + ' ' + contentRange)
+			file.seek(start)
+			received = self.__copy(response, file, end + 1 - start)
+			if received != end + 1 - start:
+				raise IOError('received ' + str(received) + ' of ' + str(end + 1 - start) + ' bytes')
+		finally:
+			response.close()
+
+	# Copy the data of the given response into the given file, at most
+	# size bytes if size is not None, and return the number of bytes copied.
+	# The data is also added to the given hash object, if any.
+	def __copy(self, response, file, size, hash = None):
+		received = 0
+		while size is None or received < size:
+			readSize = Downloader.READ_SIZE if size is None else min(Downloader.READ_SIZE, size - received)
+			data = response.read(readSize)
+			if not data:
+				break
+			file.write(data)
+			if hash is not None:
+				hash.update(data)
+			received += len(data)
+			with self.lock:
+				self.bytecount += len(data)
+				now = time.time()
+				if now - self.lastReport >= Downloader.REPORT_INTERVAL:
+					self.lastReport = now
+					logging.log(' ... downloaded ' + str(round(self.bytecount / 1048576.0, 2)) + ' MB (' +\
+						str(round(self.bytecount / 1048576.0 / (now - self.startTime), 2)) + ' MB/s).')
+		return received
+
+	# Return the set of chunks that are complete according to the given
+	# progress file, or None if there is no progress file for this download.
+	def __loadProgress(self, progressName, url, size):
+		if not os.path.exists(progressName):
+			return None
+		file = open(progressName)
+		try:
+			progress = json.load(file)
+		except ValueError:
+			return None
+		finally:
+			file.close()
+		if progress.get('url') != url or progress.get('size') != size or progress.get('chunkSize') != Downloader.CHUNK_SIZE:
+			logging.log('*** Warning: ignoring progress of another download of ' + progressName[:-10] + '.')
+			return None
+		return set(progress['done'])
+
+	# Write the progress file. It is replaced atomically, so it is complete
+	# even if the download is interrupted.
+	def __saveProgress(self, progressName, url, size):
+		file = open(progressName + '.tmp', 'w')
+		json.dump({ 'url': url, 'size': size, 'chunkSize': Downloader.CHUNK_SIZE, 'done': sorted(self.done) }, file)
+		file.close()
+		os.rename(progressName + '.tmp', progressName)
+
+# Size of the chunks that are downloaded with one request.
+Downloader.CHUNK_SIZE = 64 * 1024 * 1024
+# Number of bytes that are read from a response at once.
+Downloader.READ_SIZE = 1024 * 1024
+# Seconds to wait for the server before a request fails.
+Downloader.TIMEOUT = 60
+# Seconds to wait before trying a failed chunk again (multiplied by the
+# number of failed attempts).
+Downloader.RETRY_DELAY = 5
+# Minimal number of seconds between two reports of the progress.
+Downloader.REPORT_INTERVAL = 60
+
+# Error raised by Downloader.download() if the checksum of a file is wrong.
+class ChecksumError(IOError):
+	pass
+
+# Return the checksum of the given file as a hexadecimal string, using
+# the given algorithm of hashlib (e.g., 'md5' or 'sha1').
+def hashFile(fileName, algorithm):
+	hash = hashlib.new(algorithm)
+	file = open(fileName, 'rb')
+	while True:
+		data = file.read(Downloader.READ_SIZE)
+		if not data:
+			break
+		hash.update(data)
+	file.close()
+	return hash.hexdigest()
+
+# Return True if the given file has the given checksum, a tuple
+# (algorithm,hexdigest). A file is only hashed if it has not been verified
+# with this checksum before: the checksum, size and modification time of
+# verified files are recorded in fileName + '.verified'.
+def verifyFile(fileName, checksum):
+	if _loadVerified(fileName) == _getVerifiedState(fileName, checksum):
+		return True
+	if hashFile(fileName, checksum[0]) != checksum[1].lower():
+		return False
+	_saveVerified(fileName, checksum)
+	return True
+
+def _getVerifiedState(fileName, checksum):
+	status = os.stat(fileName)
+	return { 'algorithm': checksum[0], 'checksum': checksum[1].lower(), 'size': status.st_size, 'mtime': status.st_mtime }
+
+def _loadVerified(fileName):
+	if not os.path.exists(fileName + '.verified'):
+		return None
+	file = open(fileName + '.verified')
+	try:
+		return json.load(file)
+	except ValueError:
+		return None
+	finally:
+		file.close()
+
+def _saveVerified(fileName, checksum):
+	file = open(fileName + '.verified.tmp', 'w')
+	json.dump(_getVerifiedState(fileName, checksum), file)
+	file.close()
+	os.rename(fileName + '.verified.tmp', fileName + '.verified')
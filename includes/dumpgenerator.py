@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import json, random, datetime, hashlib
+
+# Class for writing synthetic MediaWiki XML history dumps of Wikidata, as
+# used for testing and benchmarking without downloading real dumps. The
+# dumps contain items ('Q...'), properties ('Property:P...') and a few
+# other pages, each with the given number of revisions. The content of
+# the revisions uses the same JSON format as the real dumps, with labels,
+# descriptions, aliases, site links and statements that use all kinds of
+# snaks (all value types, 'somevalue' and 'novalue') as main snaks,
+# qualifiers and references. Each revision of an entity extends the
+# previous one, so later revisions are larger, like in real data. The
+# revisions of a page are made within a few weeks in the first half of 2013.
+#
+# The dumps only depend on the given parameters and the seed. The
+# properties that are used all have their type in the list of known
+# property types of EPTurtleFile, so that processing needs no network.
+class DumpGenerator:
+
+	def __init__(self, pages = 1000, revisionsPerPage = 3, seed = 0):
+		self.pages = pages
+		self.revisionsPerPage = revisionsPerPage
+		self.seed = seed
+
+	# Write the dump to the given file (opened for writing). If stubs is True,
+	# a stub dump is written, where the text of each revision only gives its
+	# id and size, as in stub-meta-history.xml.gz.
+	def writeDump(self, file, stubs = False):
+		file.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.8/" version="0.8" xml:lang="en">\n')
+		file.write('  <siteinfo>\n    <sitename>Wikidata</sitename>\n    <base>http://www.wikidata.org/wiki/Main_Page</base>\n')
+		file.write('    <generator>MediaWiki 1.22wmf3</generator>\n    <case>first-letter</case>\n  </siteinfo>\n')
+		for (pageId, title, namespace, revisions) in self.__makePages():
+			file.write('  <page>\n    <title>' + title + '</title>\n    <ns>' + str(namespace) + '</ns>\n    <id>' + str(pageId) + '</id>\n')
+			for (revId, parentId, timestamp, contributor, content, sha1) in revisions:
+				if isinstance(content, dict):
+					text = json.dumps(content, separators = (',', ':'))
+				else:
+					text = content.encode('utf-8')
+				file.write('    <revision>\n      <id>' + str(revId) + '</id>\n')
+				if parentId is not None:
+					file.write('      <parentid>' + str(parentId) + '</parentid>\n')
+				file.write('      <timestamp>' + timestamp + '</timestamp>\n      <contributor>\n' + contributor + '      </contributor>\n')
+				file.write('      <comment>/* wbeditentity-update:0| */</comment>\n')
+				if stubs:
+					file.write('      <text id="' + str(revId) + '" bytes="' + str(len(text)) + '" />\n')
+				else:
+					file.write('      <text xml:space="preserve">' + text.replace('"', '&quot;') + '</text>\n')
+				file.write('      <sha1>' + sha1 + '</sha1>\n')
+				file.write('      <model>wikibase-item</model>\n      <format>application/json</format>\n    </revision>\n')
+			file.write('  </page>\n')
+		file.write('</mediawiki>\n')
+
+	# Write the latest revisions of all items and properties of the dump
+	# to the given file in the format of the Wikidata JSON dumps, with one
+	# entity per line (see processjsondump.JsonDumpProcessor).
+	def writeJsonDump(self, file):
+		file.write('[\n')
+		first = True
+		for (pageId, title, namespace, revisions) in self.__makePages():
+			if namespace not in (0, 120):
+				continue
+			(revId, parentId, timestamp, contributor, content, sha1) = revisions[-1]
+			if not first:
+				file.write(',\n')
+			first = False
+			file.write(json.dumps(self.__makeJsonEntity(content, revId), separators = (',', ':')))
+		file.write('\n]\n')
+
+	# Generator for all pages of the dump as tuples (pageId,title,namespace,revisions),
+	# where each revision is a tuple (revId,parentId,timestamp,contributor,content,sha1)
+	# with the contributor as XML and the content as data or text.
+	def __makePages(self):
+		self.random = random.Random(self.seed)
+		revId = 1000
+		for pageId in range(1, self.pages + 1):
+			if pageId % 10 == 0:
+				(title, namespace, makeContent) = ('Wikidata:Project chat/Archive/' + str(pageId), 4, self.__makeDiscussion)
+			elif pageId % 10 == 5:
+				(title, namespace, makeContent) = ('Property:P' + str(pageId), 120, self.__makeProperty)
+			else:
+				(title, namespace, makeContent) = ('Q' + str(pageId), 0, self.__makeItem)
+			revisions = []
+			content = None
+			# pages are created in the first half of 2013 and edited every few days:
+			time = datetime.datetime(2013, 1, 1) + datetime.timedelta(seconds = self.random.randint(0, 180 * 86400))
+			for revision in range(self.revisionsPerPage):
+				content = makeContent(pageId, revision, content)
+				revId += 1
+				if revision > 0:
+					time += datetime.timedelta(seconds = self.random.randint(60, 14 * 86400))
+				user = self.random.randint(0, 99)
+				if user < 20:
+					contributor = '        <ip>10.0.' + str(user) + '.' + str(self.random.randint(1, 254)) + '</ip>\n'
+				elif user < 60:
+					contributor = '        <username>' + DumpGenerator.BOTS[user % len(DumpGenerator.BOTS)] + '</username>\n        <id>' + str(user) + '</id>\n'
+				else:
+					contributor = '        <username>User ' + str(user) + '</username>\n        <id>' + str(user) + '</id>\n'
+				revisions.append((revId, revId - 1 if revision > 0 else None, time.strftime('%Y-%m-%dT%H:%M:%SZ'), contributor,\
+					content, '%031x' % self.random.getrandbits(124)))
+			yield (pageId, title, namespace, revisions)
+
+	def __makeItem(self, pageId, revision, previous):
+		if previous is None:
+			data = { 'label': {}, 'description': {}, 'aliases': {}, 'links': {}, 'entity': 'q' + str(pageId), 'claims': [] }
+		else:
+			data = json.loads(json.dumps(previous)) # deep copy
+		for language in DumpGenerator.LANGUAGES[:2 + 2 * revision]:
+			data['label'][language] = self.__makeText(language + ' label of Q' + str(pageId), 3)
+			data['description'][language] = self.__makeText('description', 12)
+		for language in DumpGenerator.LANGUAGES[:revision + 1]:
+			data['aliases'][language] = [self.__makeText('alias', 2) for i in range(self.random.randint(1, 3))]
+		for site in DumpGenerator.SITES[:2 + 2 * revision]:
+			data['links'][site] = self.__makeText('Article', 3)
+		for i in range(self.random.randint(2, 6)):
+			data['claims'].append(self.__makeStatement(pageId, len(data['claims'])))
+		data['claims'].sort(key = lambda statement: statement['m'][1])
+		return data
+
+	def __makeProperty(self, pageId, revision, previous):
+		data = self.__makeItem(pageId, revision, previous)
+		data['entity'] = 'p' + str(pageId)
+		if pageId in DumpGenerator.DATATYPES:
+			data['datatype'] = DumpGenerator.DATATYPES[pageId]
+		else:
+			types = sorted(set(DumpGenerator.DATATYPES.values()))
+			data['datatype'] = types[pageId % len(types)]
+		data['links'] = {}
+		return data
+
+	def __makeDiscussion(self, pageId, revision, previous):
+		if previous is None:
+			previous = u'== Discussion ' + str(pageId) + ' ==\n'
+		return previous + '* ' + self.__makeText('comment', 20) + ' ~~~~\n'
+
+	def __makeStatement(self, pageId, number):
+		statement = { 'm': self.__makeSnak(), 'q': [], 'g': 'q' + str(pageId) + '$' + '%08X-%04X' % (self.random.getrandbits(32), number), 'rank': 1, 'refs': [] }
+		for i in range(self.random.choice((0, 0, 1, 2))):
+			statement['q'].append(self.__makeSnak())
+		for i in range(self.random.choice((0, 1, 1, 2))):
+			statement['refs'].append([self.__makeSnak() for j in range(self.random.randint(1, 2))])
+		# snaks of the same property are grouped, as in the data model
+		statement['q'].sort(key = lambda snak: snak[1])
+		for reference in statement['refs']:
+			reference.sort(key = lambda snak: snak[1])
+		return statement
+
+	# Return the given data of an entity (as in the XML dumps) in the format
+	# of the JSON dumps.
+	def __makeJsonEntity(self, data, revId):
+		entityId = data['entity'].upper()
+		entity = { 'id': entityId, 'type': 'item' if 'datatype' not in data else 'property', 'lastrevid': revId,\
+			'labels': self.__makeJsonValues(data['label']), 'descriptions': self.__makeJsonValues(data['description']),\
+			'aliases': dict([ (language, [ { 'language': language, 'value': alias } for alias in aliases ]) for (language, aliases) in data['aliases'].items() ]),\
+			'claims': {} }
+		if 'datatype' in data:
+			entity['datatype'] = data['datatype']
+		else:
+			entity['sitelinks'] = dict([ (site, { 'site': site, 'title': title, 'badges': [] }) for (site, title) in data['links'].items() ])
+		for statement in data['claims']:
+			(qualifiers, qualifiersOrder) = self.__makeJsonSnaks(statement['q'])
+			jsonStatement = { 'id': statement['g'], 'type': 'statement', 'rank': ('deprecated', 'normal', 'preferred')[statement['rank']],\
+				'mainsnak': self.__makeJsonSnak(statement['m']) }
+			if qualifiers:
+				jsonStatement['qualifiers'] = qualifiers
+				jsonStatement['qualifiers-order'] = qualifiersOrder
+			if statement['refs']:
+				jsonStatement['references'] = []
+				for reference in statement['refs']:
+					(snaks, snaksOrder) = self.__makeJsonSnaks(reference)
+					# no random numbers here, so that the entities match those of writeDump()
+					referenceHash = hashlib.sha1(json.dumps(reference, sort_keys = True)).hexdigest()
+					jsonStatement['references'].append({ 'hash': referenceHash, 'snaks': snaks, 'snaks-order': snaksOrder })
+			entity['claims'].setdefault('P' + str(statement['m'][1]), []).append(jsonStatement)
+		return entity
+
+	def __makeJsonValues(self, values):
+		if not values:
+			return [] # empty objects are lists in the JSON dumps
+		return dict([ (key, { 'language': key, 'value': value }) for (key, value) in values.items() ])
+
+	def __makeJsonSnaks(self, snaks):
+		jsonSnaks = {}
+		order = []
+		for snak in snaks:
+			propertyId = 'P' + str(snak[1])
+			if propertyId not in jsonSnaks:
+				jsonSnaks[propertyId] = []
+				order.append(propertyId)
+			jsonSnaks[propertyId].append(self.__makeJsonSnak(snak))
+		return (jsonSnaks, order)
+
+	def __makeJsonSnak(self, snak):
+		jsonSnak = { 'snaktype': snak[0], 'property': 'P' + str(snak[1]), 'datatype': DumpGenerator.DATATYPES[snak[1]] }
+		if snak[0] == 'value':
+			value = snak[3]
+			if snak[2] == 'time': # years have no leading zeros in JSON dumps
+				value = dict(value)
+				value['time'] = value['time'][0] + value['time'][1:].lstrip('0')
+			jsonSnak['datavalue'] = { 'value': value, 'type': snak[2] }
+		return jsonSnak
+
+	def __makeSnak(self):
+		kind = self.random.randint(0, 19)
+		(propertyId, valueType) = self.random.choice(DumpGenerator.PROPERTIES)
+		if kind == 0:
+			return ['somevalue', propertyId]
+		elif kind == 1:
+			return ['novalue', propertyId]
+		elif valueType == 'wikibase-entityid':
+			value = { 'entity-type': 'item', 'numeric-id': self.random.randint(1, self.pages) }
+		elif valueType == 'string':
+			value = self.__makeText('Value', 2)
+		elif valueType == 'time':
+			value = { 'time': '+0000000%04d-%02d-%02dT00:00:00Z' % (self.random.randint(1000, 2013), self.random.randint(1, 12), self.random.randint(1, 28)),\
+				'timezone': 0, 'before': 0, 'after': 0, 'precision': self.random.choice((9, 10, 11)),\
+				'calendarmodel': 'http://www.wikidata.org/entity/Q1985727' }
+		elif valueType == 'globecoordinate':
+			value = { 'latitude': round(self.random.uniform(-90, 90), 4), 'longitude': round(self.random.uniform(-180, 180), 4),\
+				'altitude': None, 'precision': 0.0001, 'globe': 'http://www.wikidata.org/entity/Q2' }
+		else: # 'quantity'
+			amount = self.random.randint(0, 1000000)
+			value = { 'amount': '+' + str(amount), 'unit': '1', 'upperBound': '+' + str(amount + 1), 'lowerBound': '+' + str(amount - 1) }
+		return ['value', propertyId, valueType, value]
+
+	# Return a text of the given number of words, starting with the given
+	# word. Some words contain non-ASCII characters.
+	def __makeText(self, start, words):
+		return ' '.join([start] + [self.random.choice(DumpGenerator.WORDS) for i in range(words - 1)])
+
+# Bot accounts that make most edits (other users and IPs make the rest):
+DumpGenerator.BOTS = ('ClaimBot', 'LabelBot', 'SitelinkBot', 'ImportBot', 'MergeBot')
+# Languages and sites used for labels etc. and site links:
+DumpGenerator.LANGUAGES = ('en', 'de', 'fr', 'es', 'it', 'nl', 'ru', 'ja')
+DumpGenerator.SITES = ('enwiki', 'dewiki', 'frwiki', 'eswiki', 'itwiki', 'nlwiki', 'commonswiki', 'enwikivoyage')
+# Properties used in snaks, with the type of their values:
+DumpGenerator.PROPERTIES = ((31, 'wikibase-entityid'), (143, 'wikibase-entityid'), (214, 'string'), (18, 'string'),\
+	(856, 'string'), (569, 'time'), (580, 'time'), (625, 'globecoordinate'), (1082, 'quantity'))
+# Property types of these properties (as in the list of known types of EPTurtleFile):
+DumpGenerator.DATATYPES = { 31: 'wikibase-item', 143: 'wikibase-item', 214: 'string', 18: 'commonsMedia',\
+	856: 'url', 569: 'time', 580: 'time', 625: 'globe-coordinate', 1082: 'quantity' }
+DumpGenerator.WORDS = (u'data', u'wiki', u'river', u'city', u'Stra\xdfe', u'caf\xe9', u'東京', u'Москва', u'person', u'book')
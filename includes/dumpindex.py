@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os, struct, mmap, time
+import logging
+import parallelbz2
+
+# Class for accessing the pages of single entities in a bz2 compressed
+# MediaWiki dump without reading the whole dump. This requires an index
+# file that is created once for the dump with buildIndex().
+#
+# The index file stores one record for every page of a Wikidata item or
+# property: the kind of entity ('Q' or 'P'), its numeric id, the bit offset
+# of the compressed bz2 block that contains the start of the page, and the
+# offset of the <page> element in the decompressed data of this block.
+# Records are sorted by entity, so entities are found by binary search.
+class DumpIndex:
+
+	MAGIC = 'WDAPAGEIDX1\n'
+	RECORD = struct.Struct('>cIQI') # big-endian, so records sort like their entities
+
+	def __init__(self, indexFileName):
+		self.indexFile = open(indexFileName, 'rb')
+		self.data = mmap.mmap(self.indexFile.fileno(), 0, access=mmap.ACCESS_READ)
+		if self.data[:len(DumpIndex.MAGIC)] != DumpIndex.MAGIC:
+			raise IOError('not a page index file: ' + indexFileName)
+		self.count = (len(self.data) - len(DumpIndex.MAGIC)) / DumpIndex.RECORD.size
+
+	def close(self):
+		self.data.close()
+		self.indexFile.close()
+
+	# Return the number of pages in the index.
+	def getPageCount(self):
+		return self.count
+
+	# Return the position of the page of the given entity, given by a title
+	# such as 'Q42', 'P31' or 'Property:P31', or None if it is not indexed.
+	# The position can be read with parallelbz2.BZ2BlockReader.
+	def getPosition(self, title):
+		key = _getEntityKey(title)
+		if key is None:
+			return None
+		keyData = DumpIndex.RECORD.pack(key[0], key[1], 0, 0)[:5]
+		low = 0
+		high = self.count
+		while low < high:
+			middle = (low + high) / 2
+			start = len(DumpIndex.MAGIC) + middle * DumpIndex.RECORD.size
+			recordKey = self.data[start:start + 5]
+			if recordKey < keyData:
+				low = middle + 1
+			elif recordKey > keyData:
+				high = middle
+			else:
+				record = DumpIndex.RECORD.unpack(self.data[start:start + DumpIndex.RECORD.size])
+				return (record[2], record[3])
+		return None
+
+	# Process the pages of the given entities in the dump with the given
+	# DumpProcessor. Pages are read in the order of the dump, so that pages
+	# in the same block are decompressed only once.
+	def processPages(self, dumpFileName, titles, dumpProcessor):
+		positions = set()
+		for title in titles:
+			position = self.getPosition(title)
+			if position is None:
+				logging.log('*** Warning: page of ' + title + ' not found in index.')
+			else:
+				positions.add(position)
+		reader = parallelbz2.BZ2BlockReader(dumpFileName)
+		dumpProcessor.processFile(self.__iterPageLines(reader, sorted(positions)))
+
+	# Generator for the lines of all pages at the given positions.
+	def __iterPageLines(self, reader, positions):
+		for position in positions:
+			for line in reader.iterLines(position):
+				yield line
+				if line == '  </page>\n':
+					break
+
+# Create an index file for the given bz2 compressed dump (see DumpIndex).
+# The dump is read with a parallelbz2.ParallelBZ2File that uses the given
+# number of worker processes.
+def buildIndex(dumpFileName, indexFileName, workers = None):
+	logging.log('Building page index for ' + dumpFileName + ' ...')
+	startTime = time.time()
+	file = parallelbz2.ParallelBZ2File(dumpFileName, workers, 1)
+	records = []
+	pagePosition = None
+	position = file.getPosition()
+	for line in file:
+		if line == '  <page>\n':
+			pagePosition = position
+		elif pagePosition is not None and line.startswith('    <title>'):
+			key = _getEntityKey(line[11:-9], True)
+			if key is not None:
+				records.append(key + pagePosition)
+			pagePosition = None
+		position = file.getPosition()
+	file.close()
+
+	records.sort()
+	tmpFileName = indexFileName + '.tmp'
+	output = open(tmpFileName, 'wb')
+	output.write(DumpIndex.MAGIC)
+	for record in records:
+		output.write(DumpIndex.RECORD.pack(*record))
+	output.close()
+	os.rename(tmpFileName, indexFileName)
+	logging.log(' ... indexed ' + str(len(records)) + ' pages in ' + str(round(time.time() - startTime, 2)) + ' seconds.')
+
+# Return the kind ('Q' or 'P') and numeric id of the entity with the given
+# page title, or None if the title does not belong to an item or property.
+# Titles from dumps must use the namespace prefix for properties.
+def _getEntityKey(title, isDumpTitle = False):
+	if title.startswith('Property:P'):
+		title = title[9:]
+	elif isDumpTitle and title.startswith('P'):
+		return None
+	if (title.startswith('Q') and not title.startswith('Qu')) or title.startswith('P'):
+		try:
+			return (title[0], int(title[1:]))
+		except ValueError:
+			return None
+	return None
@@ -85,6 +85,10 @@ class EntityDataFilter:
 		else:
 			return langCode in self.includeLanguages
 
+	# Should data in any language be included?
+	def includeAnyLanguage(self):
+		return self.includeLanguages != {}
+
 	# Should the given site be included?
 	def includeSite(self,siteId):
 		if self.includeSites == True:
@@ -92,6 +96,10 @@ class EntityDataFilter:
 		else:
 			return siteId in self.includeSites
 
+	# Should links to any site be included?
+	def includeAnySite(self):
+		return self.includeSites != {}
+
 	# Should data for the given property type be included?
 	def includePropertyType(self,propType):
 		if self.includePropertyTypes == True:
@@ -13,6 +13,12 @@ class EntityProcessor:
 	def processEntity(self,title,revision,isItem,data):
 		pass
 
+	# Return the names of the top-level fields of the data that this
+	# processor uses, or None if it may use all fields. Other fields may be
+	# missing from the data then (see ProcessingHelper.getVal()).
+	def getNeededFields(self):
+		return None
+
 	# Print information about the progress of processing.
 	# All outputs that are logged in this method should be
 	# preceded by the string '     * '.
@@ -21,4 +27,40 @@ class EntityProcessor:
 
 	# Finish processing (e.g., to add a footer and close files)
 	def close(self):
-		pass
\ No newline at end of file
+		pass
+
+	# Return True if this processor can be copied into worker processes
+	# (see RevisionProcessor.supportsParallel()). Processors that return
+	# True must implement the three methods below.
+	def supportsParallel(self):
+		return False
+
+	# Prepare for processing a batch of entities in a worker process.
+	def startParallelBatch(self):
+		pass
+
+	# Finish a batch of entities in a worker process and return the
+	# (picklable) partial results of this batch.
+	def endParallelBatch(self):
+		return None
+
+	# Merge the partial results of one batch into this processor.
+	# Batches are merged in the order of the dump.
+	def mergeParallelBatch(self,result):
+		pass
+
+	# Return True if the state of this processor can be saved in checkpoints
+	# (see RevisionProcessor.supportsCheckpoints()). Processors that return
+	# True must implement the two methods below.
+	def supportsCheckpoints(self):
+		return False
+
+	# Return the state of this processor as a picklable object,
+	# including the current size of its output files.
+	def getCheckpointState(self):
+		return None
+
+	# Restore a state returned by getCheckpointState(), discarding
+	# output that was written after the checkpoint.
+	def restoreCheckpointState(self,state):
+		pass
@@ -3,6 +3,8 @@
 
 import logging
 import entityprocessor
+import checkpoint
+import cStringIO
 
 # Entity processor that writes entity data to a file using
 # a compact syntactic format.
@@ -11,6 +13,7 @@ class EPKbFile(entityprocessor.EntityProcessor):
 	def __init__(self,outputFile):
 		self.output = outputFile
 		self.entityCount = 0
+		self.parallelFile = None # output file of the main process, kept in worker processes
 
 	def processEntity(self,title,revision,isItem,data):
 		self.entityCount += 1
@@ -56,6 +59,36 @@ class EPKbFile(entityprocessor.EntityProcessor):
 	def logReport(self):
 		logging.log('     * Serialized ' + str(self.entityCount) + ' entities using the KB format.')
 
+	def supportsParallel(self):
+		return True
+
+	# In a worker process, the output of each batch is written to a buffer.
+	# The output file inherited from the main process is kept unused, since
+	# closing it in the worker would write its buffered data once more.
+	def startParallelBatch(self):
+		if self.parallelFile is None:
+			self.parallelFile = self.output
+		self.output = cStringIO.StringIO()
+		self.entityCount = 0
+
+	def endParallelBatch(self):
+		return (self.output.getvalue(), self.entityCount)
+
+	def mergeParallelBatch(self,result):
+		self.output.write(result[0])
+		self.entityCount += result[1]
+
+	def supportsCheckpoints(self):
+		return True
+
+	def getCheckpointState(self):
+		(self.output, outputSize) = checkpoint.syncOutputFile(self.output)
+		return (outputSize, self.entityCount)
+
+	def restoreCheckpointState(self,state):
+		self.output = checkpoint.truncateOutputFile(self.output, state[0])
+		self.entityCount = state[1]
+
 	def close(self):
 		#self.output.write("\n\n ### Export completed successfully. The End. ###")
 		self.output.close()
@@ -70,6 +103,8 @@ class EPKbFile(entityprocessor.EntityProcessor):
 				return 'P' + str(snak[1]) + ' ' + str(snak[3])
 			elif snak[2] == 'globecoordinate' :
 				return 'P' + str(snak[1]) + ' ' + str(snak[3])
+			elif snak[2] == 'quantity' :
+				return 'P' + str(snak[1]) + ' ' + str(snak[3])
 			else :
 				print snak
 				exit()
@@ -5,6 +5,8 @@ import logging
 import entityprocessor
 import urllib
 import datetime
+import cStringIO
+import checkpoint
 
 # Entity processor that writes entity data to a file using
 # a compact syntactic format.
@@ -16,19 +18,10 @@ class EPTurtleFile(entityprocessor.EntityProcessor):
 		self.propertyTypes = {}
 		self.propertyDeclarationQueue = []
 		self.filterName = self.dataFilter.getHashCode()
-		# Keep some statistics (inserted at end of file):
-		self.entityCount = 0
-		self.propertyCount = 0 # number of OWL property declarations, not of Wikidata properties
-		self.propertyLookupCount = 0 # number of additional online lookups
-		self.statStatementCount = 0
-		self.statReferenceCount = 0
-		self.statStmtPropertyCounts = {}
-		self.statStmtTypeCounts = {}
-		self.statQualiPropertyCounts = {}
-		self.statQualiTypeCounts = {}
-		self.statRefPropertyCounts = {}
-		self.statRefTypeCounts = {}
-		self.statTripleCount = 0
+		self.batchProperties = None # properties used in the current batch of a worker process
+		self.parallelDeclarations = None # see __writePropertyDeclarations()
+		self.parallelFile = None # output file of the main process, kept in worker processes
+		self.__initStatistics()
 
 		# Make header:
 		self.output.write( '### Wikidata OWL/RDF Turtle dump\n' )
@@ -66,6 +59,21 @@ class EPTurtleFile(entityprocessor.EntityProcessor):
 		self.__writeTriple( "so:inLanguage", "a", "o:DatatypeProperty" )
 		self.output.write("\n")
 
+	# Keep some statistics (inserted at end of file).
+	def __initStatistics(self):
+		self.entityCount = 0
+		self.propertyCount = 0 # number of OWL property declarations, not of Wikidata properties
+		self.propertyLookupCount = 0 # number of additional online lookups
+		self.statStatementCount = 0
+		self.statReferenceCount = 0
+		self.statStmtPropertyCounts = {}
+		self.statStmtTypeCounts = {}
+		self.statQualiPropertyCounts = {}
+		self.statQualiTypeCounts = {}
+		self.statRefPropertyCounts = {}
+		self.statRefTypeCounts = {}
+		self.statTripleCount = 0
+
 	def processEntity(self,title,revision,isItem,data):
 		self.entityCount += 1
 		self.refs = {} # collect references to export duplicates only once per item
@@ -97,9 +105,10 @@ class EPTurtleFile(entityprocessor.EntityProcessor):
 				logging.log( '*** Warning: Unknown property type "' + data['datatype'] + '".'  )
 
 		# Write labels, descriptions, and aliases:
-		self.__writeLanguageLiteralValues('rs:label', data['label'])
-		self.__writeLanguageLiteralValues('so:description', data['description'])
-		self.__writeLanguageLiteralValues('sk:altLabel', data['aliases'], True)
+		if self.dataFilter.includeAnyLanguage():
+			self.__writeLanguageLiteralValues('rs:label', data['label'])
+			self.__writeLanguageLiteralValues('so:description', data['description'])
+			self.__writeLanguageLiteralValues('sk:altLabel', data['aliases'], True)
 
 		# Connect statements to item:
 		statements = []
@@ -134,42 +143,54 @@ class EPTurtleFile(entityprocessor.EntityProcessor):
 				self.__endTriples()
 
 		# Export links:
-		for sitekey in data['links'].keys() :
-			if not self.dataFilter.includeSite(sitekey):
-				continue
-			if sitekey == 'commonswiki':
-				urlPrefix = 'http://commons.wikimedia.org/wiki/'
-			elif sitekey[-10:] == 'wikivoyage':
-				urlPrefix = 'http://' + sitekey[:-10].replace('_','-') + '.wikivoyage.org/wiki/'
-			elif sitekey[-4:] == 'wiki':
-				urlPrefix = 'http://' + sitekey[:-4].replace('_','-') + '.wikipedia.org/wiki/'
-			else:
-				logging.log("*** Warning: the following sitekey was not understood: " + sitekey)
-				continue
+		if self.dataFilter.includeAnySite():
+			for sitekey in data['links'].keys() :
+				if not self.dataFilter.includeSite(sitekey):
+					continue
+				if sitekey == 'commonswiki':
+					urlPrefix = 'http://commons.wikimedia.org/wiki/'
+				elif sitekey[-10:] == 'wikivoyage':
+					urlPrefix = 'http://' + sitekey[:-10].replace('_','-') + '.wikivoyage.org/wiki/'
+				elif sitekey[-4:] == 'wiki':
+					urlPrefix = 'http://' + sitekey[:-4].replace('_','-') + '.wikipedia.org/wiki/'
+				else:
+					logging.log("*** Warning: the following sitekey was not understood: " + sitekey)
+					continue
 
-			if isinstance(data['links'][sitekey], dict) and 'name' in data['links'][sitekey].keys():  # New format (dict with 'name' (string) and 'badges' (dict))
-				articletitle = data['links'][sitekey]['name'].replace(' ','_').encode('utf-8')
-			elif isinstance(data['links'][sitekey], str) or isinstance(data['links'][sitekey], unicode): # Old format (name string)
-				# Note: "unicode" only works in Python 2, but "str" subsumes unicode in Python 3;
-				# so we should get some prototype-software level compatibility from lazy evaluation
-				articletitle = data['links'][sitekey].replace(' ','_').encode('utf-8')
-			else:
-				logging.log('*** Error: Unsupported type "' + str(type(data['links'][sitekey])) + '" format for "' + sitekey + '" (' + str(data['links'][sitekey]) + ').')
-				articletitle = "SITEKEYERROR"
+				if isinstance(data['links'][sitekey], dict) and 'name' in data['links'][sitekey].keys():  # New format (dict with 'name' (string) and 'badges' (dict))
+					articletitle = data['links'][sitekey]['name'].replace(' ','_').encode('utf-8')
+				elif isinstance(data['links'][sitekey], str) or isinstance(data['links'][sitekey], unicode): # Old format (name string)
+					# Note: "unicode" only works in Python 2, but "str" subsumes unicode in Python 3;
+					# so we should get some prototype-software level compatibility from lazy evaluation
+					articletitle = data['links'][sitekey].replace(' ','_').encode('utf-8')
+				else:
+					logging.log('*** Error: Unsupported type "' + str(type(data['links'][sitekey])) + '" format for "' + sitekey + '" (' + str(data['links'][sitekey]) + ').')
+					articletitle = "SITEKEYERROR"
 
 
-			self.__startTriples( "<" + urlPrefix + urllib.quote(articletitle) + ">", "a", "so:Article" )
-			self.__addPO( "so:about", "w:" + title )
-			if sitekey in siteLanguageCodes:
-				self.__addPO( "so:inLanguage", "\"" + siteLanguageCodes[sitekey] + "\"")
-			elif sitekey == 'commonswiki': # Commons has no uniform language; do not export
-				pass
-			else:
-				logging.log( '*** Warning: Language code unknown for site "' + sitekey + '".'  )
-			self.__endTriples()
+				self.__startTriples( "<" + urlPrefix + urllib.quote(articletitle) + ">", "a", "so:Article" )
+				self.__addPO( "so:about", "w:" + title )
+				if sitekey in siteLanguageCodes:
+					self.__addPO( "so:inLanguage", "\"" + siteLanguageCodes[sitekey] + "\"")
+				elif sitekey == 'commonswiki': # Commons has no uniform language; do not export
+					pass
+				else:
+					logging.log( '*** Warning: Language code unknown for site "' + sitekey + '".'  )
+				self.__endTriples()
 
 		self.__writePropertyDeclarations()
 
+	# Return the fields that are exported with the current data filter.
+	def getNeededFields(self):
+		fields = ['datatype']
+		if self.dataFilter.includeAnyLanguage():
+			fields += ['label','description','aliases']
+		if self.dataFilter.includeStatements():
+			fields.append('claims')
+		if self.dataFilter.includeAnySite():
+			fields.append('links')
+		return fields
+
 	def logReport(self):
 		## Dump collected types to update the cache at the end of this file (normally done only at the very end):
 		self.__knownTypesReport()
@@ -236,6 +257,78 @@ class EPTurtleFile(entityprocessor.EntityProcessor):
 
 		self.output.write('###\n')
 
+	def supportsParallel(self):
+		return True
+
+	# In a worker process, the Turtle for each batch is written to a buffer.
+	# The output file inherited from the main process is kept unused, since
+	# closing it in the worker would write its buffered data once more.
+	#
+	# Workers do not write property declarations, since only the main
+	# process knows which properties have been declared before. Instead,
+	# each batch reports the properties that it uses together with their
+	# types and the position after the entity where each of them was first
+	# used. mergeParallelBatch() then writes the declarations of the
+	# properties that are new to the main process at these positions, just
+	# like they are written when processing serially.
+	def startParallelBatch(self):
+		if self.parallelFile is None:
+			self.parallelFile = self.output
+		self.batchProperties = set()
+		self.parallelDeclarations = []
+		self.propertyDeclarationQueue = []
+		self.output = cStringIO.StringIO()
+		self.__initStatistics()
+
+	def endParallelBatch(self):
+		return (self.output.getvalue(), self.parallelDeclarations, self.__getStatistics())
+
+	def mergeParallelBatch(self,result):
+		(turtle, declarations, (counts, countDicts)) = result
+		position = 0
+		for (offset, properties) in declarations:
+			self.output.write(turtle[position:offset])
+			position = offset
+			for (propertyTitle, propertyType, declare) in properties:
+				if propertyTitle not in self.propertyTypes:
+					self.propertyTypes[propertyTitle] = propertyType
+					if declare:
+						self.propertyDeclarationQueue.append(propertyTitle)
+			self.__writePropertyDeclarations()
+		self.output.write(turtle[position:])
+
+		self.entityCount += counts[0]
+		self.propertyLookupCount += counts[2]
+		self.statStatementCount += counts[3]
+		self.statReferenceCount += counts[4]
+		self.statTripleCount += counts[5]
+
+		ownCountDicts = self.__getStatistics()[1]
+		for i in range(len(ownCountDicts)):
+			for key in countDicts[i]:
+				if key not in ownCountDicts[i]:
+					ownCountDicts[i][key] = 0
+				ownCountDicts[i][key] += countDicts[i][key]
+
+	def supportsCheckpoints(self):
+		return True
+
+	def getCheckpointState(self):
+		(self.output, outputSize) = checkpoint.syncOutputFile(self.output)
+		return (outputSize, self.propertyTypes, self.__getStatistics())
+
+	def restoreCheckpointState(self,state):
+		(outputSize, self.propertyTypes, (counts, countDicts)) = state
+		self.output = checkpoint.truncateOutputFile(self.output, outputSize)
+		(self.entityCount, self.propertyCount, self.propertyLookupCount, self.statStatementCount, self.statReferenceCount, self.statTripleCount) = counts
+		(self.statStmtPropertyCounts, self.statStmtTypeCounts, self.statQualiPropertyCounts, self.statQualiTypeCounts, self.statRefPropertyCounts, self.statRefTypeCounts) = countDicts
+
+	# Return the current statistics as a pair of a tuple of counts
+	# and a tuple of dictionaries of counts.
+	def __getStatistics(self):
+		return ((self.entityCount, self.propertyCount, self.propertyLookupCount, self.statStatementCount, self.statReferenceCount, self.statTripleCount),
+			(self.statStmtPropertyCounts, self.statStmtTypeCounts, self.statQualiPropertyCounts, self.statQualiTypeCounts, self.statRefPropertyCounts, self.statRefTypeCounts))
+
 	def close(self):
 		self.__addStatisticsComments()
 		self.output.write("\n\n### Export completed successfully. The End. ###")
@@ -246,6 +339,7 @@ class EPTurtleFile(entityprocessor.EntityProcessor):
 	def __getPropertyType(self,propertyTitle):
 		if propertyTitle not in self.propertyTypes:
 			self.propertyTypes[propertyTitle] = self.__fetchPropertyType(propertyTitle)
+		self.__recordBatchProperty(propertyTitle,False)
 		return self.propertyTypes[propertyTitle]
 
 	# Fetch current property type.
@@ -287,10 +381,28 @@ class EPTurtleFile(entityprocessor.EntityProcessor):
 			if not definite and propertyType == 'string':
 				propertyType = self.__fetchPropertyType(propertyTitle)
 			self.propertyTypes[propertyTitle] = propertyType
-			self.propertyDeclarationQueue.append(propertyTitle)
+			if self.batchProperties is None:
+				self.propertyDeclarationQueue.append(propertyTitle)
+		self.__recordBatchProperty(propertyTitle,True)
 		return self.propertyTypes[propertyTitle]
 
+	# In a worker process, record the first use of a property in the current
+	# batch, and whether it would be declared if it is new to the main
+	# process (see startParallelBatch()).
+	def __recordBatchProperty(self,propertyTitle,declare):
+		if self.batchProperties is not None and propertyTitle not in self.batchProperties:
+			self.batchProperties.add(propertyTitle)
+			self.propertyDeclarationQueue.append((propertyTitle,declare))
+
+	# Write the declarations of the properties that have been used for the
+	# first time. In a worker process, the properties are recorded together
+	# with the current position in the output instead.
 	def __writePropertyDeclarations(self):
+		if self.batchProperties is not None:
+			if self.propertyDeclarationQueue:
+				self.parallelDeclarations.append((self.output.tell(), [ (propertyTitle, self.propertyTypes[propertyTitle], declare) for (propertyTitle, declare) in self.propertyDeclarationQueue ]))
+				self.propertyDeclarationQueue = []
+			return
 		for propertyTitle in self.propertyDeclarationQueue:
 			self.__writeTriple( 'w:' + propertyTitle + "s", "a", "o:ObjectProperty" )
 			if self.__getPropertyRange(propertyTitle) == 'o:Thing':
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import socket, threading, httplib, urlparse
+
+# Class for making HTTP requests over persistent (keep-alive) connections.
+# Connections that are not in use are kept for each server, so that
+# further requests to the same server do not need a new connection. The
+# pool can be used by several threads at once; each request gets a
+# connection of its own.
+#
+# Redirects are followed. A request on a connection that was kept is sent
+# again on a new connection if the server has closed the old one.
+class ConnectionPool:
+
+	def __init__(self, timeout = 60):
+		self.timeout = timeout
+		self.idle = {} # (scheme, host, port) -> list of idle connections
+		self.lock = threading.Lock()
+		self.connectionCount = 0 # number of connections that have been opened
+
+	# Send a GET request for the given URL with the given extra headers, and
+	# return the response as a PooledResponse, which must be closed when it
+	# is no longer needed. The connection is kept if the response has been
+	# read completely.
+	def open(self, url, headers = None):
+		for i in range(ConnectionPool.MAX_REDIRECTS + 1):
+			response = self.__request(url, headers or {})
+			if response.getcode() not in (301, 302, 303, 307, 308) or response.getheader('Location') is None:
+				return response
+			location = urlparse.urljoin(url, response.getheader('Location'))
+			response.read()
+			response.close()
+			url = location
+		raise IOError('too many redirects for ' + url)
+
+	# Return the status and the data of the given URL, e.g., of small files.
+	def read(self, url):
+		response = self.open(url)
+		try:
+			return (response.getcode(), response.read())
+		finally:
+			response.close()
+
+	# Close all idle connections.
+	def close(self):
+		with self.lock:
+			for connections in self.idle.itervalues():
+				for connection in connections:
+					connection.close()
+			self.idle = {}
+
+	def __request(self, url, headers):
+		parts = urlparse.urlsplit(url)
+		key = (parts.scheme, parts.hostname, parts.port)
+		path = parts.path or '/'
+		if parts.query:
+			path += '?' + parts.query
+		(connection, reused) = self.__getConnection(key)
+		try:
+			connection.request('GET', path, headers = headers)
+			response = connection.getresponse()
+		except (socket.error, httplib.HTTPException):
+			connection.close()
+			if not reused:
+				raise
+			# the server has probably closed the connection that was kept
+			(connection, reused) = self.__getConnection(key, False)
+			try:
+				connection.request('GET', path, headers = headers)
+				response = connection.getresponse()
+			except:
+				connection.close()
+				raise
+		return PooledResponse(self, key, connection, response)
+
+	# Return an idle connection to the given server, or a new one, and
+	# whether the connection has been used before.
+	def __getConnection(self, key, useIdle = True):
+		with self.lock:
+			if useIdle and self.idle.get(key):
+				return (self.idle[key].pop(), True)
+			self.connectionCount += 1
+		(scheme, host, port) = key
+		if scheme == 'https':
+			return (httplib.HTTPSConnection(host, port, timeout = self.timeout), False)
+		elif scheme == 'http':
+			return (httplib.HTTPConnection(host, port, timeout = self.timeout), False)
+		raise IOError('unsupported URL scheme: ' + str(scheme))
+
+	# Keep the given connection to the given server for later requests.
+	def release(self, key, connection):
+		with self.lock:
+			self.idle.setdefault(key, []).append(connection)
+
+# Maximal number of redirects that ConnectionPool.open() follows.
+ConnectionPool.MAX_REDIRECTS = 5
+
+# Class for the response to a request of a ConnectionPool. It can be read
+# like the responses of urllib2.urlopen().
+class PooledResponse:
+
+	def __init__(self, pool, key, connection, response):
+		self.pool = pool
+		self.key = key
+		self.connection = connection
+		self.response = response
+
+	def getcode(self):
+		return self.response.status
+
+	def getheader(self, name, default = None):
+		return self.response.getheader(name, default)
+
+	def read(self, size = None):
+		if size is None:
+			return self.response.read()
+		return self.response.read(size)
+
+	# Close the response. The connection is given back to the pool if the
+	# response has been read completely and the server keeps the connection
+	# open; otherwise it is closed.
+	def close(self):
+		if self.connection is None:
+			return
+		if self.response.isclosed() and not self.response.will_close:
+			self.pool.release(self.key, self.connection)
+		else:
+			self.connection.close()
+		self.connection = None
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os, json, time, httplib, threading
+import logging
+
+# Class for caching small files of the dump servers, such as directory
+# listings, lists of checksums and status files, in a local JSON file.
+# Cached files are used for ttl seconds, unless they have been marked as
+# permanent (see setPermanent()), e.g., because they belong to a dump that
+# is complete and will not change any more. Changes are written to the file
+# by save().
+#
+# The cache can be used from several threads (e.g., the threads that
+# prefetch dailies in DataFetcher). All access to the entries is guarded by a
+# lock, which is not held while files are fetched.
+class MetadataCache:
+
+	# Constructor.
+	#
+	# fileName: string, path of the cache file
+	# pool: httppool.ConnectionPool used to fetch files
+	# ttl: int, number of seconds for which files that are not permanent are used
+	def __init__(self, fileName, pool, ttl = 3600):
+		self.fileName = fileName
+		self.pool = pool
+		self.ttl = ttl
+		self.entries = {} # url -> { 'time': seconds, 'permanent': bool, 'data': string }
+		self.lock = threading.Lock() # guards entries, changed and the counters
+		self.changed = False
+		self.hits = 0
+		self.misses = 0
+		if os.path.exists(fileName):
+			file = open(fileName)
+			try:
+				self.entries = json.load(file)
+			except ValueError:
+				logging.log('*** Warning: ignoring damaged metadata cache ' + fileName + '.')
+			file.close()
+
+	# Return the contents of the file at the given URL, from the cache if
+	# possible, or None if the file could not be fetched.
+	def get(self, url):
+		with self.lock:
+			entry = self.entries.get(url)
+			if entry is not None and (entry['permanent'] or time.time() - entry['time'] < self.ttl):
+				self.hits += 1
+				return entry['data'].encode('utf-8')
+			self.misses += 1
+		try:
+			(status, data) = self.pool.read(url)
+		except (IOError, httplib.HTTPException) as e:
+			logging.log('*** Warning: could not fetch ' + url + ' (' + str(e) + ').')
+			return None
+		if status != 200:
+			return None
+		with self.lock:
+			self.entries[url] = { 'time': time.time(), 'permanent': False, 'data': data.decode('utf-8', 'replace') }
+			self.changed = True
+		return data
+
+	# Return the lines of the file at the given URL (see get()), an empty
+	# list if it could not be fetched.
+	def getLines(self, url):
+		data = self.get(url)
+		if data is None:
+			return []
+		return data.splitlines(True)
+
+	# Keep the cached file of the given URL forever.
+	def setPermanent(self, url):
+		with self.lock:
+			entry = self.entries.get(url)
+			if entry is not None and not entry['permanent']:
+				entry['permanent'] = True
+				self.changed = True
+
+	# Write the cache to its file if it has changed. The file is replaced atomically.
+	def save(self):
+		with self.lock:
+			if not self.changed:
+				return
+			directory = os.path.dirname(self.fileName)
+			if directory and not os.path.exists(directory):
+				os.makedirs(directory)
+			file = open(self.fileName + '.tmp', 'w')
+			json.dump(self.entries, file)
+			file.close()
+			os.rename(self.fileName + '.tmp', self.fileName)
+			self.changed = False
@@ -0,0 +1,453 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os, bz2, binascii, collections, cStringIO
+import multiprocessing
+
+# bzip2 marks the start of every compressed block and the end of every
+# stream with a 48 bit magic number. Blocks are not byte-aligned, so the
+# magic numbers can start at any bit.
+BLOCK_MAGIC = 0x314159265359
+EOS_MAGIC = 0x177245385090
+
+# Byte-aligned header of a stream that starts with a block
+STREAM_HEADER = 'BZh'
+STREAM_START = '\x31\x41\x59\x26\x53\x59'
+
+# Size of the segments of the compressed file that are searched for
+# block or stream boundaries in one task.
+SEGMENT_SIZE = 32 * 1024 * 1024
+
+# Size of the initial part of a file that is searched for a second
+# stream to find out whether the file is a multistream file.
+MULTISTREAM_PROBE_SIZE = 16 * 1024 * 1024
+
+# Size of the part of a file that is searched for the end of a block
+# when reading single blocks (compressed blocks are smaller than 1 MB).
+BLOCK_SEARCH_SIZE = 4 * 1024 * 1024
+
+# Class for reading a bzip2 compressed file line by line, decompressing
+# its contents in several worker processes.
+#
+# For multistream files (e.g. the pages-articles-multistream dumps),
+# the streams start at byte boundaries and are decompressed independently.
+# Other files are split into their compressed blocks, which are found by
+# looking for the block magic number at every bit position. Every block is
+# then decompressed on its own as a stream with just one block. The magic
+# number may also occur by chance within compressed data. If a block cannot
+# be decompressed, it is therefore extended to the next boundary.
+#
+# The lines are returned in the order of the file, so objects of this
+# class can be used instead of a bz2.BZ2File for DumpProcessor.processFile().
+class ParallelBZ2File:
+
+	# Constructor.
+	#
+	# filename: string, path of the bz2 file
+	# workers: int, number of worker processes (default: number of CPUs)
+	# blocksPerTask: int, number of blocks or streams decompressed in one task
+	def __init__(self, filename, workers = None, blocksPerTask = 8):
+		self.filename = os.path.abspath(filename)
+		self.workers = workers or multiprocessing.cpu_count()
+		self.blocksPerTask = blocksPerTask
+		self.size = os.path.getsize(filename)
+		self.multistream = self.__isMultistream()
+		self.pool = None
+		self.pending = None # tasks that have been started but not read yet
+		self.lines = None
+		self.chunks = None # see read()
+		self.rest = ''
+		self.startBit = 0 # bit where reading starts (see seekPosition())
+		self.skipBytes = 0 # decompressed bytes to skip after startBit
+		self.position = (0, 0)
+
+	# Find out if the file consists of more than one stream.
+	def __isMultistream(self):
+		return _isMultistream(self.filename)
+
+	def __iter__(self):
+		if self.lines is None:
+			if self.chunks is not None:
+				raise IOError('cannot read lines after reading data')
+			self.lines = self.__iterLines()
+		return self.lines
+
+	def next(self):
+		return self.__iter__().next()
+
+	# Read the next line; returns '' at the end of the file.
+	def readline(self):
+		try:
+			return self.next()
+		except StopIteration:
+			return ''
+
+	# Read at most size bytes of the decompressed data, or all remaining
+	# data if size is negative; returns '' at the end of the file. This is
+	# an alternative to reading lines and cannot be mixed with it. Reading
+	# data does not update the position returned by getPosition().
+	def read(self, size = -1):
+		if self.chunks is None:
+			if self.lines is not None:
+				raise IOError('cannot read data after reading lines')
+			self.chunks = self.__iterData()
+		data = [self.rest]
+		length = len(self.rest)
+		while size < 0 or length < size:
+			try:
+				chunk = self.chunks.next()
+			except StopIteration:
+				break
+			data.append(chunk)
+			length += len(chunk)
+		data = ''.join(data)
+		if size < 0 or length <= size:
+			self.rest = ''
+			return data
+		self.rest = data[size:]
+		return data[:size]
+
+	# Return the position of the next line that will be read, as a pair of
+	# the bit offset where a block (or stream) starts and the number of
+	# decompressed bytes from there on.
+	def getPosition(self):
+		return self.position
+
+	# Continue reading at a position that was returned by getPosition(),
+	# possibly for another object of the same file. This must be called
+	# before the first line is read.
+	def seekPosition(self, position):
+		if self.lines is not None or self.chunks is not None:
+			raise IOError('cannot seek after reading has started')
+		(self.startBit, self.skipBytes) = position
+		self.position = position
+
+	# Stop all worker processes. Should always be called when
+	# the file is no longer needed.
+	# Tasks that are still running are waited for, since terminating workers
+	# that are writing results can leave the pool in a deadlock.
+	def close(self):
+		if self.pool is not None:
+			for result in self.pending:
+				result.wait()
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
+			self.pending = None
+		self.lines = None
+
+	# Private generator for the lines of the decompressed file.
+	def __iterLines(self):
+		rest = ''
+		skipBytes = self.skipBytes
+		for (data, startBit) in self.__iterChunks():
+			if skipBytes > 0:
+				data = data[skipBytes:]
+				offset = skipBytes
+				skipBytes = 0
+			else:
+				offset = 0
+			buffer = cStringIO.StringIO(rest + data)
+			offset -= len(rest)
+			rest = ''
+			for line in buffer:
+				if line.endswith('\n'):
+					offset += len(line)
+					self.position = (startBit, offset)
+					yield line
+				else:
+					rest = line
+		if rest:
+			yield rest
+		self.close()
+
+	# Private generator for the decompressed data, starting at the current
+	# position.
+	def __iterData(self):
+		skipBytes = self.skipBytes
+		for (data, startBit) in self.__iterChunks():
+			if skipBytes > 0:
+				data = data[skipBytes:]
+				skipBytes = 0
+			yield data
+		self.close()
+
+	# Private generator for the decompressed data of consecutive groups of
+	# blocks (or streams), in the order of the file, together with the bit
+	# offset where the data starts. At most two groups per worker are
+	# decompressed ahead of the data that is currently read.
+	def __iterChunks(self):
+		self.pool = multiprocessing.Pool(self.workers)
+		self.pending = []
+		pending = collections.deque()
+		consumedEnd = self.startBit
+		for task in self.__iterTasks():
+			result = self.pool.apply_async(_decompressBlocks, (task,))
+			self.pending.append(result)
+			pending.append((task, result))
+			while len(pending) > 2 * self.workers:
+				(data, startBit, consumedEnd) = self.__getChunk(pending.popleft(), consumedEnd)
+				yield (data, startBit)
+		while pending:
+			(data, startBit, consumedEnd) = self.__getChunk(pending.popleft(), consumedEnd)
+			yield (data, startBit)
+
+	# Private method to get the result of a decompression task, together
+	# with the bit where its data starts. If the previous task had to extend
+	# its last block into the range of this task, the results of this task
+	# are useless and the task is repeated for the remaining blocks.
+	def __getChunk(self, pendingTask, consumedEnd):
+		(task, result) = pendingTask
+		(filename, boundaries, count, multistream) = task
+		self.pending.remove(result)
+		if boundaries[0][0] >= consumedEnd:
+			(data, end) = result.get()
+			return (data, boundaries[0][0], end)
+		result.wait()
+		taskEnd = boundaries[count][0]
+		if taskEnd <= consumedEnd:
+			return ('', consumedEnd, consumedEnd)
+		boundaries = [ b for b in boundaries if b[0] >= consumedEnd ]
+		count = len([ b for b in boundaries if b[0] < taskEnd ])
+		(data, end) = _decompressBlocks((filename, boundaries, count, multistream))
+		return (data, boundaries[0][0], end)
+
+	# Private generator for decompression tasks. Every task gets a list of
+	# boundaries, the number of boundaries that start blocks within the task,
+	# and a few more boundaries that follow, to recover from boundaries that
+	# were found by chance.
+	def __iterTasks(self):
+		extra = 3
+		boundaries = []
+		starts = 0
+		for boundary in self.__iterBoundaries():
+			boundaries.append(boundary)
+			if boundary[1]:
+				starts += 1
+			if starts >= self.blocksPerTask + extra:
+				count = self.__countStarts(boundaries, self.blocksPerTask)
+				yield (self.filename, boundaries, count, self.multistream)
+				boundaries = boundaries[count:]
+				starts = len([ b for b in boundaries if b[1] ])
+		if boundaries:
+			yield (self.filename, boundaries, len(boundaries) - 1, self.multistream)
+
+	# Private method to find the number of boundaries that are needed to
+	# include the given number of block starts.
+	def __countStarts(self, boundaries, starts):
+		count = 0
+		while starts > 0:
+			if boundaries[count][1]:
+				starts -= 1
+			count += 1
+		return count
+
+	# Private generator for all boundaries (pairs of a bit offset and a bool
+	# that is True for the start of a block) in the file, followed by the end
+	# of the file. Segments of the file are searched in the worker processes.
+	def __iterBoundaries(self):
+		pending = collections.deque()
+		nextSegment = self.startBit / 8
+		while True:
+			while nextSegment < self.size and len(pending) < self.workers:
+				segmentEnd = min(nextSegment + SEGMENT_SIZE, self.size)
+				result = self.pool.apply_async(_scanSegment, ((self.filename, nextSegment, segmentEnd, self.multistream),))
+				self.pending.append(result)
+				pending.append(result)
+				nextSegment = segmentEnd
+			if not pending:
+				break
+			result = pending.popleft()
+			self.pending.remove(result)
+			for boundary in result.get():
+				if boundary[0] >= self.startBit:
+					yield boundary
+		yield (self.size * 8, False)
+
+# Class for reading lines at given positions of a bzip2 compressed file
+# (see ParallelBZ2File.getPosition()) without decompressing the data before
+# them. Blocks are decompressed one by one in the current process, and the
+# most recently used blocks are kept, so that reading several positions
+# in the same block is cheap.
+class BZ2BlockReader:
+
+	CACHE_SIZE = 4
+
+	def __init__(self, filename):
+		self.filename = os.path.abspath(filename)
+		self.size = os.path.getsize(filename)
+		self.multistream = _isMultistream(self.filename)
+		self.cache = collections.OrderedDict() # start bit -> (data, end bit)
+
+	# Generator for the lines of the file, starting from the given position.
+	def iterLines(self, position):
+		(startBit, offset) = position
+		rest = ''
+		while startBit < self.size * 8:
+			(data, startBit) = self.__getBlock(startBit)
+			if offset >= len(data):
+				offset -= len(data)
+				continue
+			buffer = cStringIO.StringIO(rest + data[offset:])
+			offset = 0
+			rest = ''
+			for line in buffer:
+				if line.endswith('\n'):
+					yield line
+				else:
+					rest = line
+		if rest:
+			yield rest
+
+	# Return the data of the block that starts at the given bit, and the bit
+	# where the next block (or the end of the stream) starts.
+	def __getBlock(self, startBit):
+		if startBit in self.cache:
+			return self.cache[startBit]
+		segmentEnd = min(startBit / 8 + BLOCK_SEARCH_SIZE, self.size)
+		boundaries = [ b for b in _scanSegment((self.filename, startBit / 8, segmentEnd, self.multistream)) if b[0] >= startBit ]
+		if segmentEnd == self.size:
+			boundaries.append((self.size * 8, False))
+		if not boundaries or boundaries[0][0] != startBit:
+			boundaries.insert(0, (startBit, False))
+		block = _decompressBlocks((self.filename, boundaries, 1, self.multistream))
+		self.cache[startBit] = block
+		if len(self.cache) > BZ2BlockReader.CACHE_SIZE:
+			self.cache.popitem(False)
+		return block
+
+# Find out if a bz2 file consists of more than one stream.
+def _isMultistream(filename):
+	file = open(filename, 'rb')
+	data = file.read(MULTISTREAM_PROBE_SIZE)
+	file.close()
+	return len(_findStreamStarts(data, 0, len(data))) > 1
+
+# Convert a non-negative integer to a big-endian byte string of the given size.
+def _longToBytes(value, size):
+	hexValue = '%x' % value
+	return binascii.unhexlify(hexValue.rjust(size * 2, '0'))
+
+# Prepare search patterns for a magic number at all eight bit offsets.
+# Every pattern consists of the bit offset, the bytes of the shifted magic
+# number with the masks of bits that belong to it, and the part of these
+# bytes that belongs to the magic number completely.
+def _makePatterns(magic):
+	patterns = []
+	for shift in range(8):
+		size = (shift + 48 + 7) / 8
+		data = _longToBytes(magic << (size * 8 - 48 - shift), size)
+		masks = [0xFF] * size
+		masks[0] = 0xFF >> shift
+		if (shift + 48) % 8:
+			masks[-1] = (0xFF << (8 - (shift + 48) % 8)) & 0xFF
+		first = 0
+		if masks[0] != 0xFF:
+			first = 1
+		last = size
+		if masks[-1] != 0xFF:
+			last = size - 1
+		patterns.append((shift, data, masks, first, data[first:last]))
+	return patterns
+
+BLOCK_PATTERNS = _makePatterns(BLOCK_MAGIC)
+EOS_PATTERNS = _makePatterns(EOS_MAGIC)
+
+# Find the bit offsets of all occurrences of a magic number in data,
+# starting before byte position end. The offsets are relative to data.
+def _findMagic(data, end, patterns):
+	offsets = []
+	for (shift, magicData, masks, first, core) in patterns:
+		pos = data.find(core, first)
+		while pos != -1:
+			start = pos - first
+			if start >= end:
+				break
+			if start + len(magicData) <= len(data) and \
+					ord(data[start]) & masks[0] == ord(magicData[0]) & masks[0] and \
+					ord(data[start + len(magicData) - 1]) & masks[-1] == ord(magicData[-1]) & masks[-1]:
+				offsets.append(start * 8 + shift)
+			pos = data.find(core, pos + 1)
+	return offsets
+
+# Find the byte offsets of all stream headers of data that start before end.
+def _findStreamStarts(data, start, end):
+	offsets = []
+	pos = data.find(STREAM_HEADER, start)
+	while pos != -1 and pos < end:
+		if data[pos + 3:pos + 4].isdigit() and data[pos + 4:pos + 10] == STREAM_START:
+			offsets.append(pos)
+		pos = data.find(STREAM_HEADER, pos + 1)
+	return offsets
+
+# Find all boundaries in one segment of the file (worker task). The result
+# is a sorted list of pairs of a bit offset and a bool that is True for the
+# start of a block (or stream) and False for the end of a stream.
+def _scanSegment(task):
+	(filename, start, end, multistream) = task
+	file = open(filename, 'rb')
+	file.seek(start)
+	data = file.read(end - start + 10) # also find patterns that cross the segment end
+	file.close()
+	if multistream:
+		return [ ((start + offset) * 8, True) for offset in _findStreamStarts(data, 0, end - start) ]
+	boundaries = [ (start * 8 + offset, True) for offset in _findMagic(data, end - start, BLOCK_PATTERNS) ]
+	boundaries += [ (start * 8 + offset, False) for offset in _findMagic(data, end - start, EOS_PATTERNS) ]
+	boundaries.sort()
+	return boundaries
+
+# Read the bits from startBit (inclusive) to endBit (exclusive) as an integer.
+def _readBits(file, startBit, endBit):
+	file.seek(startBit / 8)
+	data = file.read((endBit + 7) / 8 - startBit / 8)
+	value = int(binascii.hexlify(data), 16)
+	value >>= len(data) * 8 - (endBit - startBit / 8 * 8)
+	return value & ((1 << (endBit - startBit)) - 1)
+
+# Decompress a single block that starts with its magic number at startBit
+# and ends at endBit by wrapping it into a stream of its own.
+def _decompressBlock(file, startBit, endBit):
+	bitCount = endBit - startBit
+	blockBits = _readBits(file, startBit, endBit)
+	blockCrc = (blockBits >> (bitCount - 80)) & 0xFFFFFFFF
+	# The stream CRC of a stream with one block is the CRC of the block
+	stream = (((((ord('B') << 24) | (ord('Z') << 16) | (ord('h') << 8) | ord('9')) << bitCount) | blockBits) << 80) | \
+		(EOS_MAGIC << 32) | blockCrc
+	totalBits = 32 + bitCount + 80
+	padding = (8 - totalBits % 8) % 8
+	return bz2.decompress(_longToBytes(stream << padding, (totalBits + padding) / 8))
+
+# Decompress the data of one block or stream.
+def _decompressRange(file, startBit, endBit, multistream):
+	if multistream:
+		file.seek(startBit / 8)
+		return bz2.decompress(file.read((endBit - startBit) / 8))
+	else:
+		return _decompressBlock(file, startBit, endBit)
+
+# Decompress consecutive blocks (worker task). Returns the decompressed data
+# and the bit offset up to which the file has been decompressed. If a block
+# cannot be decompressed up to the next boundary, the boundary was found by
+# chance, and the block is extended to the boundary after it.
+def _decompressBlocks(task):
+	(filename, boundaries, count, multistream) = task
+	file = open(filename, 'rb')
+	result = []
+	i = 0
+	while i < count:
+		if not boundaries[i][1]: # end of a stream
+			i += 1
+			continue
+		j = i + 1
+		while True:
+			if j >= len(boundaries):
+				file.close()
+				raise IOError('invalid bz2 data at bit ' + str(boundaries[i][0]) + ' of ' + filename)
+			try:
+				result.append(_decompressRange(file, boundaries[i][0], boundaries[j][0], multistream))
+				break
+			except (IOError, ValueError, EOFError):
+				j += 1
+		i = j
+	file.close()
+	return (''.join(result), boundaries[i][0])
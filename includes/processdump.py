@@ -1,7 +1,9 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import logging, time, bitarray
+import logging, time, os, gzip, json
+import bitmap, revisioncontent, timing
+import multiprocessing, collections, itertools, re, traceback, Queue, cPickle
 
 # Class to iterate through a MediaWiki dump to process
 # all of its revisions. The main entry point is processFile().
@@ -11,63 +13,631 @@ import logging, time, bitarray
 #
 # The dump processor will only process revisions of Wikidata Items
 # and Properties. Revisions of other pages are ignored and skipped.
+# Revisions and revision contents that none of the registered processors
+# needs are skipped as well (see RevisionProcessor.needsContent() etc.).
+#
+# Processing can optionally be distributed over several worker processes;
+# see setParallelWorkers() for details. The state of processing can be saved
+# in regular checkpoints; see setCheckpoint(). A faster way of reading the
+# dump can be selected with setScanner(). Reading, parsing and processing
+# can be done in a pipeline of processes; see setPipeline(). Detailed
+# measurements of the time and throughput can be written to a file; see
+# setMetricsFile(). Stub dumps without revision texts can be read if no
+# processor needs the contents; see setStubs().
 class DumpProcessor:
 
 	def __init__(self):
 		self.processors = []
-		self.processeditems = bitarray.bitarray(2**26) # about 30 M items
-		self.processeditems.setall(0)
-		self.processedrevisions = bitarray.bitarray(2**28) # about 250 M revisions
-		self.processedrevisions.setall(0)
-		self.processedproperties = bitarray.bitarray(2**16) # up to 65 K properties
-		self.processedproperties.setall(0)
+		self.processeditems = bitmap.ChunkedBitmap()
+		self.processedrevisions = bitmap.ChunkedBitmap()
+		self.processedproperties = bitmap.ChunkedBitmap()
 		self.linecount = 0
 		self.pagecount = 0
 		self.revcount = 0
 		self.duprevcount = 0
 		self.previousTime = 0
 		self.startTime = 0
+		self.workers = 1
+		self.batchSize = 1000
+		self.batch = None
+		self.curPage = None
+		self.pool = None
+		self.pendingBatches = None
+		self.checkpoint = None
+		self.fileStartLine = 0 # value of linecount at the start of the current file
+		self.scanner = 'lines'
+		self.needContent = True # see configureRevisions()
+		self.latestOnly = False
+		self.maxTimestamp = None
+		self.pipeline = False
+		self.pipelineQueueSize = 8
+		self.pipelineQueue = None # only used in the parsing stage of a pipeline
+		self.pipelinePages = None
+		self.metricsFileName = None
+		self.timings = None # one timing.Timings per processor, if metrics are used
+		self.bytecount = 0 # decompressed bytes of all files that have been completed
+		self.compressedBytecount = 0 # compressed bytes of these files, as far as known
+		self.filebytecount = None # decompressed bytes of the current file, if counted
+		self.currentFile = None
+		self.remainingPages = None # see setMaxPages()
+		self.stubs = False
 
 	# Add a new revision processor object that will be called during processing.
 	# The object must implement the methods defined for revisionprocessor.RevisionProcessor.
 	def registerProcessor(self,processor):
 		self.processors.append(processor)
+		if self.timings is not None:
+			self.timings.append(timing.Timings())
 
-	# Private method that distributes start page block events to processors.
-	def startPageBlock(self,title,isItem,isNewEntity):
+	# Distribute the work on page blocks over the given number of worker
+	# processes. The dump is still read and split into pages by the calling
+	# process, which also keeps track of the entities and revisions seen so far.
+	# Pages are then sent in batches of batchSize pages to the workers, each of
+	# which runs its own copy of the registered processors. The partial results
+	# of each batch are merged back in the order of the batches in the dump, so
+	# the results do not depend on how the batches were scheduled.
+	#
+	# Parallel processing is only used if all registered processors support it
+	# (see RevisionProcessor.supportsParallel()); otherwise processFile() falls
+	# back to processing all pages in the current process.
+	def setParallelWorkers(self,workers,batchSize=1000):
+		self.workers = workers
+		self.batchSize = batchSize
+
+	# Select how the dump is read. The default scanner 'lines' reads the file
+	# line by line. The scanner 'buffers' reads large blocks of data and
+	# avoids creating strings for lines and fields that are not passed on to
+	# the processors (see scanBuffers()). Both produce the same events.
+	# The scanner 'buffers' needs a file with a read() method; other files
+	# are always read line by line.
+	def setScanner(self,scanner):
+		if scanner not in ('lines', 'buffers'):
+			raise ValueError('unknown scanner: ' + str(scanner))
+		self.scanner = scanner
+
+	# Read the dump in a pipeline of three processes: a new process reads
+	# (and decompresses) the file, a second new process parses the data into
+	# pages, and the calling process runs the processors on these pages.
+	# The stages are connected by queues of at most queueSize chunks of data
+	# (see BUFFER_SIZE) or batches of pages (see PIPELINE_BATCH_SIZE), so a
+	# stage waits when the next stage cannot keep up, and memory stays bounded.
+	#
+	# The parsing stage always uses the scanner 'buffers'. The pipeline is
+	# only used for files with a read() method. Parallel processing of pages
+	# (see setParallelWorkers()) can be used in the third stage.
+	def setPipeline(self,pipeline,queueSize=8):
+		self.pipeline = pipeline
+		self.pipelineQueueSize = queueSize
+
+	# Measure the time that each registered processor needs in each of its
+	# callbacks, and write all metrics of the run (see getMetrics()) to the
+	# given file as JSON whenever progress is logged, that is, every million
+	# lines and at the end of each file. In parallel mode (see
+	# setParallelWorkers()), the callbacks in the workers are not measured.
+	def setMetricsFile(self,fileName):
+		self.metricsFileName = fileName
+		if self.timings is None:
+			self.timings = [ timing.Timings() for processor in self.processors ]
+
+	# Return the metrics of the run so far as a dictionary that can be
+	# written as JSON: the counters, the time needed (wall-clock seconds and
+	# CPU seconds of this process), the number of decompressed and compressed
+	# bytes read (None if unknown), throughput per second, and the times of
+	# the processors (see setMetricsFile() and RevisionProcessor.getMetrics()).
+	def getMetrics(self):
+		timeNeeded = self.previousTime
+		if self.startTime != 0:
+			timeNeeded += time.time() - self.startTime
+		(fileBytes, fileCompressedBytes) = self.getFileBytes()
+		bytecount = self.bytecount + (fileBytes or 0)
+		compressedBytecount = self.compressedBytecount + (fileCompressedBytes or 0)
+		metrics = { 'time': time.strftime('%Y-%m-%d %H:%M:%S'),\
+			'seconds': round(timeNeeded, 3), 'cpuSeconds': round(time.clock(), 3),\
+			'lines': self.linecount, 'pages': self.pagecount,\
+			'revisions': self.revcount, 'duplicateRevisions': self.duprevcount,\
+			'bytes': bytecount, 'compressedBytes': compressedBytecount,\
+			'bytesPerSecond': None, 'compressedBytesPerSecond': None, 'pagesPerSecond': None,\
+			'processors': [] }
+		if timeNeeded > 0:
+			metrics['bytesPerSecond'] = round(bytecount / timeNeeded, 1)
+			metrics['compressedBytesPerSecond'] = round(compressedBytecount / timeNeeded, 1)
+			metrics['pagesPerSecond'] = round(self.pagecount / timeNeeded, 1)
+		for i in range(len(self.processors)):
+			processorMetrics = { 'name': self.processors[i].__class__.__name__,\
+				'details': self.processors[i].getMetrics() }
+			if self.timings is not None:
+				processorMetrics['callbacks'] = self.timings[i].getSnapshot()
+			metrics['processors'].append(processorMetrics)
+		return metrics
+
+	# Private method to write the current metrics to the metrics file, if any.
+	def writeMetrics(self):
+		if self.metricsFileName is None:
+			return
+		tmpFileName = self.metricsFileName + '.tmp'
+		file = open(tmpFileName, 'w')
+		json.dump(self.getMetrics(), file, indent=1, sort_keys=True)
+		file.close()
+		os.rename(tmpFileName, self.metricsFileName)
+
+	# Private method to return the numbers of decompressed and compressed
+	# bytes of the current file that have been read so far. The compressed
+	# bytes are only known for gzip files and uncompressed files. None is
+	# returned for numbers that are not known.
+	def getFileBytes(self):
+		currentFile = self.currentFile
+		if currentFile is None:
+			return (0, 0)
+		decompressed = self.filebytecount
+		compressed = None
+		try:
+			if decompressed is None and hasattr(currentFile,'tell'): # read line by line
+				decompressed = currentFile.tell()
+			if isinstance(currentFile,gzip.GzipFile):
+				compressed = currentFile.fileobj.tell()
+			elif isinstance(currentFile,file):
+				compressed = decompressed
+		except (IOError, ValueError):
+			pass
+		return (decompressed, compressed)
+
+	# Stop processing after the given number of pages of items and properties
+	# (in all files together), e.g., for testing or profiling. Later files
+	# are not read at all.
+	def setMaxPages(self,maxPages):
+		self.remainingPages = maxPages
+
+	# Read stub dumps (such as stub-meta-history.xml.gz), which contain all
+	# data of the revisions except for their texts, and are therefore much
+	# smaller. Revisions are passed on with rawContent None, and revisions
+	# with empty or deleted texts are skipped as in full dumps (based on the
+	# attributes of the text). Stub dumps can only be processed if no
+	# registered processor needs the contents (see configureRevisions()).
+	def setStubs(self,stubs):
+		self.stubs = stubs
+
+	# Save the state of processing in the given checkpoint.Checkpoint object
+	# whenever it is due. Checkpoints are only taken between two pages.
+	# Checkpoints are only used if all registered processors support them
+	# (see RevisionProcessor.supportsCheckpoints()).
+	def setCheckpoint(self,checkpoint):
+		self.checkpoint = checkpoint
+
+	# Return the state of processing, including the state of all processors,
+	# as a picklable object.
+	def getCheckpointState(self):
+		timeNeeded = self.previousTime
+		if self.startTime != 0:
+			timeNeeded += time.time() - self.startTime
+		return { 'processeditems': self.processeditems,\
+			'processedrevisions': self.processedrevisions,\
+			'processedproperties': self.processedproperties,\
+			'counters': (self.linecount, self.pagecount, self.revcount, self.duprevcount, timeNeeded),\
+			'bytes': (self.bytecount, self.compressedBytecount),\
+			'processors': [ processor.getCheckpointState() for processor in self.processors ] }
+
+	# Restore a state returned by getCheckpointState(). The same processors
+	# must have been registered in the same order before.
+	def restoreCheckpointState(self,state):
+		self.processeditems = state['processeditems']
+		self.processedrevisions = state['processedrevisions']
+		self.processedproperties = state['processedproperties']
+		(self.linecount, self.pagecount, self.revcount, self.duprevcount, self.previousTime) = state['counters']
+		(self.bytecount, self.compressedBytecount) = state.get('bytes', (0, 0))
+		for i in range(len(self.processors)):
+			self.processors[i].restoreCheckpointState(state['processors'][i])
+
+	# Private method to check if all processors support checkpoints.
+	# If not, checkpoints are disabled.
+	def checkCheckpointSupport(self):
 		for processor in self.processors:
-			processor.startPageBlock(title,isItem,isNewEntity)
+			if not processor.supportsCheckpoints():
+				logging.log('*** Warning: processor ' + processor.__class__.__name__ + ' does not support checkpoints.\n*** No checkpoints will be saved.')
+				self.checkpoint = None
+				return
+
+	# Private method to save a checkpoint for the given file. In parallel
+	# mode, all pending batches are merged first.
+	#
+	# In the parsing stage of a pipeline, the checkpoint is passed on to the
+	# main process instead, which then calls this method with the position
+	# and the state from the parsing stage and adds the state of the
+	# processors (see iterPipelinePages()).
+	def saveCheckpoint(self,file,position=None,state=None):
+		if position is None:
+			readerPosition = None
+			if hasattr(file,'getPosition'):
+				readerPosition = file.getPosition()
+			position = (self.linecount - self.fileStartLine, readerPosition)
+		if self.pipelinePages is not None:
+			self.sendPipelinePages()
+			# The state is pickled right away, since the queue only pickles
+			# it in a background thread while parsing goes on:
+			self.pipelineQueue.put(('checkpoint', position, cPickle.dumps(self.getCheckpointState(), cPickle.HIGHEST_PROTOCOL)))
+			self.checkpoint.restartInterval()
+			return
+		if self.batch is not None:
+			self.submitBatch()
+			while self.pendingBatches:
+				self.mergeBatch()
+		if state is None:
+			state = self.getCheckpointState()
+		else:
+			state['processors'] = [ processor.getCheckpointState() for processor in self.processors ]
+		self.checkpoint.save(position, state)
 
-	# Private method that distributes revision events to processors.
-	def processRevision(self,revId,timestamp,user,isIp,rawContent):
+	# Private method to find out which revisions and which of their data the
+	# registered processors need (see RevisionProcessor.needsContent() etc.).
+	# Without processors, all revisions are read with their contents, unless
+	# the dump is a stub dump.
+	def configureRevisions(self):
+		self.needContent = not self.processors
+		self.latestOnly = len(self.processors) > 0
+		maxTimestamps = set()
 		for processor in self.processors:
-			processor.processRevision(revId,timestamp,user,isIp,rawContent)
+			if processor.needsContent():
+				self.needContent = True
+			if not processor.needsLatestRevisionOnly():
+				self.latestOnly = False
+			maxTimestamps.add(processor.getMaxTimestamp())
+		if len(maxTimestamps) != 1:
+			self.latestOnly = False # processors would need different latest revisions
+		if None in maxTimestamps or not maxTimestamps:
+			self.maxTimestamp = None
+		else:
+			self.maxTimestamp = max(maxTimestamps)
+		if self.stubs:
+			if self.needContent and self.processors:
+				raise ValueError('stub dumps contain no revision contents, but a registered processor needs them')
+			self.needContent = False
+
+	# Private method that distributes start page block events to processors.
+	def startPageBlock(self,title,isItem,isNewEntity):
+		if self.batch is not None:
+			self.curPage = (title,isItem,isNewEntity,[])
+			return
+		if self.timings is None:
+			for processor in self.processors:
+				processor.startPageBlock(title,isItem,isNewEntity)
+		else:
+			for i in range(len(self.processors)):
+				(wall, cpu) = self.timings[i].start()
+				self.processors[i].startPageBlock(title,isItem,isNewEntity)
+				self.timings[i].stop('startPageBlock',wall,cpu)
+
+	# Private method that distributes a list of revisions of the current
+	# page to processors.
+	def processRevisions(self,revisions):
+		if self.batch is not None:
+			self.curPage[3].append(revisions)
+			return
+		if self.timings is None:
+			_dispatchRevisions(self.processors,revisions)
+		else:
+			for i in range(len(self.processors)):
+				(wall, cpu) = self.timings[i].start()
+				_dispatchRevisions(self.processors[i:i + 1],revisions)
+				self.timings[i].stop('processRevision',wall,cpu,len(revisions))
 
 	# Private method that distributes end page block events to processors.
 	def endPageBlock(self):
+		if self.batch is not None:
+			self.batch.append(self.curPage)
+			self.curPage = None
+			if len(self.batch) >= self.batchSize:
+				self.submitBatch()
+			return
+		if self.timings is None:
+			for processor in self.processors:
+				processor.endPageBlock()
+		else:
+			for i in range(len(self.processors)):
+				(wall, cpu) = self.timings[i].start()
+				self.processors[i].endPageBlock()
+				self.timings[i].stop('endPageBlock',wall,cpu)
+
+	# Private method to check if the current processors can be run in
+	# worker processes.
+	def canProcessParallel(self):
+		if self.workers <= 1:
+			return False
 		for processor in self.processors:
-			processor.endPageBlock()
+			if not processor.supportsParallel():
+				logging.log('*** Warning: processor ' + processor.__class__.__name__ + ' does not support parallel processing.\n*** Processing pages in one process only.')
+				return False
+		return True
+
+	# Private method to start the worker processes for one file.
+	# The workers are forked from the current process, so that they
+	# inherit the processors in their current state.
+	def startWorkers(self):
+		global _parallelProcessors
+		_parallelProcessors = self.processors
+		self.pool = multiprocessing.Pool(self.workers)
+		self.pendingBatches = collections.deque()
+		self.batch = []
+
+	# Private method to send the current batch of pages to the workers.
+	# To keep memory bounded, at most two batches per worker are queued;
+	# if there are more, the oldest batch is waited for and merged first.
+	def submitBatch(self):
+		if self.batch:
+			self.pendingBatches.append(self.pool.apply_async(_processParallelBatch,(self.batch,)))
+			self.batch = []
+		while len(self.pendingBatches) > 2 * self.workers:
+			self.mergeBatch()
+
+	# Private method to merge the results of the oldest pending batch.
+	def mergeBatch(self):
+		results = self.pendingBatches.popleft().get()
+		for i in range(len(self.processors)):
+			self.processors[i].mergeParallelBatch(results[i])
+
+	# Private method to finish all pending batches and stop the workers.
+	def stopWorkers(self):
+		global _parallelProcessors
+		self.submitBatch()
+		while self.pendingBatches:
+			self.mergeBatch()
+		self.pool.close()
+		self.pool.join()
+		self.pool = None
+		self.pendingBatches = None
+		self.batch = None
+		_parallelProcessors = None
+
+	# Private method to abort parallel processing after an error. Pending
+	# batches are waited for (but not merged), since terminating workers that
+	# are writing results can leave the pool in a deadlock.
+	def terminateWorkers(self):
+		global _parallelProcessors
+		for result in self.pendingBatches:
+			result.wait()
+		self.pool.close()
+		self.pool.join()
+		self.pool = None
+		self.pendingBatches = None
+		self.batch = None
+		self.curPage = None
+		_parallelProcessors = None
 
 	# Private method to log current progress. The dump processor only logs overall time.
 	# For more detailed logs, registered revision processors are called.
 	def logReport(self):
-		timeNeeded = self.previousTime
-		if self.startTime != 0:
-			timeNeeded += time.time() - self.startTime
+		if self.pipelinePages is not None:
+			return # the main process of the pipeline reports
+		metrics = self.getMetrics()
 
 		logging.log(' ... processed ' + str(self.linecount) + \
 				' lines (' + str(self.pagecount) + ' pages, ' + \
 				str(self.revcount) + ' revisions with ' + \
 				str(self.duprevcount) + ' dups) in ' + \
-				str(round(timeNeeded,2)) + ' seconds.')
+				str(round(metrics['seconds'],2)) + ' seconds.')
+		if metrics['pagesPerSecond'] is not None:
+			throughput = ' ... read ' + str(round(metrics['bytesPerSecond'] / 1048576.0,2)) + ' MB/s'
+			if metrics['compressedBytes'] > 0:
+				throughput += ' (' + str(round(metrics['compressedBytesPerSecond'] / 1048576.0,2)) + ' MB/s compressed)'
+			logging.log(throughput + ', ' + str(int(metrics['pagesPerSecond'])) + ' pages/s.')
+		for i in range(len(self.processors)):
+			self.processors[i].logReport()
+			if self.timings is not None:
+				times = metrics['processors'][i]['callbacks']
+				logging.log('     * Seconds in ' + self.processors[i].__class__.__name__ + ': ' +\
+					', '.join([ callback + ' ' + str(round(times[callback]['wallSeconds'],2)) + ' (CPU ' +\
+					str(round(times[callback]['cpuSeconds'],2)) + ')' for callback in sorted(times) ]))
+		helpers = [] # processors usually share one ProcessingHelper, which reports once
 		for processor in self.processors:
-			processor.logReport()
+			helper = getattr(processor, 'helper', None)
+			if helper is not None and hasattr(helper, 'logReport') and not [ h for h in helpers if h is helper ]:
+				helpers.append(helper)
+				helper.logReport()
+		self.writeMetrics()
 
-	# Process the given MediaWiki dump file.
-	def processFile(self,file):
+	# Process the given MediaWiki dump file with the registered processors.
+	# This reads the pages with iterPages() and passes them on.
+	#
+	# position: optional position in the file to continue from,
+	# as stored in a checkpoint. If the file cannot seek to this position
+	# (see parallelbz2.ParallelBZ2File), the lines before it are skipped.
+	def processFile(self,file,position=None):
 		self.startTime = time.time()
+		if self.checkpoint is not None:
+			self.checkCheckpointSupport()
+		pages = self.iterPages(file,position)
+		try:
+			if self.canProcessParallel():
+				logging.log('Processing pages with ' + str(self.workers) + ' worker processes.')
+				self.startWorkers()
+				try:
+					self.processPages(pages)
+				except:
+					self.terminateWorkers()
+					raise
+				self.stopWorkers()
+			else:
+				self.processPages(pages)
+		finally:
+			pages.close() # stops reading if processing ended early
+		self.previousTime += time.time() - self.startTime
+		self.startTime = 0
+		self.finishFileBytes()
+		self.logReport()
+
+	# Private method to add the bytes of the current file, which has been
+	# processed completely, to the bytes of all files.
+	def finishFileBytes(self):
+		(decompressed, compressed) = self.getFileBytes()
+		if compressed is None and hasattr(self.currentFile,'size'): # see parallelbz2.ParallelBZ2File
+			compressed = self.currentFile.size
+		self.bytecount += decompressed or 0
+		self.compressedBytecount += compressed or 0
+		self.currentFile = None
+		self.filebytecount = None
+
+	# Pass the given pages, as returned by iterPages(), on to the
+	# registered processors. The revisions of each page are read in
+	# batches of at most REVISION_BATCH_SIZE revisions, which are passed
+	# on at once to processors that support this (see
+	# RevisionProcessor.supportsRevisionBatches()).
+	#
+	# If a maximal number of pages has been set (see setMaxPages()),
+	# processing stops when it is reached.
+	def processPages(self,pages):
+		batchSize = DumpProcessor.REVISION_BATCH_SIZE
+		if self.remainingPages == 0:
+			return
+		for page in pages:
+			self.startPageBlock(page.title,page.isItem,page.isNew)
+			revisions = iter(page)
+			while True:
+				batch = list(itertools.islice(revisions,batchSize))
+				if not batch:
+					break
+				self.processRevisions(batch)
+			self.endPageBlock()
+			if self.remainingPages is not None:
+				self.remainingPages -= 1
+				if self.remainingPages == 0:
+					logging.log('Stopping after the maximal number of pages.')
+					return
+
+	# Generator for the pages of items and properties in the given MediaWiki
+	# dump file, as DumpPage objects. The file is only read as far as the
+	# pages are asked for, so consumers can stop at any time. The revisions
+	# of a page are read while they are iterated over; any that have not
+	# been read when the next page is asked for are skipped.
+	#
+	# The pages and revisions are the same that registered processors would
+	# get from processFile(). In particular, the revisions are selected as
+	# declared by the registered processors (see configureRevisions()), and
+	# the counters and sets of processed entities and revisions are updated.
+	#
+	# position: optional position in the file to continue from (see
+	# processFile())
+	def iterPages(self,file,position=None):
+		self.configureRevisions()
+		self.fileStartLine = self.linecount
+		usePipeline = self.pipeline and hasattr(file,'read')
+		useBuffers = (self.scanner == 'buffers' or usePipeline) and hasattr(file,'read')
+		self.currentFile = file
+		self.filebytecount = 0 if useBuffers else None
+		skipLines = 0
+		if position is not None:
+			(lineCount, readerPosition) = position
+			self.fileStartLine -= lineCount
+			if readerPosition is not None and hasattr(file,'seekPosition'):
+				logging.log('Continuing processing at line ' + str(lineCount) + ' of the file.')
+				file.seekPosition(readerPosition)
+			elif useBuffers:
+				logging.log('Skipping ' + str(lineCount) + ' lines that were processed before the checkpoint ...')
+				skipLines = lineCount
+			else:
+				logging.log('Skipping ' + str(lineCount) + ' lines that were processed before the checkpoint ...')
+				file = iter(file)
+				for line in itertools.islice(file, lineCount):
+					pass
+		if usePipeline:
+			for page in self.iterPipelinePages(file,skipLines):
+				yield page
+			return
+		if useBuffers:
+			events = self.scanBuffers(file,skipLines)
+		else:
+			events = self.scanFile(file)
+		for event in events:
+			page = DumpPage(event[0],event[1],event[2],events)
+			yield page
+			page.skipRevisions()
+
+	# Private generator for the pages of the given file, as in iterPages(),
+	# which are read and parsed by two new processes (see setPipeline()).
+	# The counters of the DumpProcessor are updated with every batch of
+	# pages, and its sets of processed entities and revisions at the end.
+	def iterPipelinePages(self,file,skipLines):
+		chunkQueue = multiprocessing.Queue(self.pipelineQueueSize)
+		pageQueue = multiprocessing.Queue(self.pipelineQueueSize)
+		reader = multiprocessing.Process(target=_readPipelineChunks,args=(file,chunkQueue))
+		parser = multiprocessing.Process(target=_parsePipelinePages,args=(self,chunkQueue,pageQueue,skipLines))
+		reader.start()
+		parser.start()
+		nextReport = (self.linecount / 1000000 + 1) * 1000000
+		try:
+			while True:
+				try:
+					message = pageQueue.get(True,5)
+				except Queue.Empty:
+					if not parser.is_alive() and pageQueue.empty():
+						raise IOError('parsing stage of the pipeline stopped unexpectedly')
+					continue
+				if message[0] == 'pages':
+					for (title,isItem,isNewEntity,revisions) in message[1]:
+						yield DumpPage(title,isItem,isNewEntity,iter(revisions))
+					(self.linecount, self.pagecount, self.revcount, self.duprevcount, self.filebytecount) = message[2]
+					if self.linecount >= nextReport:
+						self.logReport()
+						nextReport = (self.linecount / 1000000 + 1) * 1000000
+				elif message[0] == 'checkpoint':
+					self.saveCheckpoint(None,message[1],cPickle.loads(message[2]))
+				elif message[0] == 'end':
+					state = cPickle.loads(message[1])
+					self.processeditems = state['processeditems']
+					self.processedrevisions = state['processedrevisions']
+					self.processedproperties = state['processedproperties']
+					(self.linecount, self.pagecount, self.revcount, self.duprevcount) = state['counters'][:4]
+					self.filebytecount = message[2]
+					break
+				else:
+					raise IOError('error in the pipeline:\n' + message[1])
+			parser.join()
+			reader.join()
+		finally:
+			for process in (reader, parser):
+				if process.is_alive():
+					process.terminate()
+					process.join()
+
+	# Private method that runs the parsing stage of a pipeline in a new
+	# process: the data is read from chunkQueue and the pages are put into
+	# pageQueue, in batches (see sendPipelinePages()).
+	def runPipelineParser(self,chunkQueue,pageQueue,skipLines):
+		self.processors = [] # processors only run in the main process
+		self.pipelineQueue = pageQueue
+		self.pipelinePages = []
+		batchSize = DumpProcessor.PIPELINE_BATCH_SIZE
+		for event in self.scanBuffers(ChunkQueueReader(chunkQueue),skipLines):
+			if event is None:
+				self.pipelinePages.append(page)
+				if len(self.pipelinePages) >= batchSize:
+					self.sendPipelinePages()
+			elif len(event) == 3:
+				page = (event[0],event[1],event[2],[])
+			else:
+				page[3].append(event)
+		self.sendPipelinePages()
+		self.pipelineQueue.put(('end', cPickle.dumps(self.getCheckpointState(), cPickle.HIGHEST_PROTOCOL), self.filebytecount))
+
+	# Private method to pass the pages that have been parsed on to the
+	# main process of a pipeline, together with the current counters.
+	def sendPipelinePages(self):
+		if self.pipelinePages:
+			counters = (self.linecount, self.pagecount, self.revcount, self.duprevcount, self.filebytecount)
+			self.pipelineQueue.put(('pages', self.pipelinePages, counters))
+			self.pipelinePages = []
+
+	# Private method that reads the given file and generates the events of
+	# all relevant pages, as used by iterPages(): a tuple (title,isItem,isNew)
+	# at the start of a page, a tuple (revId,timestamp,user,isIp,rawContent)
+	# for each revision, and None at the end of a page. Checkpoints are saved
+	# after the end of a page once the next event is asked for, that is,
+	# after the page has been processed.
+	def scanFile(self,file):
 		skipToNextPage = True
 		isIp = False
+		needContent = self.needContent
+		latestOnly = self.latestOnly
+		maxTimestamp = self.maxTimestamp
+		stubs = self.stubs
+		minTextLength = 0 if stubs else 41 # shorter text lines have no content
 		for line in file :
 			self.linecount += 1
 			if self.linecount % 1000000 == 0:
@@ -87,7 +657,9 @@ class DumpProcessor:
 				timestamp = ''
 				timedate = ''
 				username = ''
-				content = ''
+				textLine = ''
+				latestRevision = None # data of the latest revision, if latestOnly
+				latestRevId = -1
 			# Skip further checks if this page is irrelevant
 			elif skipToNextPage:
 				continue
@@ -97,7 +669,7 @@ class DumpProcessor:
 				timestamp = ''
 				timedate = ''
 				username = ''
-				content = ''
+				textLine = ''
 			# Finished current revision
 			elif line == '    </revision>\n':
 				self.revcount += 1
@@ -107,9 +679,17 @@ class DumpProcessor:
 					continue
 				#if prevtimedate == timedate: continue # analyse only one rev per day
 				prevtimedate = timedate
-				content = content.replace('&quot;', '"')
-				if content == '': continue
-				self.processRevision(revid,timestamp,username,isIp,content)
+				if len(textLine) <= minTextLength: continue # no content
+				if maxTimestamp is not None and timestamp >= maxTimestamp:
+					pass
+				elif latestOnly:
+					if latestRevId < int(revid):
+						latestRevId = int(revid)
+						latestRevision = (revid,timestamp,username,isIp,textLine)
+				elif needContent:
+					yield (revid,timestamp,username,isIp,revisioncontent.RevisionContent(textLine,33,len(textLine) - 8))
+				else:
+					yield (revid,timestamp,username,isIp,None)
 				self.processedrevisions[int(revid)] = True
 			# Revision ID (ids of pages have fewer spaces)
 			elif line.startswith('      <id>'):
@@ -132,7 +712,11 @@ class DumpProcessor:
 					if not line.endswith('</text>\n'):
 						logging.log(line)
 					else:
-						content = line[33:-8]
+						textLine = line # content is only extracted if needed
+			# Revision text in a stub dump, e.g. <text id="123" bytes="456" />
+			elif stubs and line.startswith('      <text '):
+				if (isItem or isProperty) and ' bytes="0"' not in line and ' deleted=' not in line:
+					textLine = line
 			# Title of current page
 			elif line.startswith('    <title>'):
 				title = line[11:-9]
@@ -156,12 +740,412 @@ class DumpProcessor:
 
 				skipToNextPage = not (isItem or isProperty)
 				if (isItem or isProperty):
-					self.startPageBlock(title,isItem,isNewEntity)
+					yield (title,isItem,isNewEntity)
 				else:
 					skipToNextPage = True
 			elif line == '  </page>\n':
-				self.endPageBlock()
+				if latestRevision is not None:
+					(revid,timestamp,username,revIsIp,textLine) = latestRevision
+					if needContent:
+						yield (revid,timestamp,username,revIsIp,revisioncontent.RevisionContent(textLine,33,len(textLine) - 8))
+					else:
+						yield (revid,timestamp,username,revIsIp,None)
+					latestRevision = None
+				yield None
+				if self.checkpoint is not None and self.checkpoint.isDue():
+					self.saveCheckpoint(file)
 
-		self.previousTime += time.time() - self.startTime
-		self.startTime = 0
-		self.logReport()
+	# Private method that reads the given file in large blocks of data and
+	# generates the same events as scanFile(), without creating a string for
+	# every line. The relevant lines are found with LINE_PATTERN, and the
+	# group that matched tells the type of the line; the usual lines at the
+	# start of a revision are read at once with REVISION_PATTERN. Other lines
+	# are never looked at in Python, and the search continues after the end of
+	# each line found, so that revision texts are not searched. Fields are
+	# only recorded as offsets into the buffer. Strings are made only for the
+	# revisions that are passed on to the processors, and their contents
+	# refer to the buffer (see RevisionContent), so duplicate revisions and
+	# skipped pages cost (almost) no memory allocation. Skipped pages are
+	# jumped over in one step.
+	#
+	# skipLines: number of lines at the start of the file to skip, as when
+	# resuming from a checkpoint
+	def scanBuffers(self,file,skipLines=0):
+		read = file.read
+		find = str.find
+		count = str.count
+		stubs = self.stubs
+		if stubs:
+			search = DumpProcessor.STUB_LINE_PATTERN.search
+			matchRevision = DumpProcessor.STUB_REVISION_PATTERN.match
+		else:
+			search = DumpProcessor.LINE_PATTERN.search
+			matchRevision = DumpProcessor.REVISION_PATTERN.match
+		matchRevisionEnd = DumpProcessor.REVISION_END_PATTERN.match
+		processedrevisions = self.processedrevisions
+		needContent = self.needContent
+		latestOnly = self.latestOnly
+		maxTimestamp = self.maxTimestamp
+		nextReport = (self.linecount / 1000000 + 1) * 1000000
+		# The buffer always starts with the line break before the next
+		# line to read; pos is the offset of this line break.
+		buf = '\n'
+		pos = 0
+		limit = 0 # offset of the line break at the end of the last complete line
+		counted = 1 # offset up to which line breaks have been counted
+		fieldsStart = -1 # start of the current revision or page, if the fields in it are used
+		skipToNextPage = True
+		isEntity = False
+		isIp = False
+		# start and end offsets of the fields of the current revision
+		(revidStart, revidEnd, timestampStart, timestampEnd) = (0, 0, 0, 0)
+		(userStart, userEnd, contentStart, contentEnd) = (0, 0, 0, 0)
+		latestRevision = None # data of the latest revision, if latestOnly
+		latestRevId = -1
+		try:
+			while True:
+				if skipLines > 0:
+					while skipLines > 0 and pos < limit:
+						pos = find(buf,'\n',pos + 1)
+						skipLines -= 1
+					counted = pos + 1 # skipped lines have been counted before the checkpoint
+					if skipLines == 0:
+						continue
+				elif skipToNextPage:
+					# Jump to the next line '  <page>\n':
+					nextPage = find(buf,'\n  <page>\n',pos,limit + 1)
+					if nextPage >= 0:
+						pos = nextPage
+						skipToNextPage = False
+						continue
+					pos = limit
+				else:
+					match = search(buf,pos,limit + 1)
+					while match is not None:
+						lineType = match.lastindex
+						lineStart = match.start() + 1
+						end = find(buf,'\n',match.end()) # line break at the end of the line
+
+						# Start of new revision:
+						if lineType == 4:
+							fieldsStart = lineStart - 1
+							(revidStart, revidEnd, timestampStart, timestampEnd) = (0, 0, 0, 0)
+							(userStart, userEnd, contentStart, contentEnd) = (0, 0, 0, 0)
+							# Most revisions look the same: read them at once if possible
+							revision = matchRevision(buf,fieldsStart,limit + 1)
+							if revision is not None:
+								(revidStart, revidEnd) = revision.span(1)
+								(timestampStart, timestampEnd) = revision.span(2)
+								if revision.start(3) >= 0:
+									(userStart, userEnd) = revision.span(3)
+									isIp = False
+								else:
+									(userStart, userEnd) = revision.span(4)
+									isIp = True
+								if revision.start(5) < 0:
+									end = revision.end() - 1
+								else: # revision contents, see below
+									lineStart = revision.start(5)
+									end = find(buf,'\n',revision.end())
+									self.linecount += count(buf,'\n',counted,lineStart) + 1
+									counted = end + 1
+									if isEntity:
+										if stubs: # the text has no content, but tells if there is any
+											if find(buf,' bytes="0"',lineStart,end) < 0 and find(buf,' deleted=',lineStart,end) < 0:
+												(contentStart, contentEnd) = (lineStart, end)
+										elif not buf.endswith('</text>',lineStart,end):
+											logging.log(buf[lineStart:end + 1])
+										else:
+											(contentStart, contentEnd) = (lineStart + 33, end - 7)
+									revisionEnd = matchRevisionEnd(buf,end,limit + 1)
+									if revisionEnd is not None:
+										end = revisionEnd.end()
+										lineType = 5
+
+						# Finished current revision
+						if lineType == 5:
+							self.revcount += 1
+							revid = buf[revidStart:revidEnd]
+							if processedrevisions[int(revid)]:
+								self.duprevcount += 1
+							elif contentStart < contentEnd:
+								if maxTimestamp is not None and buf[timestampStart:timestampEnd] >= maxTimestamp:
+									pass
+								elif latestOnly:
+									if latestRevId < int(revid):
+										latestRevId = int(revid)
+										if needContent:
+											content = revisioncontent.RevisionContent(buf,contentStart,contentEnd)
+										else:
+											content = None
+										latestRevision = (revid,buf[timestampStart:timestampEnd],buf[userStart:userEnd],isIp,content)
+								elif needContent:
+									content = revisioncontent.RevisionContent(buf,contentStart,contentEnd)
+									yield (revid,buf[timestampStart:timestampEnd],buf[userStart:userEnd],isIp,content)
+								else:
+									yield (revid,buf[timestampStart:timestampEnd],buf[userStart:userEnd],isIp,None)
+								processedrevisions[int(revid)] = True
+						# Revision ID (ids of pages have fewer spaces)
+						elif lineType == 6:
+							(revidStart, revidEnd) = (lineStart + 10, end - 5)
+						# Revision timestamp
+						elif lineType == 7:
+							(timestampStart, timestampEnd) = (lineStart + 17, end - 12)
+						# Named user (possibly a bot)
+						elif lineType == 8:
+							(userStart, userEnd) = (lineStart + 18, end - 11)
+							isIp = False
+						# Anonymous user (IP)
+						elif lineType == 9:
+							(userStart, userEnd) = (lineStart + 12, end - 5)
+							isIp = True
+						# Revision contents
+						elif lineType == 10:
+							# Count the lines up to here, so that long revision texts
+							# do not need to be searched again for counting lines.
+							self.linecount += count(buf,'\n',counted,lineStart) + 1
+							counted = end + 1
+							if isEntity:
+								if stubs:
+									if find(buf,' bytes="0"',lineStart,end) < 0 and find(buf,' deleted=',lineStart,end) < 0:
+										(contentStart, contentEnd) = (lineStart, end)
+								elif not buf.endswith('</text>',lineStart,end):
+									logging.log(buf[lineStart:end + 1])
+								else:
+									(contentStart, contentEnd) = (lineStart + 33, end - 7)
+						# Start of new page:
+						elif lineType == 1:
+							self.pagecount += 1
+							isEntity = False
+							isNewEntity = True
+							latestRevision = None
+							latestRevId = -1
+							fieldsStart = lineStart - 1
+							(revidStart, revidEnd, timestampStart, timestampEnd) = (0, 0, 0, 0)
+							(userStart, userEnd, contentStart, contentEnd) = (0, 0, 0, 0)
+						# Title of current page
+						elif lineType == 3:
+							if buf.startswith('Q',lineStart + 11) and not buf.startswith('Qu',lineStart + 11):
+								title = buf[lineStart + 11:end - 8]
+								isItem = True
+								isEntity = True
+								entityId = int(title[1:])
+								if not self.processeditems[entityId]:
+									isNewEntity = True
+									self.processeditems[entityId] = True
+								else:
+									isNewEntity = False
+							elif buf.startswith('Property:P',lineStart + 11):
+								title = buf[lineStart + 20:end - 8]
+								isItem = False
+								isEntity = True
+								entityId = int(title[1:])
+								if not self.processedproperties[entityId]:
+									isNewEntity = True
+									self.processedproperties[entityId] = True
+								else:
+									isNewEntity = False
+							else:
+								isEntity = False
+
+							if isEntity:
+								yield (title,isItem,isNewEntity)
+							else:
+								skipToNextPage = True
+								fieldsStart = -1
+								pos = end
+								break
+						# End of page
+						elif lineType == 2:
+							if latestRevision is not None:
+								(revid,timestamp,user,revIsIp,content) = latestRevision
+								yield (revid,timestamp,user,revIsIp,content)
+								latestRevision = None
+							yield None
+							if self.checkpoint is not None and self.checkpoint.isDue():
+								linecount = self.linecount
+								self.linecount += count(buf,'\n',counted,end + 1)
+								self.saveCheckpoint(None)
+								self.linecount = linecount
+						# continue after the line, without searching in the rest of it
+						pos = end
+						match = search(buf,pos,limit + 1)
+					else:
+						pos = limit
+					if skipToNextPage:
+						continue
+
+				# All complete lines in the buffer have been read. Keep the current
+				# line, and the current revision if needed, and read more data.
+				# Offsets are moved to the new buffer.
+				self.linecount += buf.count('\n',counted)
+				data = read(DumpProcessor.BUFFER_SIZE)
+				self.filebytecount += len(data)
+				if data == '':
+					if len(buf) > limit + 1:
+						self.linecount += 1 # last line without line break
+					break
+				keep = pos if fieldsStart < 0 else fieldsStart
+				buf = buf[keep:] + data
+				limit = buf.rfind('\n')
+				counted = len(buf) - len(data)
+				pos -= keep
+				if fieldsStart >= 0:
+					fieldsStart -= keep
+				revidStart -= keep
+				revidEnd -= keep
+				timestampStart -= keep
+				timestampEnd -= keep
+				userStart -= keep
+				userEnd -= keep
+				contentStart -= keep
+				contentEnd -= keep
+				if self.linecount >= nextReport:
+					self.logReport()
+					nextReport = (self.linecount / 1000000 + 1) * 1000000
+		except:
+			self.linecount += buf.count('\n',counted,pos + 1)
+			raise
+
+# Class for a page of an item or property as returned by
+# DumpProcessor.iterPages(). Iterating over the page gives its revisions,
+# in the order of the dump, as tuples (revId,timestamp,user,isIp,rawContent)
+# with the same values as in RevisionProcessor.processRevision(). The
+# revisions are read from the dump while they are iterated over, so this
+# can only be done once.
+class DumpPage:
+
+	# Constructor.
+	#
+	# title: string, e.g. 'Q42' or 'P31'
+	# isItem: bool; false for properties and true for items
+	# isNew: bool; true if no page for this entity has been
+	# 	encountered in this run yet
+	# events: iterator over the events of the dump, positioned
+	# 	after the start of this page (see DumpProcessor.scanFile())
+	def __init__(self,title,isItem,isNew,events):
+		self.title = title
+		self.isItem = isItem
+		self.isNew = isNew
+		self.events = events
+		self.finished = False
+
+	def __iter__(self):
+		if self.finished:
+			return
+		for event in self.events:
+			if event is None:
+				break
+			yield event
+		self.finished = True
+
+	# Skip all revisions of the page that have not been read yet.
+	def skipRevisions(self):
+		for revision in self:
+			pass
+
+# Lines that are relevant for DumpProcessor.scanBuffers(), each preceded by
+# the line break of the line before. The number of the group that matches
+# tells the type of the line. Lines that must match completely are followed
+# by a lookahead, so that their line break can start the next match.
+DumpProcessor.LINE_PATTERN = re.compile('\n(?:(  <page>(?=\n))|(  </page>(?=\n))|(    <title>)|(    <revision>(?=\n))|' +\
+	'(    </revision>(?=\n))|(      <id>)|(      <timestamp>)|(        <username>)|(        <ip>)|' +\
+	'(      <text xml:space="preserve">))')
+# The lines at the start of a revision in the usual form, up to the start
+# of the text, as read by DumpProcessor.scanBuffers(). The groups are the
+# revision id, the timestamp, the user name or IP address, and the start of
+# the text line. Revisions that look different are read line by line.
+DumpProcessor.REVISION_PATTERN = re.compile('\n    <revision>\n      <id>([^<\n]*)</id>\n' +\
+	'(?:      <parentid>[^\n]*\n)?      <timestamp>([^<\n]*)</timestamp>\n      <contributor>\n' +\
+	'        <(?:username>([^<\n]*)</username>\n        <id>[^\n]*|ip>([^<\n]*)</ip>)\n      </contributor>\n' +\
+	'(?:      <minor />\n)?(?:      <comment>[^\n]*\n)?(?:      <model>[^\n]*\n)?(?:      <format>[^\n]*\n)?' +\
+	'(      <text xml:space="preserve">)?')
+# The same patterns for stub dumps (see DumpProcessor.setStubs()), where the
+# text of a revision is an empty element with attributes.
+DumpProcessor.STUB_LINE_PATTERN = re.compile(DumpProcessor.LINE_PATTERN.pattern.replace('<text xml:space="preserve">','<text '))
+DumpProcessor.STUB_REVISION_PATTERN = re.compile(DumpProcessor.REVISION_PATTERN.pattern.replace('<text xml:space="preserve">','<text '))
+# The usual lines after the text of a revision, each preceded by the line
+# break of the line before.
+DumpProcessor.REVISION_END_PATTERN = re.compile('\n(?:      <sha1>[^\n]*\n)?    </revision>(?=\n)')
+# Number of bytes that DumpProcessor.scanBuffers() reads at once.
+DumpProcessor.BUFFER_SIZE = 1024 * 1024
+# Maximal number of revisions of a page that DumpProcessor.processPages()
+# passes on at once.
+DumpProcessor.REVISION_BATCH_SIZE = 1000
+# Number of pages that the parsing stage of a pipeline passes on at once
+# (see DumpProcessor.setPipeline()).
+DumpProcessor.PIPELINE_BATCH_SIZE = 100
+
+# Class for reading the chunks of data that the first stage of a pipeline
+# puts into a queue (see DumpProcessor.setPipeline()), like a file.
+class ChunkQueueReader:
+
+	def __init__(self,chunkQueue):
+		self.chunkQueue = chunkQueue
+		self.finished = False
+
+	# Return the next chunk of data, or '' at the end of the file. The
+	# size of the chunks is determined by the first stage of the pipeline.
+	def read(self,size=-1):
+		if self.finished:
+			return ''
+		data = self.chunkQueue.get()
+		if type(data) is tuple:
+			raise IOError('error in the reading stage of the pipeline:\n' + data[1])
+		if data == '':
+			self.finished = True
+		return data
+
+# Processors of the current parallel run. Set in the parent process right
+# before the worker processes are forked, so that every worker gets its own copy.
+_parallelProcessors = None
+
+# Process one batch of pages in a worker process and return the partial
+# results of all processors, in the order in which they were registered.
+def _processParallelBatch(batch):
+	for processor in _parallelProcessors:
+		processor.startParallelBatch()
+	for (title,isItem,isNewEntity,revisions) in batch:
+		for processor in _parallelProcessors:
+			processor.startPageBlock(title,isItem,isNewEntity)
+		for revisionBatch in revisions:
+			_dispatchRevisions(_parallelProcessors,revisionBatch)
+		for processor in _parallelProcessors:
+			processor.endPageBlock()
+	return [ processor.endParallelBatch() for processor in _parallelProcessors ]
+
+# Pass the given list of revisions of one page, as tuples
+# (revId,timestamp,user,isIp,rawContent), on to the given processors.
+# Processors that support batches get all revisions at once, as one tuple
+# of values for each parameter of processRevision().
+def _dispatchRevisions(processors,revisions):
+	columns = None
+	for processor in processors:
+		if processor.supportsRevisionBatches():
+			if columns is None:
+				columns = zip(*revisions)
+			processor.processRevisionBatch(*columns)
+		else:
+			for (revId,timestamp,user,isIp,rawContent) in revisions:
+				processor.processRevision(revId,timestamp,user,isIp,rawContent)
+
+# Run the reading stage of a pipeline (see DumpProcessor.setPipeline()):
+# read the given file in chunks and put them into chunkQueue. The end of
+# the file is marked by an empty chunk.
+def _readPipelineChunks(file,chunkQueue):
+	try:
+		while True:
+			data = file.read(DumpProcessor.BUFFER_SIZE)
+			chunkQueue.put(data)
+			if data == '':
+				break
+		file.close()
+	except:
+		chunkQueue.put(('error', traceback.format_exc()))
+
+# Run the parsing stage of a pipeline (see DumpProcessor.runPipelineParser()).
+def _parsePipelinePages(dumpProcessor,chunkQueue,pageQueue,skipLines):
+	try:
+		dumpProcessor.runPipelineParser(chunkQueue,pageQueue,skipLines)
+	except:
+		pageQueue.put(('error', traceback.format_exc()))
@@ -1,41 +1,106 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import json
+import collections, json, re
+import logging, revisioncontent
 
-# Helper class to parse dump data, including some very simple caches for better reuse
+# Helper class to parse dump data, including some very simple caches for better reuse.
+#
+# Decoded revision contents are kept in an LRU cache keyed by revision id, so
+# that all processors that share one helper decode each revision only once,
+# even if they ask for it in turns. The cache is bounded by a number of
+# entries and by the total length of the JSON texts it was decoded from (see
+# setCacheLimits()).
 class ProcessingHelper:
 
 	daysUntilMonth = ( 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334 )
 
 	def __init__(self):
-		self.valRev = False
-		self.val = False
+		self.valCache = collections.OrderedDict() # revision id -> (value, size, decoded fields or None for all), least recently used first
+		self.valCacheSize = 0 # total size of the cached values
+		self.maxCacheEntries = ProcessingHelper.CACHE_ENTRIES
+		self.maxCacheBytes = ProcessingHelper.CACHE_BYTES
+		self.cacheHits = 0
+		self.cacheMisses = 0
+		self.cacheEvictions = 0
 		self.dateInfoStamp = False
 		self.dateInfo = False
 
-	def getVal(self, rev, rawContent):
-		if rev != self.valRev:
+	# Set the maximal number of decoded revisions that are cached, and the
+	# maximal total length of their JSON texts in bytes. Values that are
+	# longer than maxBytes are returned but not cached. Setting either limit
+	# to 0 disables the cache.
+	def setCacheLimits(self, maxEntries, maxBytes):
+		self.maxCacheEntries = maxEntries
+		self.maxCacheBytes = maxBytes
+		self.__evict()
+
+	# Return the decoded content of the revision of the given id. rawContent
+	# is a revisioncontent.RevisionContent (which caches the decoded data, so
+	# it is shared with other helpers) or a string as found in the dump.
+	#
+	# fields: iterable of the names of the top-level fields that are needed,
+	# 	or None to decode all fields. Only the given fields are decoded then,
+	# 	and the result may lack other fields (see _decodeFields()).
+	def getVal(self, rev, rawContent, fields = None):
+		rev = int(rev)
+		if fields is not None:
+			fields = frozenset(fields)
+		entry = self.valCache.pop(rev, None)
+		if entry is not None:
+			if entry[2] is None or (fields is not None and fields <= entry[2]):
+				self.cacheHits += 1
+				self.valCache[rev] = entry # most recently used
+				return entry[0]
+			self.valCacheSize -= entry[1]
+
+		self.cacheMisses += 1
+		if isinstance(rawContent, revisioncontent.RevisionContent):
+			size = rawContent.end - rawContent.start
+			if rawContent.value is not None:
+				fields = None # decoded by another helper already
+		else:
+			size = len(rawContent)
+		if fields is None:
 			#null = None # interpret "null" in JSON output as None
-			#self.val = eval(rawContent.replace('&quot;', '"'))
-			self.val = json.loads(rawContent.replace('&quot;', '"'))
-			if 'claims' not in self.val: # make sure this is always set
-				self.val['claims'] = []
-			if 'description' not in self.val or not self.val['description']: # make sure this is always set and a dictionary
-				self.val['description'] = {}
-			if 'aliases' not in self.val or not self.val['aliases']: # make sure this is always set and a dictionary
-				self.val['aliases'] = {}
-			if 'links' not in self.val or not self.val['links']: # make sure this is always set and a dictionary
-				self.val['links'] = {}
-			if 'label' not in self.val or not self.val['label']: # make sure this is always set and a dictionary
-				self.val['label'] = {}
-			self.valRev = rev
-
-		#if '37.85' in str(self.val):
-			#print "\n\nRAWDATA\n\n" + rawContent
-			#print "\n\nVALUE\n\n" + str(self.val)
-			#exit()
-		return self.val
+			#val = eval(rawContent.replace('&quot;', '"'))
+			if isinstance(rawContent, revisioncontent.RevisionContent):
+				val = rawContent.getData()
+			else:
+				val = json.loads(rawContent.replace('&quot;', '"'))
+		elif entry is not None and entry[2] is not None: # add the missing fields to the cached value
+			val = entry[0]
+			val.update(_decodeFields(_getText(rawContent), fields - entry[2]))
+			fields = fields | entry[2]
+		else:
+			val = _decodeFields(_getText(rawContent), fields)
+
+		if fields is None or 'claims' in fields:
+			if 'claims' not in val: # make sure this is always set
+				val['claims'] = []
+		for field in ('description', 'aliases', 'links', 'label'):
+			if (fields is None or field in fields) and (field not in val or not val[field]): # make sure this is always set and a dictionary
+				val[field] = {}
+
+		if self.maxCacheEntries > 0 and size <= self.maxCacheBytes:
+			self.valCache[rev] = (val, size, fields)
+			self.valCacheSize += size
+			self.__evict()
+		return val
+
+	# Print information about the use of the cache of decoded revisions.
+	def logReport(self):
+		logging.log('     * Decoded revision cache: ' + str(self.cacheHits) + ' hits, ' +\
+			str(self.cacheMisses) + ' misses, ' + str(self.cacheEvictions) + ' evictions, ' +\
+			str(len(self.valCache)) + ' entries with ' + str(round(self.valCacheSize / 1048576.0,2)) + ' MB.')
+
+	# Private method to remove the least recently used values until the
+	# cache is within its limits.
+	def __evict(self):
+		while self.valCache and (len(self.valCache) > self.maxCacheEntries or self.valCacheSize > self.maxCacheBytes):
+			(rev, entry) = self.valCache.popitem(False)
+			self.valCacheSize -= entry[1]
+			self.cacheEvictions += 1
 
 	def getDateInfo(self, dateInfoStamp):
 		if self.dateInfoStamp != dateInfoStamp:
@@ -71,4 +136,51 @@ class ProcessingHelper:
 		if month == 2:
 			leapYearDay = 0
 
-		return (fullYears+2012, month, dayOfYear-ProcessingHelper.daysUntilMonth[month-1]-leapYearDay + 1)
\ No newline at end of file
+		return (fullYears+2012, month, dayOfYear-ProcessingHelper.daysUntilMonth[month-1]-leapYearDay + 1)
+
+# Return the unescaped text of the given RevisionContent or dump string.
+def _getText(rawContent):
+	if isinstance(rawContent, revisioncontent.RevisionContent):
+		return rawContent.getText()
+	return rawContent.replace('&quot;', '"')
+
+# Decode only the given top-level fields of the given JSON object text, and
+# return them as a dictionary. The keys of the fields are located with a
+# regular expression, and only their values are decoded, so that large fields
+# that are not needed (e.g., labels in many languages) are merely skipped.
+# A key that follows "{" or "," cannot be part of a string (since quotes in
+# strings are escaped), so the nesting depth of a key is found by counting
+# the brackets outside of strings in the text before it. Keys of nested
+# objects are ignored.
+def _decodeFields(text, fields):
+	pattern = _fieldPatterns.get(fields)
+	if pattern is None:
+		pattern = re.compile('[{,]\\s*"(' + '|'.join([ re.escape(field) for field in sorted(fields) ]) + ')"\\s*:\\s*')
+		_fieldPatterns[fields] = pattern
+	result = {}
+	position = 0
+	depth = 0 # nesting depth at position
+	while len(result) < len(fields):
+		match = pattern.search(text, position)
+		if match is None:
+			break
+		depth += _getDepthChange(text[position:match.start() + 1])
+		if depth == 1:
+			(result[match.group(1)], position) = _decoder.raw_decode(text, match.end())
+		else:
+			position = match.start() + 1
+	return result
+
+# Return the change of the nesting depth of JSON values within the given
+# part of a JSON text, which must start and end outside of strings.
+def _getDepthChange(part):
+	part = _stringPattern.sub('', part)
+	return part.count('{') + part.count('[') - part.count('}') - part.count(']')
+
+_decoder = json.JSONDecoder()
+_fieldPatterns = {} # frozenset of fields -> compiled pattern (see _decodeFields())
+_stringPattern = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+# Default limits of the cache of decoded revisions (see setCacheLimits()).
+ProcessingHelper.CACHE_ENTRIES = 1000
+ProcessingHelper.CACHE_BYTES = 64 * 1024 * 1024
@@ -0,0 +1,295 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging
+import os, time, json, gzip, bz2, types, collections
+import multiprocessing
+
+# Class for processing Wikidata JSON dumps (such as
+# wikidata-20141103-all.json.gz), which contain the current data of all
+# entities, one entity per line, instead of revisions in MediaWiki XML.
+# Each entity is converted into the format of the revisions in the XML
+# dumps, as returned by ProcessingHelper.getVal() (see convertEntity()),
+# and passed on to the processEntity() method of the registered
+# processors. Processors are entity processors (see
+# entityprocessor.EntityProcessor) or rplatest.RPLatest objects, which
+# pass the entities on to their own entity processors, so that the same
+# exports can be made from both kinds of dumps.
+#
+# Lines are independent, so they can be processed by parallel workers;
+# see setParallelWorkers().
+class JsonDumpProcessor:
+
+	def __init__(self):
+		self.processors = []
+		self.workers = 1
+		self.pool = None
+		self.pendingTasks = None
+		self.entitycount = 0
+		self.bytecount = 0
+		self.previousTime = 0
+		self.startTime = 0
+
+	# Add a processor that will be called for each entity. It must implement
+	# processEntity(title,revision,isItem,data) and logReport() like an
+	# entity processor, and the methods for parallel processing if this is used.
+	def registerProcessor(self,processor):
+		self.processors.append(processor)
+
+	# Parse and process the entities with the given number of worker
+	# processes, each of which runs its own copy of the registered
+	# processors. An uncompressed dump file is split into ranges of
+	# RANGE_SIZE bytes that the workers read by themselves. Other files
+	# (e.g., compressed ones) are read by the calling process and sent to
+	# the workers in batches of BATCH_SIZE lines. Either way, the partial
+	# results are merged back in the order of the dump (see
+	# EntityProcessor.mergeParallelBatch()).
+	#
+	# Parallel processing is only used if all registered processors
+	# support it; otherwise all entities are processed in the calling process.
+	def setParallelWorkers(self,workers):
+		self.workers = workers
+
+	def canProcessParallel(self):
+		if self.workers <= 1:
+			return False
+		for processor in self.processors:
+			if not processor.supportsParallel():
+				return False
+		return True
+
+	# Process the given JSON dump file with the registered processors.
+	def processFile(self,file):
+		self.startTime = time.time()
+		if self.canProcessParallel():
+			logging.log('Processing entities with ' + str(self.workers) + ' worker processes.')
+			self.startWorkers()
+			try:
+				if isinstance(file, types.FileType) and os.path.isfile(file.name):
+					self.processRanges(file.name)
+				else:
+					self.processBatches(file)
+			except:
+				self.terminateWorkers()
+				raise
+			self.stopWorkers()
+		else:
+			for line in file:
+				self.bytecount += len(line)
+				entity = _parseLine(line)
+				if entity is not None:
+					self.entitycount += 1
+					(title, revision, isItem, data) = convertEntity(entity)
+					for processor in self.processors:
+						processor.processEntity(title,revision,isItem,data)
+				if self.entitycount % 100000 == 0 and entity is not None:
+					self.logReport()
+		self.previousTime += time.time() - self.startTime
+		self.startTime = 0
+		self.logReport()
+
+	# Private method to let the workers process the given uncompressed
+	# file in ranges of bytes.
+	def processRanges(self,fileName):
+		size = os.path.getsize(fileName)
+		for start in range(0, size, JsonDumpProcessor.RANGE_SIZE):
+			self.submitTask(('range', fileName, start, min(start + JsonDumpProcessor.RANGE_SIZE, size)))
+
+	# Private method to send the lines of the given file to the workers in batches.
+	def processBatches(self,file):
+		batch = []
+		for line in file:
+			batch.append(line)
+			if len(batch) >= JsonDumpProcessor.BATCH_SIZE:
+				self.submitTask(('lines', batch))
+				batch = []
+		if batch:
+			self.submitTask(('lines', batch))
+
+	def startWorkers(self):
+		global _parallelProcessors
+		_parallelProcessors = self.processors
+		self.pool = multiprocessing.Pool(self.workers)
+		self.pendingTasks = collections.deque()
+
+	# Private method to send a task to the workers. At most two tasks per
+	# worker are queued; if there are more, the oldest task is waited for
+	# and merged first.
+	def submitTask(self,task):
+		self.pendingTasks.append(self.pool.apply_async(_processParallelTask,(task,)))
+		while len(self.pendingTasks) > 2 * self.workers:
+			self.mergeTask()
+
+	# Private method to merge the results of the oldest pending task.
+	def mergeTask(self):
+		(entities, size, results) = self.pendingTasks.popleft().get()
+		for i in range(len(self.processors)):
+			self.processors[i].mergeParallelBatch(results[i])
+		previousCount = self.entitycount
+		self.entitycount += entities
+		self.bytecount += size
+		if self.entitycount / 100000 > previousCount / 100000:
+			self.logReport()
+
+	def stopWorkers(self):
+		global _parallelProcessors
+		while self.pendingTasks:
+			self.mergeTask()
+		self.pool.close()
+		self.pool.join()
+		self.pool = None
+		self.pendingTasks = None
+		_parallelProcessors = None
+
+	# Private method to abort parallel processing after an error.
+	def terminateWorkers(self):
+		global _parallelProcessors
+		for result in self.pendingTasks:
+			result.wait()
+		self.pool.close()
+		self.pool.join()
+		self.pool = None
+		self.pendingTasks = None
+		_parallelProcessors = None
+
+	def logReport(self):
+		seconds = self.previousTime
+		if self.startTime != 0:
+			seconds += time.time() - self.startTime
+		logging.log(' ... processed ' + str(self.entitycount) + ' entities (' + str(round(self.bytecount / 1048576.0,2)) +\
+			' MB) in ' + str(round(seconds,2)) + ' seconds.')
+		if seconds > 0:
+			logging.log(' ... read ' + str(round(self.bytecount / 1048576.0 / seconds,2)) + ' MB/s, ' + str(int(self.entitycount / seconds)) + ' entities/s.')
+		for processor in self.processors:
+			processor.logReport()
+
+JsonDumpProcessor.RANGE_SIZE = 16 * 1024 * 1024
+JsonDumpProcessor.BATCH_SIZE = 1000
+
+# Open the JSON dump of the given name, which may be compressed
+# with gzip (.gz) or bzip2 (.bz2).
+def openFile(fileName):
+	if fileName.endswith('.gz'):
+		return gzip.open(fileName)
+	elif fileName.endswith('.bz2'):
+		return bz2.BZ2File(fileName)
+	else:
+		return open(fileName)
+
+# Convert an entity as found in the JSON dumps into the format of the
+# revisions in the XML dumps, and return a tuple (title,revision,isItem,data)
+# as used in EntityProcessor.processEntity(). The data has all the keys
+# that are set by ProcessingHelper.getVal(): 'label' and 'description'
+# map languages to strings, 'aliases' maps languages to lists of strings,
+# 'links' maps sites to titles, and 'claims' is a list of statements
+# {'m': snak, 'q': [snak, ...], 'g': id, 'rank': 0/1/2, 'refs': [[snak, ...], ...]}
+# with snaks of the form ['value', property number, value type, value],
+# ['somevalue', property number] or ['novalue', property number]. Properties
+# also have a 'datatype'. Site link badges are not kept.
+def convertEntity(entity):
+	data = { 'entity': entity['id'].lower(), 'label': _getValues(entity.get('labels')),\
+		'description': _getValues(entity.get('descriptions')), 'aliases': {}, 'links': {}, 'claims': [] }
+	aliases = entity.get('aliases')
+	if aliases:
+		for (language, values) in aliases.iteritems():
+			if isinstance(values, dict): # some dumps use objects instead of lists
+				values = values.values()
+			data['aliases'][language] = [ value['value'] for value in values ]
+	sitelinks = entity.get('sitelinks')
+	if sitelinks:
+		for (site, sitelink) in sitelinks.iteritems():
+			data['links'][site] = sitelink['title']
+	claims = entity.get('claims')
+	if claims:
+		for propertyId in sorted(claims, key = lambda propertyId: int(propertyId[1:])):
+			for statement in claims[propertyId]:
+				data['claims'].append({ 'm': _convertSnak(statement['mainsnak']),\
+					'q': _convertSnaks(statement.get('qualifiers'), statement.get('qualifiers-order')),\
+					'g': statement.get('id'), 'rank': _ranks.get(statement.get('rank'), 1),\
+					'refs': [ _convertSnaks(reference['snaks'], reference.get('snaks-order')) for reference in statement.get('references', []) ] })
+	isItem = entity['type'] == 'item'
+	if not isItem:
+		data['datatype'] = entity['datatype']
+	return (str(entity['id']), entity.get('lastrevid', 0), isItem, data) # titles are byte strings in XML dumps
+
+_ranks = { 'deprecated': 0, 'normal': 1, 'preferred': 2 }
+
+# Return the dictionary of language or site keys to values for the given
+# labels or descriptions; empty ones can be lists in the dumps.
+def _getValues(values):
+	if not values:
+		return {}
+	return dict([ (key, value['value']) for (key, value) in values.iteritems() ])
+
+def _convertSnaks(snaks, order):
+	if not snaks:
+		return []
+	if order is None:
+		order = sorted(snaks, key = lambda propertyId: int(propertyId[1:]))
+	return [ _convertSnak(snak) for propertyId in order for snak in snaks[propertyId] ]
+
+def _convertSnak(snak):
+	propertyNumber = int(snak['property'][1:])
+	if snak['snaktype'] != 'value':
+		return [snak['snaktype'], propertyNumber]
+	datavalue = snak['datavalue']
+	value = datavalue['value']
+	if datavalue['type'] == 'time':
+		# XML dumps give years with 11 digits (e.g., +00000002013-01-01T00:00:00Z)
+		timeString = value['time']
+		yearEnd = timeString.index('-', 1)
+		value['time'] = timeString[0] + timeString[1:yearEnd].zfill(11) + timeString[yearEnd:]
+	return ['value', propertyNumber, datavalue['type'], value]
+
+# Return the entity of the given line of a JSON dump, or None if the
+# line holds no entity (the opening and closing brackets).
+def _parseLine(line):
+	line = line.rstrip()
+	if line.endswith(','):
+		line = line[:-1]
+	if len(line) <= 1:
+		return None
+	return json.loads(line)
+
+# The processors used in parallel worker processes. This is set in the
+# calling process before the worker processes are forked.
+_parallelProcessors = None
+
+# Process one task in a worker process: either ('range',fileName,start,end),
+# all lines that start within the given range of bytes of the file (see
+# _readRange()), or ('lines',lines). Return the number of entities and
+# bytes, and the partial results of all processors.
+def _processParallelTask(task):
+	for processor in _parallelProcessors:
+		processor.startParallelBatch()
+	if task[0] == 'range':
+		lines = _readRange(task[1], task[2], task[3])
+	else:
+		lines = task[1]
+	entities = 0
+	size = 0
+	for line in lines:
+		size += len(line)
+		entity = _parseLine(line)
+		if entity is not None:
+			entities += 1
+			(title, revision, isItem, data) = convertEntity(entity)
+			for processor in _parallelProcessors:
+				processor.processEntity(title,revision,isItem,data)
+	return (entities, size, [ processor.endParallelBatch() for processor in _parallelProcessors ])
+
+# Generator for the lines of the given file that start within the given
+# range of bytes. Together, the ranges of a file yield every line once.
+def _readRange(fileName, start, end):
+	file = open(fileName)
+	position = start
+	if start > 0:
+		file.seek(start - 1)
+		position += len(file.readline()) - 1 # skip the line that started before the range
+	while position < end:
+		line = file.readline()
+		if not line:
+			break
+		position += len(line)
+		yield line
+	file.close()
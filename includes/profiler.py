@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import sys, os, time, signal, collections
+import logging
+
+# Class for profiling the calling process, e.g., a whole run of a script.
+# Two modes are supported:
+#
+# 'sample': a statistical sampler that records the stack of the running
+# 	code at regular intervals of CPU time (using SIGPROF). The overhead is
+# 	low, so this can be used for long runs. Each sample counts as one.
+# 'trace': deterministic profiling that records every call and return of
+# 	Python and built-in functions, weighted by CPU time in microseconds.
+# 	This is much slower, so it should only be used for a small part of a
+# 	dump (see DumpProcessor.setMaxPages()).
+#
+# Only the calling process is profiled, not the worker processes that
+# are started during the run.
+#
+# The results are written by writeResults() in two files: a file of folded
+# stacks (one line per distinct stack with the functions from the outermost
+# to the innermost, separated by ';', and its weight), which can be turned
+# into a flame graph with flamegraph.pl or speedscope, and a summary that
+# lists the functions by their total and own share of the weight.
+class Profiler:
+
+	def __init__(self, mode = 'sample', interval = 0.005):
+		if mode not in ('sample', 'trace'):
+			raise ValueError('unknown profiling mode: ' + str(mode))
+		self.mode = mode
+		self.interval = interval
+		self.stacks = collections.defaultdict(int) # stack (tuple of functions) -> weight
+		self.names = {} # code object -> name used in results
+		self.traceStack = None # list of [stack, time of last event] in mode 'trace'
+		self.startTime = 0
+		self.timeNeeded = 0
+
+	# Start profiling.
+	def start(self):
+		self.startTime = time.time()
+		if self.mode == 'sample':
+			signal.signal(signal.SIGPROF, self.__sample)
+			signal.siginterrupt(signal.SIGPROF, False) # do not interrupt reading files etc.
+			signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+		else:
+			self.traceStack = []
+			sys.setprofile(self.__trace)
+
+	# Stop profiling. Profiling can be started again later.
+	def stop(self):
+		if self.mode == 'sample':
+			signal.setitimer(signal.ITIMER_PROF, 0, 0)
+			signal.signal(signal.SIGPROF, signal.SIG_DFL)
+		else:
+			sys.setprofile(None)
+			now = time.clock()
+			while self.traceStack:
+				self.__leave(now)
+		self.timeNeeded += time.time() - self.startTime
+
+	# Write the results to the files fileNamePrefix + '.folded' (stacks)
+	# and fileNamePrefix + '.txt' (summary).
+	def writeResults(self, fileNamePrefix):
+		file = open(fileNamePrefix + '.folded', 'w')
+		for (stack, weight) in sorted(self.stacks.iteritems()):
+			file.write(';'.join(stack) + ' ' + str(weight) + '\n')
+		file.close()
+
+		totalWeight = sum(self.stacks.itervalues())
+		ownWeights = collections.defaultdict(int)
+		totalWeights = collections.defaultdict(int)
+		for (stack, weight) in self.stacks.iteritems():
+			ownWeights[stack[-1]] += weight
+			for name in set(stack): # count recursive functions only once
+				totalWeights[name] += weight
+
+		file = open(fileNamePrefix + '.txt', 'w')
+		if self.mode == 'sample':
+			file.write('Profile of ' + str(totalWeight) + ' samples taken every ' + str(self.interval) + ' seconds of CPU time')
+		else:
+			file.write('Profile of ' + str(round(totalWeight / 1000000.0, 2)) + ' seconds of CPU time')
+		file.write(' in ' + str(round(self.timeNeeded, 2)) + ' seconds.\n\n')
+		file.write('  total%    own%  function\n')
+		for name in sorted(totalWeights, key = lambda name: (-totalWeights[name], name)):
+			file.write('%7.2f %7.2f  %s\n' % (100.0 * totalWeights[name] / max(totalWeight, 1),\
+				100.0 * ownWeights[name] / max(totalWeight, 1), name))
+		file.close()
+		logging.log('Wrote profile to ' + fileNamePrefix + '.folded and ' + fileNamePrefix + '.txt.')
+
+	# Signal handler for taking a sample in mode 'sample'.
+	def __sample(self, signum, frame):
+		stack = []
+		while frame is not None:
+			stack.append(self.__getName(frame.f_code))
+			frame = frame.f_back
+		stack.reverse()
+		self.stacks[tuple(stack)] += 1
+
+	# Profile function (see sys.setprofile()) for mode 'trace'.
+	def __trace(self, frame, event, arg):
+		now = time.clock()
+		if event == 'call':
+			self.__enter(frame.f_code, now)
+		elif event == 'c_call':
+			self.__enter(arg, now)
+		elif event == 'return' or event == 'c_return' or event == 'c_exception':
+			if self.traceStack:
+				self.__leave(now)
+
+	def __enter(self, function, now):
+		if self.traceStack:
+			entry = self.traceStack[-1]
+			self.stacks[entry[0]] += int((now - entry[1]) * 1000000)
+			stack = entry[0] + (self.__getName(function),)
+		else:
+			stack = (self.__getName(function),)
+		self.traceStack.append([stack, now])
+
+	def __leave(self, now):
+		entry = self.traceStack.pop()
+		self.stacks[entry[0]] += int((now - entry[1]) * 1000000)
+		if self.traceStack:
+			self.traceStack[-1][1] = now
+
+	# Return the name of the given code object, in the form
+	# 'function (file:line)', or of the given built-in function, in the
+	# form 'function (module)'.
+	def __getName(self, function):
+		if not hasattr(function, 'co_name'):
+			# Built-in methods are new objects for every call, which must
+			# not be kept, so they are not cached.
+			module = getattr(function, '__module__', None)
+			if module is None:
+				owner = getattr(function, '__self__', None)
+				module = type(owner).__name__ if owner is not None else '?'
+			return (getattr(function, '__name__', '?') + ' (' + module + ')').replace(';', ',')
+		name = self.names.get(function)
+		if name is None:
+			name = function.co_name + ' (' + os.path.basename(function.co_filename) + ':' + str(function.co_firstlineno) + ')'
+			name = name.replace(';', ',')
+			self.names[function] = name
+		return name
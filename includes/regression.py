@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging
+import dumpgenerator, processdump, processinghelper, revisionprocessor
+import rplatest, rpedits, epTurtleFileWriter, entityDataFilter
+import os, time, json, resource, tempfile, shutil, platform, traceback
+import multiprocessing, Queue
+
+# Class for detecting performance regressions. A fixed set of workloads is
+# run on a corpus that is generated with dumpgenerator.DumpGenerator:
+#
+# 'parse': parsing the corpus with DumpProcessor (RPStats only)
+# 'latest-turtle': parsing with RPLatest and EPTurtleFile (output discarded)
+# 'editcount': parsing with RPEditCount
+# 'dbstat': DBStatAnalyzer.makeStatistics() on a database that contains
+# 	the RPWeekly data of the corpus; only run if enabled with
+# 	setDatabaseWorkload(), since it needs the MySQL database of wda.ini
+#
+# Each workload runs in a new process, so that its peak memory (maximal
+# resident set size) can be measured. Each workload is run several times,
+# and the best time and the lowest peak memory are kept.
+#
+# Times depend on the speed of the machine, so all times are also given
+# relative to the time of a fixed calibration workload (pure Python code
+# that decodes and encodes JSON and works with strings and dictionaries),
+# which is measured in the same way. Only these relative times are
+# compared to the baseline (see compare()), so that a baseline that was
+# recorded on another machine can still be used.
+class PerformanceHarness:
+
+	def __init__(self, pages = 2000, revisions = 3, seed = 0, repeat = 3):
+		self.pages = pages
+		self.revisions = revisions
+		self.seed = seed
+		self.repeat = repeat
+		self.workloads = [ ('parse', _runParse), ('latest-turtle', _runLatestTurtle), ('editcount', _runEditCount) ]
+		self.results = None
+
+	# Also run the workload 'dbstat'. Note that this drops and recreates the
+	# tables in the database that is configured in wda.ini.
+	def setDatabaseWorkload(self, enabled):
+		names = self.getWorkloadNames()
+		if enabled and 'dbstat' not in names:
+			self.workloads.append(('dbstat', _runDbStat))
+		elif not enabled and 'dbstat' in names:
+			del self.workloads[names.index('dbstat')]
+
+	def getWorkloadNames(self):
+		return [name for (name, function) in self.workloads]
+
+	# Run the workloads of the given names (default: all), and return the
+	# results as a dictionary that can be written as JSON: the settings of
+	# the corpus, the time of the calibration workload, and for each
+	# workload its time in seconds, its time relative to the calibration
+	# workload, and its peak memory in MB.
+	def run(self, names = None):
+		directory = tempfile.mkdtemp(prefix = 'wda-regression-')
+		try:
+			fileName = os.path.join(directory, 'corpus.xml')
+			logging.log('Generating corpus with ' + str(self.pages) + ' pages and ' + str(self.revisions) + ' revisions per page ...')
+			file = open(fileName, 'w')
+			dumpgenerator.DumpGenerator(self.pages, self.revisions, self.seed).writeDump(file)
+			file.close()
+
+			(calibrationSeconds, calibrationRss) = self.__measure('calibration', _runCalibration, None)
+			self.results = { 'corpus': { 'pages': self.pages, 'revisions': self.revisions, 'seed': self.seed, 'bytes': os.path.getsize(fileName) },\
+				'machine': platform.node() + ' (' + platform.machine() + ', Python ' + platform.python_version() + ')',\
+				'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'calibrationSeconds': round(calibrationSeconds, 6), 'workloads': {} }
+			for (name, function) in self.workloads:
+				if names is not None and name not in names:
+					continue
+				if name == 'dbstat':
+					_loadDatabase(fileName)
+				(seconds, peakRss) = self.__measure(name, function, fileName)
+				self.results['workloads'][name] = { 'seconds': round(seconds, 6),\
+					'relativeTime': round(seconds / calibrationSeconds, 4), 'peakRssMb': round(peakRss, 1) }
+		finally:
+			shutil.rmtree(directory)
+		return self.results
+
+	# Compare the results of the last run with the given baseline (as
+	# returned by run() or loadResults()), and return a list of messages
+	# about all regressions, which is empty if there are none. Times that
+	# are more than the fraction timeTolerance above those of the baseline
+	# are regressions, and so is peak memory that is more than the fraction
+	# memoryTolerance above that of the baseline. Workloads that are missing
+	# in one of the results are not compared.
+	def compare(self, baseline, timeTolerance = 0.1, memoryTolerance = 0.2):
+		messages = []
+		if baseline['corpus'] != self.results['corpus']:
+			return ['The corpus of the baseline ' + str(baseline['corpus']) + ' is different from the current corpus ' + str(self.results['corpus']) + '.']
+		for name in sorted(self.results['workloads']):
+			if name not in baseline['workloads']:
+				continue
+			current = self.results['workloads'][name]
+			base = baseline['workloads'][name]
+			if current['relativeTime'] > base['relativeTime'] * (1 + timeTolerance):
+				messages.append('Workload ' + name + ' is ' + str(round(100.0 * (current['relativeTime'] / base['relativeTime'] - 1), 1)) +\
+					'% slower than the baseline (relative time ' + str(current['relativeTime']) + ' instead of ' + str(base['relativeTime']) + ').')
+			if current['peakRssMb'] > base['peakRssMb'] * (1 + memoryTolerance):
+				messages.append('Workload ' + name + ' needs ' + str(round(100.0 * (current['peakRssMb'] / base['peakRssMb'] - 1), 1)) +\
+					'% more memory than the baseline (' + str(current['peakRssMb']) + ' MB instead of ' + str(base['peakRssMb']) + ' MB).')
+		return messages
+
+	# Write a table of the results of the last run, compared to the given
+	# baseline if any, to the given file.
+	def writeReport(self, file, baseline = None):
+		file.write('Calibration workload: ' + str(round(self.results['calibrationSeconds'], 3)) + ' seconds on ' + self.results['machine'] + '\n')
+		file.write('%-15s %9s %9s %9s %9s %9s\n' % ('Workload', 'Seconds', 'Relative', 'Baseline', 'Peak MB', 'Baseline'))
+		for name in self.getWorkloadNames():
+			if name not in self.results['workloads']:
+				continue
+			current = self.results['workloads'][name]
+			if baseline is not None and name in baseline['workloads']:
+				base = baseline['workloads'][name]
+				file.write('%-15s %9.3f %9.3f %9.3f %9.1f %9.1f\n' % (name, current['seconds'], current['relativeTime'], base['relativeTime'], current['peakRssMb'], base['peakRssMb']))
+			else:
+				file.write('%-15s %9.3f %9.3f %9s %9.1f %9s\n' % (name, current['seconds'], current['relativeTime'], '-', current['peakRssMb'], '-'))
+
+	# Write the results of the last run to the given file, e.g., to use
+	# them as a baseline. The file is replaced atomically.
+	def writeResults(self, fileName):
+		file = open(fileName + '.tmp', 'w')
+		json.dump(self.results, file, indent = 1, sort_keys = True)
+		file.close()
+		os.rename(fileName + '.tmp', fileName)
+
+	# Run a workload repeatedly in new processes, and return the best time
+	# and the lowest peak memory.
+	def __measure(self, name, function, fileName):
+		logging.log('Running workload ' + name + ' ...')
+		bestTime = None
+		lowestRss = None
+		for i in range(self.repeat):
+			resultQueue = multiprocessing.Queue()
+			process = multiprocessing.Process(target = _measureWorkload, args = (function, fileName, resultQueue))
+			process.start()
+			result = None
+			while result is None:
+				try:
+					result = resultQueue.get(True, 5)
+				except Queue.Empty:
+					if not process.is_alive():
+						result = ('error', 'the worker process ended unexpectedly')
+			process.join()
+			if result[0] == 'error':
+				raise RuntimeError('workload ' + name + ' failed:\n' + result[1])
+			(seconds, peakRss) = result[1]
+			if bestTime is None or seconds < bestTime:
+				bestTime = seconds
+			if lowestRss is None or peakRss < lowestRss:
+				lowestRss = peakRss
+		logging.log(' ... best time: ' + str(round(bestTime, 3)) + ' seconds, peak memory: ' + str(round(lowestRss, 1)) + ' MB.')
+		return (bestTime, lowestRss)
+
+# Read results that were written by PerformanceHarness.writeResults().
+def loadResults(fileName):
+	file = open(fileName)
+	results = json.load(file)
+	file.close()
+	return results
+
+# Run the given workload function in a worker process, and send its time
+# and the peak memory of the process (in MB) to the given queue.
+def _measureWorkload(function, fileName, resultQueue):
+	try:
+		startTime = time.time()
+		function(fileName)
+		seconds = time.time() - startTime
+		resultQueue.put(('ok', (seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)))
+	except:
+		resultQueue.put(('error', traceback.format_exc()))
+
+def _runCalibration(fileName):
+	data = { 'label': { 'en': 'calibration', 'de': u'Kalibrierung \xe4' }, 'claims': [ ['value', i, 'string', 'v' * (i % 50)] for i in range(200) ] }
+	counts = {}
+	for i in range(400):
+		value = json.loads(json.dumps(data))
+		for claim in value['claims']:
+			key = str(claim[1] % 17) + claim[3][:3]
+			counts[key] = counts.get(key, 0) + len(claim[3].replace('v', 'w').split('w'))
+
+def _processCorpus(fileName, processors):
+	dp = processdump.DumpProcessor()
+	for processor in processors:
+		dp.registerProcessor(processor)
+	file = open(fileName)
+	dp.processFile(file)
+	file.close()
+
+def _runParse(fileName):
+	_processCorpus(fileName, [revisionprocessor.RPStats()])
+
+def _runLatestTurtle(fileName):
+	rplatestProcessor = rplatest.RPLatest(processinghelper.ProcessingHelper())
+	output = open(os.devnull, 'w')
+	rplatestProcessor.registerEntityProcessor(epTurtleFileWriter.EPTurtleFile(output, entityDataFilter.EntityDataFilter()))
+	_processCorpus(fileName, [revisionprocessor.RPStats(), rplatestProcessor])
+	output.close()
+
+def _runEditCount(fileName):
+	_processCorpus(fileName, [revisionprocessor.RPStats(), rpedits.RPEditCount(processinghelper.ProcessingHelper(), list(dumpgenerator.DumpGenerator.BOTS))])
+
+def _runDbStat(fileName):
+	import dbstatanalyzer # needs MySQLdb
+	analyzer = dbstatanalyzer.DBStatAnalyzer()
+	analyzer.makeStatistics()
+	analyzer.close()
+
+# Fill the database of wda.ini with the RPWeekly data of the corpus, as
+# used by the workload 'dbstat'.
+def _loadDatabase(fileName):
+	import database, rpweekly # need MySQLdb
+	logging.log('Loading corpus into the database ...')
+	db = database.Database()
+	db.dropTables()
+	db.createTables()
+	_processCorpus(fileName, [rpweekly.RPWeekly(processinghelper.ProcessingHelper(), db)])
+	db.closeDatabase()
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import json
+
+# Class for the content of a revision as passed to
+# RevisionProcessor.processRevision(). The content is not copied out of
+# the dump when the revision is read. Instead, the object keeps a reference
+# to the string that it was read from (a line or a buffer of the dump),
+# together with the start and end offset of the still escaped content.
+# The content is only unescaped when getText() is called, and only decoded
+# when getData() is called. Both results are cached, so that all
+# processors that look at the same revision share the work.
+#
+# When pickled (e.g., to be sent to a worker process), only the content
+# of the revision is stored, not the whole string it was read from.
+class RevisionContent:
+
+	def __init__(self, data, start = 0, end = None):
+		self.data = data
+		self.start = start
+		self.end = len(data) if end is None else end
+		self.text = None
+		self.value = None
+
+	# Return the content as it is found in the dump.
+	def getRawText(self):
+		if self.start == 0 and self.end == len(self.data):
+			return self.data
+		return self.data[self.start:self.end]
+
+	# Return the unescaped content.
+	def getText(self):
+		if self.text is None:
+			self.text = self.getRawText().replace('&quot;', '"')
+		return self.text
+
+	# Return the content decoded as JSON. The result is shared by all
+	# callers; see ProcessingHelper.getVal() for a version of the data
+	# where missing fields have been filled in.
+	def getData(self):
+		if self.value is None:
+			self.value = json.loads(self.getText())
+		return self.value
+
+	def __str__(self):
+		return self.getText()
+
+	def __getstate__(self):
+		return self.getRawText()
+
+	def __setstate__(self, state):
+		self.__init__(state)
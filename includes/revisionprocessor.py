@@ -34,10 +34,28 @@ class RevisionProcessor:
 	# timestamp: string MW timestamp of the revision
 	# user: string MW user name or IP
 	# isIP: bool true if the user is an IP, false if it is a registered user
-	# rawContent: unprocessed content of this revision
+	# rawContent: revisioncontent.RevisionContent of this revision, which
+	# 	is only unescaped or decoded when asked for, or None if no
+	# 	registered processor needs content (see needsContent())
 	def processRevision(self,revId,timestamp,user,isIp,rawContent):
 		pass
 
+	# Process several consecutive revisions of the current page block at
+	# once. This is only called instead of processRevision() if
+	# supportsRevisionBatches() returns True. The parameters are tuples of
+	# equal length with one value for each revision, as for processRevision().
+	# A page block may be split into several batches (see
+	# DumpProcessor.REVISION_BATCH_SIZE).
+	def processRevisionBatch(self,revIds,timestamps,users,isIps,rawContents):
+		for i in xrange(len(revIds)):
+			self.processRevision(revIds[i],timestamps[i],users[i],isIps[i],rawContents[i])
+
+	# Return True if this processor should get revisions in batches, using
+	# processRevisionBatch(). This saves a method call per revision for
+	# processors that can aggregate revisions at once.
+	def supportsRevisionBatches(self):
+		return False
+
 	# Conclude the current page block. The method startPageBlock is
 	# always called before this.
 	def endPageBlock(self):
@@ -49,6 +67,71 @@ class RevisionProcessor:
 	def logReport(self):
 		pass
 
+	# Return a dictionary of additional measurements of this processor that
+	# can be written as JSON, or None. They are included in the metrics of
+	# the DumpProcessor (see DumpProcessor.setMetricsFile()).
+	def getMetrics(self):
+		return None
+
+	# Return True if this processor uses the content of revisions. If no
+	# registered processor does, the DumpProcessor does not extract the
+	# content from the dump and passes None as rawContent.
+	def needsContent(self):
+		return True
+
+	# Return True if this processor only uses the revision with the largest
+	# id in each page block. If all registered processors only use this
+	# revision (and return the same getMaxTimestamp()), the DumpProcessor only
+	# passes this revision to processRevision(), right before endPageBlock().
+	def needsLatestRevisionOnly(self):
+		return False
+
+	# Return a timestamp string if this processor ignores all revisions with
+	# this or a later timestamp, or None if it uses revisions of any time.
+	# If all registered processors return a timestamp, the DumpProcessor does
+	# not pass on revisions with the latest of these timestamps or later.
+	def getMaxTimestamp(self):
+		return None
+
+	# Return True if this processor can be copied into worker processes
+	# to process pages in parallel (see DumpProcessor.setParallelWorkers()).
+	# Processors that return True must implement the three methods below.
+	def supportsParallel(self):
+		return False
+
+	# Prepare for processing a batch of pages in a worker process.
+	# Partial results should be collected from scratch for each batch.
+	def startParallelBatch(self):
+		pass
+
+	# Finish a batch of pages in a worker process and return the partial
+	# results of this batch. The result must be picklable.
+	def endParallelBatch(self):
+		return None
+
+	# Merge the partial results of one batch, as returned by endParallelBatch()
+	# in a worker, into this processor. Batches are merged in the order in
+	# which their pages occur in the dump.
+	def mergeParallelBatch(self,result):
+		pass
+
+	# Return True if the state of this processor can be saved in checkpoints
+	# (see DumpProcessor.setCheckpoint()). Processors that return True must
+	# implement the two methods below.
+	def supportsCheckpoints(self):
+		return False
+
+	# Return the state of this processor as a picklable object. This is only
+	# called between two page blocks. Output files should be flushed, so that
+	# the state can record how much output belongs to the checkpoint.
+	def getCheckpointState(self):
+		return None
+
+	# Restore a state returned by getCheckpointState(), possibly in a new
+	# run. Output that was written after the checkpoint should be discarded.
+	def restoreCheckpointState(self,state):
+		pass
+
 # Class to log detailed information about processed data.
 # This processor should not be used in normal operation since it creates so much
 # output that it will slow down processing.
@@ -63,6 +146,9 @@ class RPDebugLogger(RevisionProcessor):
 	def processRevision(self,revId,timestamp,user,isIp,rawContent):
 		logging.log('Processing rev ' + revId + ' (' + timestamp + ') edited by ' + user + ' (IP: ' + str(isIp) + ').' )
 
+	def needsContent(self):
+		return False
+
 	def endPageBlock(self):
 		if self.curTitle:
 			logging.log('... finished page ' + self.curTitle + '.')
@@ -97,9 +183,47 @@ class RPStats(RevisionProcessor):
 		else:
 			self.propertyRevisionCount += 1
 
+	def processRevisionBatch(self,revIds,timestamps,users,isIps,rawContents):
+		if self.isItem:
+			self.itemRevisionCount += len(revIds)
+		else:
+			self.propertyRevisionCount += len(revIds)
+
+	def supportsRevisionBatches(self):
+		return True
+
 	def endPageBlock(self):
 		RevisionProcessor.endPageBlock(self)
 
+	def needsContent(self):
+		return False
+
+	def supportsParallel(self):
+		return True
+
+	def startParallelBatch(self):
+		RPStats.__init__(self)
+
+	def endParallelBatch(self):
+		return (self.itemCount, self.propertyCount, self.newItemCount, self.newPropertyCount, self.itemRevisionCount, self.propertyRevisionCount)
+
+	def supportsCheckpoints(self):
+		return True
+
+	def getCheckpointState(self):
+		return self.endParallelBatch()
+
+	def restoreCheckpointState(self,state):
+		(self.itemCount, self.propertyCount, self.newItemCount, self.newPropertyCount, self.itemRevisionCount, self.propertyRevisionCount) = state
+
+	def mergeParallelBatch(self,result):
+		self.itemCount += result[0]
+		self.propertyCount += result[1]
+		self.newItemCount += result[2]
+		self.newPropertyCount += result[3]
+		self.itemRevisionCount += result[4]
+		self.propertyRevisionCount += result[5]
+
 	def logReport(self):
 		logging.log('     * ' + str(self.itemRevisionCount) + ' revisions of ' + str(self.newItemCount) + ' items (' + str(self.itemCount) + ' blocks of items)')
 		logging.log('     * ' + str(self.propertyRevisionCount) + ' revisions of ' + str(self.newPropertyCount) + ' properties (' + str(self.propertyCount) + ' blocks of properties)')
@@ -3,11 +3,12 @@
 
 import logging
 import revisionprocessor
-import urllib
+import urllib, itertools
 
-# Count user/bot edits per day
+# Count user/bot edits per day. The list of bot accounts is fetched
+# online unless it is given.
 class RPEditCount(revisionprocessor.RevisionProcessor):
-	def __init__(self,helper):
+	def __init__(self,helper,bots=None):
 		self.helper = helper
 		self.botEdits = {}
 		self.humanEdits = {}
@@ -20,23 +21,45 @@ class RPEditCount(revisionprocessor.RevisionProcessor):
 
 		self.editsByUser = {}
 
+		if bots is not None:
+			self.bots = bots
+		else:
+			self.bots = self.fetchBots()
+
+	# Return the list of bot accounts on wikidata.org, or [] if it cannot be fetched.
+	def fetchBots(self):
 		logging.logMore('Loading list of bots ')
-		self.bots = []
+		bots = []
 		try:
 			botsjson = urllib.urlopen('http://www.wikidata.org/w/api.php?action=query&list=allusers&augroup=bot&aulimit=500&format=json').read()
 			botsdata = eval(botsjson)
 			for bot in botsdata['query']['allusers'] :
-				self.bots.append(bot['name'])
+				bots.append(bot['name'])
 				logging.logMore('.')
-			logging.log(' found ' + str(len(self.bots)) + ' bot accounts.')
+			logging.log(' found ' + str(len(bots)) + ' bot accounts.')
 		except IOError:
 			logging.log(' *** Error: Could not retrieve bot accounts. Bots will not be distinguished.')
+		return bots
 
 	def startPageBlock(self,title,isItem,isNew):
 		revisionprocessor.RevisionProcessor.startPageBlock(self,title,isItem,isNew)
 
 	def processRevision(self,revId,timestamp,user,isIp,rawContent):
-		timeInfo = self.helper.getDateInfo(timestamp[:10])
+		self.countEdits(timestamp[:10],user,isIp,1)
+
+	def processRevisionBatch(self,revIds,timestamps,users,isIps,rawContents):
+		# Consecutive edits are mostly made by the same user on the
+		# same day, so they are counted at once.
+		keys = itertools.izip([ timestamp[:10] for timestamp in timestamps ],users,isIps)
+		for ((date,user,isIp),edits) in itertools.groupby(keys):
+			self.countEdits(date,user,isIp,len(list(edits)))
+
+	def supportsRevisionBatches(self):
+		return True
+
+	# Count the given number of edits of one user on one day.
+	def countEdits(self,date,user,isIp,count):
+		timeInfo = self.helper.getDateInfo(date)
 		wdday = timeInfo[3]
 		self.curMin = min(wdday,self.curMin)
 		self.curMax = max(wdday,self.curMax)
@@ -45,14 +68,14 @@ class RPEditCount(revisionprocessor.RevisionProcessor):
 			self.botEdits[wdday] = 0
 			self.anonEdits[wdday] = 0
 		if isIp:
-			self.anonEdits[wdday] += 1
-			self.anonTotal += 1
+			self.anonEdits[wdday] += count
+			self.anonTotal += count
 		elif user in self.bots:
-			self.botEdits[wdday] += 1
-			self.botTotal += 1
+			self.botEdits[wdday] += count
+			self.botTotal += count
 		else:
-			self.humanEdits[wdday] += 1
-			self.humanTotal += 1
+			self.humanEdits[wdday] += count
+			self.humanTotal += count
 
 		# The following code counts edits by user.
 		# One can put it into an if block to restrict
@@ -63,8 +86,56 @@ class RPEditCount(revisionprocessor.RevisionProcessor):
 			userKey = user + 'U'
 		if userKey not in self.editsByUser:
 			self.editsByUser[userKey] = 0
-		self.editsByUser[userKey] += 1
+		self.editsByUser[userKey] += count
+
+	def needsContent(self):
+		return False
+
+	def supportsParallel(self):
+		return True
+
+	def startParallelBatch(self):
+		self.botEdits = {}
+		self.humanEdits = {}
+		self.anonEdits = {}
+		self.botTotal = 0
+		self.humanTotal = 0
+		self.anonTotal = 0
+		self.curMin = 100000000
+		self.curMax = -100000000
+		self.editsByUser = {}
+
+	def endParallelBatch(self):
+		return (self.botEdits, self.humanEdits, self.anonEdits, self.botTotal, self.humanTotal, self.anonTotal, self.curMin, self.curMax, self.editsByUser)
+
+	def supportsCheckpoints(self):
+		return True
+
+	def getCheckpointState(self):
+		return self.endParallelBatch()
+
+	def restoreCheckpointState(self,state):
+		(self.botEdits, self.humanEdits, self.anonEdits, self.botTotal, self.humanTotal, self.anonTotal, self.curMin, self.curMax, self.editsByUser) = state
 
+	def mergeParallelBatch(self,result):
+		(botEdits, humanEdits, anonEdits, botTotal, humanTotal, anonTotal, curMin, curMax, editsByUser) = result
+		for wdday in humanEdits:
+			if wdday not in self.humanEdits:
+				self.humanEdits[wdday] = 0
+				self.botEdits[wdday] = 0
+				self.anonEdits[wdday] = 0
+			self.botEdits[wdday] += botEdits[wdday]
+			self.humanEdits[wdday] += humanEdits[wdday]
+			self.anonEdits[wdday] += anonEdits[wdday]
+		self.botTotal += botTotal
+		self.humanTotal += humanTotal
+		self.anonTotal += anonTotal
+		self.curMin = min(curMin,self.curMin)
+		self.curMax = max(curMax,self.curMax)
+		for userKey in editsByUser:
+			if userKey not in self.editsByUser:
+				self.editsByUser[userKey] = 0
+			self.editsByUser[userKey] += editsByUser[userKey]
 
 	def logReport(self):
 		logging.log('     * Total edits: ' + str(self.botTotal + self.anonTotal + self.humanTotal) + ' (' + str(self.botTotal) + ' bots, ' + str(self.humanTotal) + ' humans, ' + str(self.anonTotal) + ' anons)')
@@ -81,6 +81,14 @@ class RPKB(revisionprocessor.RevisionProcessor):
 
 		revisionprocessor.RevisionProcessor.endPageBlock(self)
 
+	def needsLatestRevisionOnly(self):
+		return True
+
+	def getMaxTimestamp(self):
+		if self.maxDate == '':
+			return None
+		return self.maxDate
+
 	# writes an item in KB syntax to the output file
 	def __write(self,id, val):
 		title = 'Q' + str(id)
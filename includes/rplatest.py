@@ -3,9 +3,11 @@
 
 import logging
 import revisionprocessor
+import timing
 
 # Find the latest version of a page process its contents
-# using registered EntityProcessor objects.
+# using registered EntityProcessor objects. The time needed for decoding
+# the contents and for each EntityProcessor is measured (see getMetrics()).
 class RPLatest(revisionprocessor.RevisionProcessor):
 
 	def __init__(self,helper):
@@ -15,6 +17,7 @@ class RPLatest(revisionprocessor.RevisionProcessor):
 		self.curMaxRawContent = False
 		self.curRevsFound = 0
 		self.eps = []
+		self.timings = timing.Timings()
 
 	def registerEntityProcessor(self,ep):
 		self.eps.append(ep)
@@ -33,19 +36,82 @@ class RPLatest(revisionprocessor.RevisionProcessor):
 
 	def endPageBlock(self):
 		if self.curMaxRev >= 0:
-			self.curRevsFound += 1
-			data = self.helper.getVal(self.curMaxRev,self.curMaxRawContent)
-
-			for ep in self.eps:
-				ep.processEntity(self.curTitle,int(self.curMaxRev),self.isItem,data)
+			(wall, cpu) = self.timings.start()
+			data = self.helper.getVal(self.curMaxRev,self.curMaxRawContent,self.getNeededFields())
+			self.timings.stop('getVal',wall,cpu)
+			self.processEntity(self.curTitle,int(self.curMaxRev),self.isItem,data)
 
 		revisionprocessor.RevisionProcessor.endPageBlock(self)
 
+	# Pass the given latest revision of an entity on to all registered entity
+	# processors. This is also used to feed entities that are not read from
+	# revisions (see processjsondump.JsonDumpProcessor).
+	def processEntity(self,title,revision,isItem,data):
+		self.curRevsFound += 1
+		for ep in self.eps:
+			(wall, cpu) = self.timings.start()
+			ep.processEntity(title,revision,isItem,data)
+			self.timings.stop(ep.__class__.__name__,wall,cpu)
+
+	# Return the names of the top-level fields that the registered entity
+	# processors use, or None if all fields are needed.
+	def getNeededFields(self):
+		fields = set()
+		for ep in self.eps:
+			epFields = ep.getNeededFields()
+			if epFields is None:
+				return None
+			fields.update(epFields)
+		return fields
+
+	def needsLatestRevisionOnly(self):
+		return True
+
 	def logReport(self):
 		logging.log('     * Number of latest revisions found: ' + str(self.curRevsFound))
 		for ep in self.eps:
 			ep.logReport()
 
+	def supportsParallel(self):
+		for ep in self.eps:
+			if not ep.supportsParallel():
+				return False
+		return True
+
+	def startParallelBatch(self):
+		self.curRevsFound = 0
+		self.timings = timing.Timings()
+		for ep in self.eps:
+			ep.startParallelBatch()
+
+	def endParallelBatch(self):
+		return (self.curRevsFound, [ ep.endParallelBatch() for ep in self.eps ], self.timings)
+
+	def mergeParallelBatch(self,result):
+		self.curRevsFound += result[0]
+		for i in range(len(self.eps)):
+			self.eps[i].mergeParallelBatch(result[1][i])
+		self.timings.merge(result[2])
+
+	# Return the times needed for decoding contents ('getVal') and for
+	# each EntityProcessor (by class name).
+	def getMetrics(self):
+		return { 'entityProcessors': self.timings.getSnapshot() }
+
+	def supportsCheckpoints(self):
+		for ep in self.eps:
+			if not ep.supportsCheckpoints():
+				return False
+		return True
+
+	def getCheckpointState(self):
+		return (self.curRevsFound, [ ep.getCheckpointState() for ep in self.eps ])
+
+	def restoreCheckpointState(self,state):
+		self.curRevsFound = state[0]
+		for i in range(len(self.eps)):
+			self.eps[i].restoreCheckpointState(state[1][i])
+
 	# Close/finish any export files
 	def close(self):
 		for ep in self.eps:
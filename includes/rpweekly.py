@@ -11,6 +11,9 @@ import revisionprocessor
 # data is stored to avoid very large data sets.
 class RPWeekly(revisionprocessor.RevisionProcessor):
 	interval = 14
+	# top-level fields of the data that are used for items and properties
+	itemFields = ('claims','label','description','links','aliases')
+	propertyFields = ('label','description','aliases')
 
 	def __init__(self,helper,database):
 		self.helper = helper
@@ -70,7 +73,7 @@ class RPWeekly(revisionprocessor.RevisionProcessor):
 
 			#print "Writing data for " + self.curTitle + ' r' + str(self.curMaxRev) + ' day ' + str(self.maxDay) + ' dbRev: ' + str(dbRev)
 
-			val = self.helper.getVal(self.curMaxRev,self.curMaxRawContent)
+			val = self.helper.getVal(self.curMaxRev,self.curMaxRawContent,RPWeekly.itemFields)
 
 			#print "Content: "+ self.curMaxRawContent
 
@@ -114,7 +117,7 @@ class RPWeekly(revisionprocessor.RevisionProcessor):
 		if dbRev <= self.curMaxRev:
 			self.recordedItemRevs += 1
 			#print "Writing data for " + self.curTitle + ' r' + str(self.curMaxRev)
-			val = self.helper.getVal(self.curTitle,self.curMaxRawContent)
+			val = self.helper.getVal(self.curMaxRev,self.curMaxRawContent,RPWeekly.propertyFields)
 
 			labelLangs = val['label'].keys()
 			descLangs = val['description'].keys()
@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+
+# Class for collecting the cumulative wall-clock time and CPU time that is
+# spent in named parts of the processing, such as the callbacks of a
+# processor. The caller takes the time itself, so that timing costs no
+# more than two calls:
+#
+# 	(wall, cpu) = timings.start()
+# 	... # work to be measured
+# 	timings.stop('name', wall, cpu)
+class Timings:
+
+	def __init__(self):
+		self.times = {} # name -> [calls, wall-clock seconds, CPU seconds]
+
+	# Return the current wall-clock time and CPU time.
+	def start(self):
+		return (time.time(), time.clock())
+
+	# Add the time since the given start times (see start()) to the
+	# times of the given name, counting the given number of calls.
+	def stop(self, name, wall, cpu, calls = 1):
+		self.add(name, calls, time.time() - wall, time.clock() - cpu)
+
+	# Add the given number of calls and times to the times of the given name.
+	def add(self, name, calls, wallTime, cpuTime):
+		times = self.times.get(name)
+		if times is None:
+			self.times[name] = [calls, wallTime, cpuTime]
+		else:
+			times[0] += calls
+			times[1] += wallTime
+			times[2] += cpuTime
+
+	# Add all times of another Timings object, e.g., from a worker process.
+	def merge(self, other):
+		for (name, (calls, wallTime, cpuTime)) in other.times.iteritems():
+			self.add(name, calls, wallTime, cpuTime)
+
+	# Return all times as a dictionary that can be written as JSON.
+	def getSnapshot(self):
+		snapshot = {}
+		for (name, (calls, wallTime, cpuTime)) in self.times.iteritems():
+			snapshot[name] = { 'calls': calls, 'wallSeconds': round(wallTime, 6), 'cpuSeconds': round(cpuTime, 6) }
+		return snapshot
@@ -0,0 +1,32 @@
+import StringIO
+import unittest
+from includes import benchmark, dumpgenerator
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run(self):
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(30, 2).writeDump(output)
+        data = output.getvalue()
+        bm = benchmark.Benchmark(data, 1)
+        results = bm.run()
+        self.assertEqual([result['name'] for result in results], bm.getNames())
+        for result in results:
+            self.assertTrue(result['seconds'] > 0 and result['mbPerSecond'] > 0 and result['pagesPerSecond'] > 0)
+        self.assertEqual(results[0]['bytes'], len(data))
+        self.assertEqual(results[0]['pages'], 30)
+        self.assertEqual(results[2]['pages'], 27)
+        report = StringIO.StringIO()
+        bm.writeReport(report)
+        self.assertEqual(len(report.getvalue().splitlines()), 1 + len(results))
+
+    def test_selected(self):
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(10, 1).writeDump(output)
+        results = benchmark.Benchmark(output.getvalue(), 1).run(['getVal', 'RPEditCount'])
+        self.assertEqual([result['name'] for result in results], ['getVal', 'RPEditCount'])
+
+
+if __name__ == '__main__':
+    unittest.main()
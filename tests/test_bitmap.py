@@ -0,0 +1,38 @@
+import unittest
+from includes.bitmap import ChunkedBitmap
+
+
+class TestChunkedBitmap(unittest.TestCase):
+
+    def test_set_and_get(self):
+        bitmap = ChunkedBitmap()
+        ids = [0, 1, 65535, 65536, 2**26 + 5, 2**40]
+        for id in ids:
+            self.assertFalse(bitmap[id])
+            bitmap[id] = True
+        for id in ids:
+            self.assertTrue(bitmap[id])
+        self.assertFalse(bitmap[2])
+        self.assertFalse(bitmap[2**40 + 1])
+        self.assertEqual(bitmap.count(), len(ids))
+
+    def test_dense_chunk(self):
+        bitmap = ChunkedBitmap()
+        for id in range(0, 30000, 3):
+            bitmap[id] = True
+        self.assertEqual(type(bitmap.chunks[0]), bytearray)
+        self.assertEqual(bitmap.count(), 10000)
+        self.assertTrue(bitmap[29997])
+        self.assertFalse(bitmap[29998])
+        bitmap[29997] = False
+        self.assertFalse(bitmap[29997])
+        self.assertEqual(bitmap.count(), 9999)
+
+    def test_remove_sparse(self):
+        bitmap = ChunkedBitmap()
+        bitmap[7] = True
+        bitmap[7] = True
+        self.assertEqual(bitmap.count(), 1)
+        bitmap[7] = False
+        self.assertFalse(bitmap[7])
+        self.assertEqual(bitmap.chunks, {})
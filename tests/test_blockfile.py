@@ -0,0 +1,92 @@
+import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+from includes import blockfile, dumpgenerator, processdump
+from tests.test_processdump import RecordingProcessor
+
+
+class TestBlockFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(60, 3).writeDump(output)
+        self.data = output.getvalue()
+        self.sourceName = os.path.join(self.directory, 'pages-meta-history.xml.bz2')
+        self.fileName = os.path.join(self.directory, 'pages-meta-history.xml.blocks')
+        with open(self.sourceName, 'w') as file:
+            file.write('source')
+        self.blockSize = blockfile.BLOCK_SIZE
+        blockfile.BLOCK_SIZE = 2000
+        blockfile.transcode(StringIO.StringIO(self.data), self.sourceName, self.fileName)
+
+    def tearDown(self):
+        blockfile.BLOCK_SIZE = self.blockSize
+        shutil.rmtree(self.directory)
+
+    def test_blocks(self):
+        file = blockfile.BlockFile(self.fileName)
+        self.assertTrue(file.getBlockCount() > 5)
+        blocks = [file.readBlock(i) for i in range(file.getBlockCount())]
+        file.close()
+        self.assertEqual(''.join(blocks), self.data)
+        for block in blocks[1:]:
+            self.assertTrue(block.startswith('  <page>\n'))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['pages-meta-history.xml.blocks', 'pages-meta-history.xml.bz2'])
+
+    def test_read(self):
+        file = blockfile.BlockFile(self.fileName)
+        self.assertEqual(list(file), StringIO.StringIO(self.data).readlines())
+        self.assertEqual(file.tell(), len(self.data))
+        file.close()
+        file = blockfile.BlockFile(self.fileName)
+        chunks = []
+        while True:
+            chunk = file.read(777)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertEqual(''.join(chunks), self.data)
+        self.assertEqual(file.getPosition(), None)
+        self.assertRaises(IOError, file.readline)
+        file.close()
+
+    def test_seek_position(self):
+        lines = StringIO.StringIO(self.data).readlines()
+        file = blockfile.BlockFile(self.fileName)
+        positions = []
+        for line in file:
+            positions.append(file.getPosition())
+        file.close()
+        for i in (0, 1, 50, 150, len(lines) - 1):
+            file = blockfile.BlockFile(self.fileName)
+            file.seekPosition(positions[i])
+            self.assertEqual(list(file), lines[i + 1:])
+            file.close()
+
+    def test_is_transcoded(self):
+        self.assertTrue(blockfile.isTranscoded(self.fileName, self.sourceName))
+        self.assertFalse(blockfile.isTranscoded(self.fileName + '.other', self.sourceName))
+        os.utime(self.sourceName, (1400000000, 1400000000))
+        self.assertFalse(blockfile.isTranscoded(self.fileName, self.sourceName))
+        with open(self.fileName, 'r+b') as file:
+            file.truncate(os.path.getsize(self.fileName) - 3)
+        self.assertRaises(IOError, blockfile.BlockFile, self.fileName)
+
+    def test_process(self):
+        for scanner in ('lines', 'buffers'):
+            processors = []
+            for data in (StringIO.StringIO(self.data), blockfile.BlockFile(self.fileName)):
+                processor = RecordingProcessor()
+                dp = processdump.DumpProcessor()
+                dp.setScanner(scanner)
+                dp.registerProcessor(processor)
+                dp.processFile(data)
+                processors.append(processor)
+            self.assertEqual(processors[0].events, processors[1].events)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import StringIO
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from includes import checkpoint, dumpgenerator, entityDataFilter, epKbFileWriter, epTurtleFileWriter, parallelbz2, processdump, processinghelper, revisionprocessor, rpedits, rplatest
+
+
+class TestCheckpointOutputFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.dir, 'out.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_truncate_gzip(self):
+        file = gzip.open(self.fileName, 'w')
+        file.write('before checkpoint\n')
+        (file, size) = checkpoint.syncOutputFile(file)
+        file.write('after checkpoint\n')
+        file.close()
+
+        file = gzip.open(self.fileName, 'ab')
+        file.write('new header\n')
+        file = checkpoint.truncateOutputFile(file, size)
+        file.write('resumed\n')
+        file.close()
+
+        self.assertEqual(gzip.open(self.fileName).read(), 'before checkpoint\nresumed\n')
+
+    def test_checkpoint_files(self):
+        cp = checkpoint.Checkpoint(os.path.join(self.dir, 'cp'))
+        self.assertFalse(cp.load(['daily1', 'dump2']))
+        cp.setCurrentFile('dump2')
+        cp.save((10, None), {'counter': 1})
+
+        cp = checkpoint.Checkpoint(os.path.join(self.dir, 'cp'))
+        self.assertFalse(cp.load(['daily1', 'daily3', 'dump2']))
+        self.assertTrue(cp.load(['daily1', 'dump2']))
+        self.assertTrue(cp.isCompleted('daily1'))
+        self.assertFalse(cp.isCompleted('dump2'))
+        self.assertEqual(cp.getResumePosition('dump2'), (10, None))
+        self.assertEqual(cp.getState(), {'counter': 1})
+
+
+class Interruption(Exception):
+    pass
+
+
+# Processor that interrupts processing after a given number of pages.
+class InterruptingProcessor(revisionprocessor.RevisionProcessor):
+
+    def __init__(self, maxPages=None):
+        revisionprocessor.RevisionProcessor.__init__(self)
+        self.maxPages = maxPages
+        self.pages = 0
+
+    def endPageBlock(self):
+        revisionprocessor.RevisionProcessor.endPageBlock(self)
+        self.countPages(1)
+
+    def countPages(self, pages):
+        for i in range(pages):
+            self.pages += 1
+            if self.pages == self.maxPages:
+                raise Interruption()
+
+    # In parallel mode, processing is only interrupted in the main process.
+    def supportsParallel(self):
+        return True
+
+    def startParallelBatch(self):
+        self.maxPages = None
+        self.pages = 0
+
+    def endParallelBatch(self):
+        return self.pages
+
+    def mergeParallelBatch(self, result):
+        self.countPages(result)
+
+    def needsContent(self):
+        return False
+
+    def supportsCheckpoints(self):
+        return True
+
+    def getCheckpointState(self):
+        return self.pages
+
+    def restoreCheckpointState(self, state):
+        self.pages = state
+
+
+class TestCheckpointResume(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(120, 3).writeDump(output)
+        self.dumpName = os.path.join(self.dir, 'dump.xml')
+        with open(self.dumpName, 'wb') as file:
+            file.write(output.getvalue())
+        self.bz2Name = os.path.join(self.dir, 'dump.xml.bz2')
+        with open(self.bz2Name, 'wb') as file:
+            file.write(bz2.compress(output.getvalue(), 1))
+        self.checkpointName = os.path.join(self.dir, 'checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def openInput(self, kind):
+        if kind == 'parallelbz2':
+            return parallelbz2.ParallelBZ2File(self.bz2Name, 2, 1)
+        return open(self.dumpName, 'rb')
+
+    # Set up a DumpProcessor with processors that write to output files
+    # with the given prefix, opened with the given mode. The processing mode
+    # is 'sequential', 'pipeline' or 'parallel'.
+    def makeDumpProcessor(self, scanner, processing, prefix, mode, maxPages=None):
+        dp = processdump.DumpProcessor()
+        dp.setScanner(scanner)
+        if processing == 'pipeline':
+            dp.setPipeline(True)
+        elif processing == 'parallel':
+            dp.setParallelWorkers(2, 10)
+        rpl = rplatest.RPLatest(processinghelper.ProcessingHelper())
+        rpl.registerEntityProcessor(epTurtleFileWriter.EPTurtleFile(gzip.open(prefix + '.ttl.gz', mode), entityDataFilter.EntityDataFilter()))
+        rpl.registerEntityProcessor(epKbFileWriter.EPKbFile(open(prefix + '.txt', mode)))
+        processors = [revisionprocessor.RPStats(), rpedits.RPEditCount(processinghelper.ProcessingHelper(), list(dumpgenerator.DumpGenerator.BOTS)), rpl, InterruptingProcessor(maxPages)]
+        for processor in processors:
+            dp.registerProcessor(processor)
+        return (dp, processors)
+
+    # Process the dump without interruption, and once more with an
+    # interruption after the given number of pages and a resumed run from
+    # the last checkpoint. Returns the outputs and counters of both runs.
+    def process(self, scanner, kind, processing, maxPages):
+        results = []
+        for interrupt in (False, True):
+            prefix = os.path.join(self.dir, 'interrupted' if interrupt else 'complete')
+            (dp, processors) = self.makeDumpProcessor(scanner, processing, prefix, 'w', maxPages if interrupt else None)
+            file = self.openInput(kind)
+            if interrupt:
+                cp = checkpoint.Checkpoint(self.checkpointName, 0)
+                cp.load([self.dumpName])
+                cp.setCurrentFile(self.dumpName)
+                dp.setCheckpoint(cp)
+                self.assertRaises(Interruption, dp.processFile, file)
+                file.close()
+
+                cp = checkpoint.Checkpoint(self.checkpointName, 0)
+                self.assertTrue(cp.load([self.dumpName]))
+                self.assertEqual(cp.getState()['processors'][3], maxPages - 1)
+                (dp, processors) = self.makeDumpProcessor(scanner, processing, prefix, 'ab')
+                dp.setCheckpoint(cp)
+                dp.restoreCheckpointState(cp.getState())
+                file = self.openInput(kind)
+                dp.processFile(file, cp.getResumePosition(self.dumpName))
+                cp.remove()
+            else:
+                dp.processFile(file)
+            file.close()
+            processors[2].close()
+            turtle = [line for line in gzip.open(prefix + '.ttl.gz').read().splitlines() if not line.startswith('# Generated')]
+            kb = open(prefix + '.txt').read()
+            results.append((turtle, kb, (dp.linecount, dp.pagecount, dp.revcount), processors[0].endParallelBatch(),
+                            processors[1].endParallelBatch(), processors[2].curRevsFound, processors[3].pages))
+        return results
+
+    def check(self, scanner, kind, processing):
+        (complete, resumed) = self.process(scanner, kind, processing, 70)
+        self.assertEqual(resumed, complete, scanner + ' ' + kind + ' ' + processing)
+        self.assertEqual(len([line for line in complete[0] if line.startswith('### Wikidata')]), 1)
+        self.assertTrue(complete[3][4] > 0 and complete[5] > 0)
+
+    def test_resume(self):
+        for (scanner, kind) in (('lines', 'plain'), ('buffers', 'plain'), ('lines', 'parallelbz2'), ('buffers', 'parallelbz2')):
+            self.check(scanner, kind, 'sequential')
+
+    def test_resume_pipeline(self):
+        for (scanner, kind) in (('lines', 'plain'), ('buffers', 'plain'), ('lines', 'parallelbz2'), ('buffers', 'parallelbz2')):
+            self.check(scanner, kind, 'pipeline')
+
+    def test_resume_parallel(self):
+        for (scanner, kind) in (('lines', 'plain'), ('buffers', 'parallelbz2')):
+            self.check(scanner, kind, 'parallel')
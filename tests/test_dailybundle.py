@@ -0,0 +1,88 @@
+import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+from includes import blockfile, dailybundle, dumpgenerator, processdump
+from tests.test_processdump import LatestMetadataProcessor, LatestProcessor, RecordingProcessor, makeStubs
+
+
+def withoutEmptyPages(events):
+    result = []
+    for event in events:
+        if event == ('end',) and result[-1][0] == 'start':
+            result.pop()
+        else:
+            result.append(event)
+    return result
+
+
+def newPages(events):
+    result = []
+    isNew = False
+    for event in events:
+        if event[0] == 'start':
+            isNew = event[3]
+        if isNew:
+            result.append(event)
+    return result
+
+
+class TestDailyBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'pages-meta-hist-incr.xml.blocks')
+        self.dailies = []
+        for seed in range(4):
+            output = StringIO.StringIO()
+            dumpgenerator.DumpGenerator(8 + seed, 2 + seed, seed).writeDump(output)
+            self.dailies.append(output.getvalue())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def process(self, files, processor, stubs=False):
+        dp = processdump.DumpProcessor()
+        dp.setStubs(stubs)
+        dp.registerProcessor(processor)
+        for file in files:
+            dp.processFile(file)
+        return processor.events
+
+    def test_compact(self):
+        counts = dailybundle.compact([StringIO.StringIO(daily) for daily in self.dailies], self.fileName)
+        expected = self.process([StringIO.StringIO(daily) for daily in self.dailies], RecordingProcessor())
+        bundle = blockfile.BlockFile(self.fileName)
+        self.assertEqual(self.process([bundle], RecordingProcessor()), withoutEmptyPages(expected))
+        self.assertTrue(counts['duplicateRevisions'] > 0)
+        self.assertEqual(counts['revisions'], len([event for event in expected if event[0] == 'rev']))
+        self.assertEqual(counts['olderRevisions'], 0)
+
+    def test_compact_latest(self):
+        counts = dailybundle.compact([StringIO.StringIO(daily) for daily in self.dailies], self.fileName, True)
+        expected = self.process([StringIO.StringIO(daily) for daily in self.dailies], LatestProcessor())
+        bundle = blockfile.BlockFile(self.fileName)
+        events = self.process([bundle], LatestProcessor())
+        self.assertEqual(events, newPages(expected))
+        self.assertEqual(counts['pages'], counts['revisions'])
+        self.assertTrue(counts['olderRevisions'] > 0)
+
+    def test_compact_stubs(self):
+        dailies = [makeStubs(daily) for daily in self.dailies]
+        dailybundle.compact([StringIO.StringIO(daily) for daily in dailies], self.fileName, True)
+        expected = self.process([StringIO.StringIO(daily) for daily in dailies], LatestMetadataProcessor(), True)
+        bundle = blockfile.BlockFile(self.fileName)
+        self.assertEqual(self.process([bundle], LatestMetadataProcessor(), True), newPages(expected))
+
+    def test_has_content(self):
+        self.assertTrue(dailybundle._hasContent('      <text xml:space="preserve">{&quot;label&quot;:{&quot;en&quot;:1}}</text>\n'))
+        self.assertFalse(dailybundle._hasContent('      <text xml:space="preserve" />\n'))
+        self.assertFalse(dailybundle._hasContent('      <text xml:space="preserve">{&quot;label&quot;:{&quot;en&quot;:\n'))
+        self.assertTrue(dailybundle._hasContent('      <text id="1" bytes="12" />\n'))
+        self.assertFalse(dailybundle._hasContent('      <text id="16" bytes="0" />\n'))
+        self.assertFalse(dailybundle._hasContent('      <text id="19" deleted="deleted" />\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
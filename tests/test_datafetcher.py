@@ -0,0 +1,165 @@
+import StringIO
+import bz2
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from includes import datafetcher, dumpgenerator, processdump
+from tests.test_dailybundle import newPages, withoutEmptyPages
+from tests.test_processdump import LatestProcessor, RecordingProcessor
+
+
+class ProcessingError(Exception):
+    pass
+
+
+# Processor that fails after a given number of pages.
+class FailingProcessor(RecordingProcessor):
+
+    def __init__(self, maxPages):
+        RecordingProcessor.__init__(self)
+        self.maxPages = maxPages
+
+    def endPageBlock(self):
+        RecordingProcessor.endPageBlock(self)
+        self.maxPages -= 1
+        if self.maxPages == 0:
+            raise ProcessingError()
+
+
+class TestDataFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dataPath = os.path.join(self.directory, 'data')
+        self.dumps = {}
+        self.writeDump('dump20141001', 'pages-meta-history.xml.bz2', 1)
+        for (i, daily) in enumerate(['20140930', '20141002', '20141003', '20141004']):
+            self.writeDump('daily' + daily, 'pages-meta-hist-incr.xml.bz2', i + 2)
+        with gzip.open(os.path.join(self.dataPath, 'dump20141001', 'site_stats.sql.gz'), 'w') as file:
+            file.write('INSERT INTO `site_stats` VALUES (1,0,1000,0,0,0,0,0,0);\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writeDump(self, dirName, fileName, seed):
+        os.makedirs(os.path.join(self.dataPath, dirName))
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(5, 2, seed).writeDump(output)
+        self.dumps[dirName] = output.getvalue()
+        with open(os.path.join(self.dataPath, dirName, fileName), 'wb') as file:
+            file.write(bz2.compress(output.getvalue()))
+        os.utime(os.path.join(self.dataPath, dirName, fileName), (1400000000, 1400000000))
+
+    def makeFetcher(self):
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            return datafetcher.DataFetcher(True)
+        finally:
+            os.chdir(cwd)  # the fetcher only uses paths below its base directory
+
+    def process(self, prefetch, transcode=False, fetcher=None, processor=None):
+        if fetcher is None:
+            fetcher = self.makeFetcher()
+        if processor is None:
+            processor = RecordingProcessor()
+        cwd = os.getcwd()
+        fetcher.setPrefetch(prefetch)
+        fetcher.setTranscode(transcode)
+        dp = processdump.DumpProcessor()
+        dp.registerProcessor(processor)
+        fetcher.processRecentDumps(dp)
+        self.assertEqual(os.getcwd(), cwd)
+        return processor.events
+
+    def expectedEvents(self, dirNames):
+        processor = RecordingProcessor()
+        dp = processdump.DumpProcessor()
+        dp.registerProcessor(processor)
+        for dirName in dirNames:
+            dp.processFile(StringIO.StringIO(self.dumps[dirName]))
+        return processor.events
+
+    def test_process(self):
+        expected = self.expectedEvents(['daily20141004', 'daily20141003', 'daily20141002', 'dump20141001'])
+        for prefetch in (0, 1, 2, 5):
+            self.assertEqual(self.process(prefetch), expected)
+            self.assertEqual(os.listdir(os.path.join(self.dataPath, 'daily20141003')), ['pages-meta-hist-incr.xml.bz2'])
+
+    def test_corrupt_daily(self):
+        with open(os.path.join(self.dataPath, 'daily20141003', 'md5sums.txt'), 'w') as file:
+            file.write(hashlib.md5('other').hexdigest() + '  wikidatawiki-20141003-pages-meta-hist-incr.xml.bz2\n')
+        expected = self.expectedEvents(['daily20141004', 'daily20141002', 'dump20141001'])
+        for prefetch in (0, 2):
+            self.assertEqual(self.process(prefetch), expected)
+
+    def test_transcode(self):
+        expected = self.expectedEvents(['daily20141004', 'daily20141003', 'daily20141002', 'dump20141001'])
+        self.assertEqual(self.process(0, True), expected)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dataPath, 'dump20141001'))),
+                         ['pages-meta-history.xml.blocks', 'pages-meta-history.xml.bz2', 'site_stats.sql.gz'])
+        # block files are used even if transcoding is not enabled, as long as their dump files do not change
+        for dirName in ('dump20141001', 'daily20141002', 'daily20141003', 'daily20141004'):
+            for fileName in os.listdir(os.path.join(self.dataPath, dirName)):
+                if fileName.endswith('.bz2'):
+                    fileName = os.path.join(self.dataPath, dirName, fileName)
+                    with open(fileName, 'r+b') as file:
+                        file.write('\0' * os.path.getsize(fileName))
+                    os.utime(fileName, (1400000000, 1400000000))
+        for prefetch in (0, 2):
+            self.assertEqual(self.process(prefetch), expected)
+            self.assertEqual(sorted(os.listdir(os.path.join(self.dataPath, 'daily20141003'))),
+                             ['pages-meta-hist-incr.xml.blocks', 'pages-meta-hist-incr.xml.bz2'])
+    def test_bundles(self):
+        self.assertEqual(self.makeFetcher().compactDailies('20141003'), 'bundle20141003-20141004')
+        self.assertEqual(self.makeFetcher().compactDailies(None, None, True), 'bundle20141002-20141004-latest')
+        self.assertEqual(self.makeFetcher().compactDailies('20141004'), None)
+        dirNames = ['daily20141004', 'daily20141003', 'daily20141002', 'dump20141001']
+        expected = self.expectedEvents(dirNames)
+        for prefetch in (0, 2):
+            fetcher = self.makeFetcher()
+            self.assertEqual(fetcher.getDumpFileList(), dirNames)
+            fetcher.setUseBundles(True)
+            self.assertEqual(fetcher.getDumpFileList(), ['bundle20141003-20141004', 'daily20141002', 'dump20141001'])
+            self.assertEqual(withoutEmptyPages(self.process(prefetch, fetcher=fetcher)), withoutEmptyPages(expected))
+
+        fetcher = self.makeFetcher()
+        fetcher.setUseBundles(True, True)
+        self.assertEqual(fetcher.getDumpFileList(), ['bundle20141002-20141004-latest', 'dump20141001'])
+        self.assertRaises(ValueError, self.process, 0, fetcher=fetcher)
+        processor = LatestProcessor()
+        dp = processdump.DumpProcessor()
+        dp.registerProcessor(processor)
+        for dirName in dirNames:
+            dp.processFile(StringIO.StringIO(self.dumps[dirName]))
+        events = self.process(0, fetcher=fetcher, processor=LatestProcessor())
+        self.assertEqual(newPages(events), newPages(processor.events))
+
+
+    def test_processing_error(self):
+        for prefetch in (0, 2):
+            threadCount = threading.active_count()
+            fetcher = self.makeFetcher()
+            files = []
+            openDumpFile = fetcher._DataFetcher__openDumpFile
+
+            def recordOpenDumpFile(fileName):
+                files.append(openDumpFile(fileName))
+                return files[-1]
+            fetcher._DataFetcher__openDumpFile = recordOpenDumpFile
+            self.assertRaises(ProcessingError, self.process, prefetch, fetcher=fetcher, processor=FailingProcessor(7))
+            for i in range(100):  # the prefetch threads stop after their current daily
+                if threading.active_count() <= threadCount:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(threading.active_count(), threadCount)
+            self.assertTrue(files)
+            self.assertEqual([file for file in files if not file.closed], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from includes import downloader
+
+
+class DumpServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, data):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), DumpRequestHandler)
+        self.data = data
+        self.supportRanges = True
+        self.failures = {}  # start of a range -> number of times that it fails
+        self.requests = []
+        self.lock = threading.Lock()
+
+
+class DumpRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        data = server.data
+        match = re.match('bytes=([0-9]+)-([0-9]+)$', self.headers.getheader('Range', ''))
+        with server.lock:
+            server.requests.append(match.group(0) if match else None)
+            if match and server.failures.get(int(match.group(1)), 0) > 0:
+                server.failures[int(match.group(1))] -= 1
+                fail = True
+            else:
+                fail = False
+        if match and server.supportRanges:
+            (start, end) = (int(match.group(1)), int(match.group(2)))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(data)))
+            data = data[start:end + 1]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if fail:
+            data = data[:len(data) / 2]  # connection lost
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'pages-meta-history.xml.bz2')
+        generator = random.Random(0)
+        self.data = ''.join([chr(generator.randint(0, 255)) for i in range(10500)])
+        self.server = DumpServer(self.data)
+        self.url = 'http://127.0.0.1:%d/wikidatawiki-pages-meta-history.xml.bz2' % self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.settings = (downloader.Downloader.CHUNK_SIZE, downloader.Downloader.RETRY_DELAY)
+        downloader.Downloader.CHUNK_SIZE = 1000
+        downloader.Downloader.RETRY_DELAY = 0
+
+    def tearDown(self):
+        (downloader.Downloader.CHUNK_SIZE, downloader.Downloader.RETRY_DELAY) = self.settings
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def readFile(self):
+        with open(self.fileName, 'rb') as file:
+            return file.read()
+
+    def test_chunks(self):
+        downloader.Downloader(3).download(self.url, self.fileName)
+        self.assertEqual(self.readFile(), self.data)
+        self.assertEqual(os.listdir(self.directory), ['pages-meta-history.xml.bz2'])
+        self.assertEqual(len(self.server.requests), 12)  # size and 11 chunks
+        self.assertTrue('bytes=10000-10499' in self.server.requests)
+
+    def test_retry(self):
+        self.server.failures = {2000: 2, 5000: 1}
+        downloader.Downloader(2, 2).download(self.url, self.fileName)
+        self.assertEqual(self.readFile(), self.data)
+        self.assertEqual(len(self.server.requests), 15)
+
+    def test_resume(self):
+        self.server.failures = {3000: 10}
+        self.assertRaises(IOError, downloader.Downloader(2, 1).download, self.url, self.fileName)
+        self.assertFalse(os.path.exists(self.fileName))
+        with open(self.fileName + '.part.json') as file:
+            progress = json.load(file)
+        self.assertEqual(progress['size'], 10500)
+        self.assertFalse(3 in progress['done'])
+        self.assertEqual(os.path.getsize(self.fileName + '.part'), 10500)
+
+        self.server.failures = {}
+        self.server.requests = []
+        downloader.Downloader(2).download(self.url, self.fileName)
+        self.assertEqual(self.readFile(), self.data)
+        self.assertEqual(len(self.server.requests), 1 + 11 - len(progress['done']))
+        self.assertTrue('bytes=3000-3999' in self.server.requests)
+        self.assertEqual(os.listdir(self.directory), ['pages-meta-history.xml.bz2'])
+
+    def test_other_progress(self):
+        with open(self.fileName + '.part', 'wb') as file:
+            file.write('x' * 10500)
+        with open(self.fileName + '.part.json', 'w') as file:
+            json.dump({'url': self.url, 'size': 10500, 'chunkSize': 500, 'done': range(21)}, file)
+        downloader.Downloader(2).download(self.url, self.fileName)
+        self.assertEqual(self.readFile(), self.data)
+
+    def test_no_ranges(self):
+        self.server.supportRanges = False
+        downloader.Downloader(2).download(self.url, self.fileName)
+        self.assertEqual(self.readFile(), self.data)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_checksum(self):
+        for supportRanges in (True, False):
+            self.server.supportRanges = supportRanges
+            checksum = ('md5', hashlib.md5(self.data).hexdigest())
+            downloader.Downloader(3).download(self.url, self.fileName, checksum)
+            self.assertEqual(self.readFile(), self.data)
+            self.assertEqual(sorted(os.listdir(self.directory)), ['pages-meta-history.xml.bz2', 'pages-meta-history.xml.bz2.verified'])
+            self.assertTrue(downloader.verifyFile(self.fileName, checksum))
+            os.remove(self.fileName)
+            os.remove(self.fileName + '.verified')
+
+    def test_wrong_checksum(self):
+        checksum = ('sha1', hashlib.sha1('other').hexdigest())
+        self.assertRaises(downloader.ChecksumError, downloader.Downloader(3).download, self.url, self.fileName, checksum)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_verify_file(self):
+        downloader.Downloader(3).download(self.url, self.fileName)
+        checksum = ('md5', hashlib.md5(self.data).hexdigest().upper())
+        self.assertFalse(downloader.verifyFile(self.fileName, ('md5', hashlib.md5('other').hexdigest())))
+        self.assertFalse(os.path.exists(self.fileName + '.verified'))
+        os.utime(self.fileName, (1400000000, 1400000000))
+        self.assertTrue(downloader.verifyFile(self.fileName, checksum))
+        # verified files are not hashed again, unless they have been modified
+        with open(self.fileName, 'r+b') as file:
+            file.write('x')
+        os.utime(self.fileName, (1400000000, 1400000000))
+        self.assertTrue(downloader.verifyFile(self.fileName, checksum))
+        os.utime(self.fileName, (1400000000, 1400000010))
+        self.assertFalse(downloader.verifyFile(self.fileName, checksum))
+        self.assertFalse(downloader.verifyFile(self.fileName, ('sha1', hashlib.sha1(self.data).hexdigest())))
+
+
+if __name__ == '__main__':
+    unittest.main()
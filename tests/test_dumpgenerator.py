@@ -0,0 +1,60 @@
+import StringIO
+import unittest
+from includes import dumpgenerator, processdump, processinghelper, epKbFileWriter, epTurtleFileWriter, entityDataFilter
+
+
+class TestDumpGenerator(unittest.TestCase):
+
+    def makeDump(self, pages=40, revisions=3, seed=0):
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(pages, revisions, seed).writeDump(output)
+        return output.getvalue()
+
+    def readEntities(self, dump):
+        dp = processdump.DumpProcessor()
+        helper = processinghelper.ProcessingHelper()
+        entities = []
+        for page in dp.iterPages(StringIO.StringIO(dump)):
+            revisions = list(page)
+            (revId, timestamp, user, isIp, rawContent) = revisions[-1]
+            entities.append((page.title, int(revId), page.isItem, len(revisions), helper.getVal(revId, rawContent)))
+        return (dp, entities)
+
+    def test_reproducible(self):
+        self.assertEqual(self.makeDump(), self.makeDump())
+        self.assertNotEqual(self.makeDump(), self.makeDump(seed=1))
+
+    def test_pages_and_revisions(self):
+        (dp, entities) = self.readEntities(self.makeDump(40, 4))
+        self.assertEqual(dp.pagecount, 40)
+        self.assertEqual(dp.revcount, 144) # only revisions of entities are counted
+        self.assertEqual(len(entities), 36)
+        self.assertEqual(len([entity for entity in entities if not entity[2]]), 4)
+        self.assertTrue(all(entity[3] == 4 for entity in entities))
+        self.assertEqual(entities[4][0], 'P5')
+        self.assertTrue('datatype' in entities[4][4])
+
+    def test_content(self):
+        (dp, entities) = self.readEntities(self.makeDump(100))
+        snakKinds = set()
+        for (title, revId, isItem, revisions, data) in entities:
+            self.assertTrue(len(data['label']) > 0 and len(data['aliases']) > 0)
+            for statement in data['claims']:
+                for snak in [statement['m']] + statement['q'] + [snak for ref in statement['refs'] for snak in ref]:
+                    snakKinds.add(snak[2] if snak[0] == 'value' else snak[0])
+        self.assertEqual(snakKinds, set(['somevalue', 'novalue', 'wikibase-entityid', 'string', 'time', 'globecoordinate', 'quantity']))
+
+    def test_serialization(self):
+        (dp, entities) = self.readEntities(self.makeDump(100))
+        turtle = epTurtleFileWriter.EPTurtleFile(StringIO.StringIO(), entityDataFilter.EntityDataFilter())
+        kb = epKbFileWriter.EPKbFile(StringIO.StringIO())
+        for (title, revId, isItem, revisions, data) in entities:
+            turtle.processEntity(title, revId, isItem, data)
+            kb.processEntity(title, revId, isItem, data)
+        self.assertEqual(turtle.propertyLookupCount, 0)
+        self.assertEqual(turtle.entityCount, 90)
+        self.assertEqual(kb.entityCount, 90)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import bz2
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from includes import dumpindex, processdump, revisionprocessor
+
+
+class RecordingProcessor(revisionprocessor.RevisionProcessor):
+
+    def __init__(self):
+        revisionprocessor.RevisionProcessor.__init__(self)
+        self.events = []
+
+    def startPageBlock(self, title, isItem, isNew):
+        self.events.append(('start', title, isItem, isNew))
+
+    def processRevision(self, revId, timestamp, user, isIp, rawContent):
+        self.events.append(('rev', revId, timestamp, user, isIp, str(rawContent)))
+
+    def endPageBlock(self):
+        self.events.append(('end',))
+
+
+def makeDump(pages):
+    random.seed(7)
+    lines = ['<mediawiki>\n']
+    revId = 100
+    for page in range(1, pages + 1):
+        if page % 3 == 0:
+            title = 'Property:P' + str(page)
+        else:
+            title = 'Q' + str(page)
+        lines.append('  <page>\n    <title>' + title + '</title>\n    <ns>0</ns>\n    <id>' + str(page) + '</id>\n')
+        for rev in range(random.randint(1, 3)):
+            revId += 1
+            lines.append('    <revision>\n      <id>' + str(revId) + '</id>\n'
+                         '      <timestamp>2013-05-01T10:00:00Z</timestamp>\n'
+                         '      <contributor>\n        <username>User</username>\n      </contributor>\n'
+                         '      <text xml:space="preserve">{&quot;label&quot;:{&quot;en&quot;:&quot;%x&quot;}}</text>\n'
+                         '    </revision>\n' % random.getrandbits(256))
+        lines.append('  </page>\n')
+    lines.append('</mediawiki>\n')
+    return ''.join(lines)
+
+
+class TestDumpIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dumpFileName = os.path.join(self.dir, 'dump.xml.bz2')
+        self.indexFileName = os.path.join(self.dir, 'dump.idx')
+        with open(self.dumpFileName, 'wb') as file:
+            file.write(bz2.compress(makeDump(3000), 1))
+        dumpindex.buildIndex(self.dumpFileName, self.indexFileName, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def processAll(self, titles):
+        processor = RecordingProcessor()
+        dp = processdump.DumpProcessor()
+        dp.registerProcessor(processor)
+        dp.processFile(bz2.BZ2File(self.dumpFileName))
+        events = []
+        inPage = False
+        for event in processor.events:
+            if event[0] == 'start':
+                inPage = event[1] in titles
+            if inPage:
+                events.append(event)
+        return events
+
+    def test_lookup(self):
+        index = dumpindex.DumpIndex(self.indexFileName)
+        self.assertEqual(index.getPageCount(), 3000)
+        self.assertNotEqual(index.getPosition('Q1'), None)
+        self.assertEqual(index.getPosition('P3'), index.getPosition('Property:P3'))
+        self.assertEqual(index.getPosition('Q3'), None)
+        self.assertEqual(index.getPosition('Q3001'), None)
+        index.close()
+
+    def test_process_pages(self):
+        titles = ['Q2900', 'Q1', 'P1500', 'Q1501', 'Q2000']
+        index = dumpindex.DumpIndex(self.indexFileName)
+        processor = RecordingProcessor()
+        dp = processdump.DumpProcessor()
+        dp.registerProcessor(processor)
+        index.processPages(self.dumpFileName, titles, dp)
+        index.close()
+        self.assertEqual(len([e for e in processor.events if e[0] == 'start']), 5)
+        self.assertEqual(processor.events, self.processAll(['Q1', 'P1500', 'Q1501', 'Q2000', 'Q2900']))
@@ -0,0 +1,114 @@
+import BaseHTTPServer
+import SocketServer
+import threading
+import unittest
+from includes import httppool
+
+
+class KeepAliveServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), KeepAliveRequestHandler)
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        pass  # clients close kept connections
+
+
+class KeepAliveRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == '/old':
+            self.send_response(301)
+            self.send_header('Location', '/file')
+            data = 'moved'
+        elif self.path == '/loop':
+            self.send_response(302)
+            self.send_header('Location', '/loop')
+            data = ''
+        elif self.path == '/close':
+            self.send_response(200)
+            self.send_header('Connection', 'close')
+            self.close_connection = 1
+            data = 'closed'
+        elif self.path.startswith('/file'):
+            self.send_response(200)
+            data = 'data of ' + self.path
+        else:
+            self.send_response(404)
+            data = 'not found'
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = KeepAliveServer()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.pool = httppool.ConnectionPool(10)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuse(self):
+        for i in range(5):
+            self.assertEqual(self.pool.read(self.url + '/file%d' % i), (200, 'data of /file%d' % i))
+        self.assertEqual(self.pool.read(self.url + '/missing'), (404, 'not found'))
+        self.assertEqual(self.pool.connectionCount, 1)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_closed_connection(self):
+        self.assertEqual(self.pool.read(self.url + '/close'), (200, 'closed'))
+        self.assertEqual(self.pool.read(self.url + '/file'), (200, 'data of /file'))
+        self.assertEqual(self.pool.connectionCount, 2)
+
+    def test_unread_response(self):
+        response = self.pool.open(self.url + '/file')
+        self.assertEqual(response.read(4), 'data')
+        response.close()
+        self.assertEqual(self.pool.read(self.url + '/file'), (200, 'data of /file'))
+        self.assertEqual(self.pool.connectionCount, 2)
+
+    def test_redirect(self):
+        response = self.pool.open(self.url + '/old')
+        self.assertEqual(response.getcode(), 200)
+        self.assertEqual(response.getheader('Content-Length'), '13')
+        self.assertEqual(response.read(), 'data of /file')
+        response.close()
+        self.assertEqual(self.pool.connectionCount, 1)
+        self.assertRaises(IOError, self.pool.open, self.url + '/loop')
+
+    def test_threads(self):
+        results = []
+        def fetch(i):
+            for j in range(5):
+                results.append(self.pool.read(self.url + '/file%d' % (i * 5 + j)))
+        threads = [threading.Thread(target=fetch, args=(i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), sorted([(200, 'data of /file%d' % i) for i in range(15)]))
+        self.assertTrue(self.pool.connectionCount <= 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
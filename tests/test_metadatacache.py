@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from includes import metadatacache
+
+
+class FakePool:
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def read(self, url):
+        self.requests.append(url)
+        if url in self.files:
+            return (200, self.files[url])
+        if url.endswith('/error'):
+            raise IOError('connection refused')
+        return (404, 'not found')
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'data', 'metadata-cache.json')
+        self.pool = FakePool({'http://dumps/': 'line 1\nline 2\n', 'http://dumps/status.txt': 'done'})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache(self):
+        cache = metadatacache.MetadataCache(self.fileName, self.pool)
+        self.assertEqual(cache.getLines('http://dumps/'), ['line 1\n', 'line 2\n'])
+        self.assertEqual(cache.getLines('http://dumps/'), ['line 1\n', 'line 2\n'])
+        self.assertEqual(cache.get('http://dumps/missing'), None)
+        self.assertEqual(cache.get('http://dumps/missing'), None)
+        self.assertEqual(cache.getLines('http://dumps/error'), [])
+        self.assertEqual(self.pool.requests, ['http://dumps/', 'http://dumps/missing', 'http://dumps/missing', 'http://dumps/error'])
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+    def test_ttl(self):
+        cache = metadatacache.MetadataCache(self.fileName, self.pool, 0)
+        self.assertEqual(cache.get('http://dumps/status.txt'), 'done')
+        self.assertEqual(cache.get('http://dumps/status.txt'), 'done')
+        self.assertEqual(len(self.pool.requests), 2)
+        cache.setPermanent('http://dumps/status.txt')
+        self.assertEqual(cache.get('http://dumps/status.txt'), 'done')
+        self.assertEqual(len(self.pool.requests), 2)
+
+    def test_save(self):
+        cache = metadatacache.MetadataCache(self.fileName, self.pool, 0)
+        cache.get('http://dumps/')
+        cache.get('http://dumps/status.txt')
+        cache.setPermanent('http://dumps/status.txt')
+        cache.save()
+        self.assertEqual(os.listdir(os.path.dirname(self.fileName)), ['metadata-cache.json'])
+
+        self.pool.files = {}
+        cache = metadatacache.MetadataCache(self.fileName, self.pool, 0)
+        self.assertEqual(cache.get('http://dumps/status.txt'), 'done')
+        self.assertEqual(cache.get('http://dumps/'), None)  # expired
+        cache = metadatacache.MetadataCache(self.fileName, self.pool, 3600)
+        self.assertEqual(cache.get('http://dumps/'), 'line 1\nline 2\n')
+
+    def test_damaged_file(self):
+        os.makedirs(os.path.dirname(self.fileName))
+        with open(self.fileName, 'w') as file:
+            file.write('{"http://dumps/": ')
+        cache = metadatacache.MetadataCache(self.fileName, self.pool)
+        self.assertEqual(cache.get('http://dumps/status.txt'), 'done')
+        self.assertEqual(len(self.pool.requests), 1)
+
+
+    def test_threads(self):
+        urls = ['http://dumps/file%d' % i for i in range(2000)]
+        self.pool.files.update(dict((url, url) for url in urls))
+        cache = metadatacache.MetadataCache(self.fileName, self.pool)
+        errors = []
+
+        def fetch(part):
+            try:
+                for url in urls[part::4]:
+                    cache.get(url)
+                    cache.setPermanent(url)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=fetch, args=(part,)) for part in range(4)]
+        for thread in threads:
+            thread.start()
+        while [thread for thread in threads if thread.is_alive()]:
+            cache.changed = True
+            cache.save()
+        for thread in threads:
+            thread.join()
+        cache.save()
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.misses, len(urls))
+        cache = metadatacache.MetadataCache(self.fileName, FakePool({}))
+        self.assertEqual(sorted(cache.entries), sorted(urls))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import StringIO
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import urllib
+import unittest
+from includes import entityDataFilter, epKbFileWriter, epTurtleFileWriter, processdump, processinghelper, revisionprocessor, rpedits, rplatest
+
+
+# Properties used in the test dump, with the types of their values. The types
+# of all of them are known to EPTurtleFile, so that no network is needed.
+PROPERTIES = ((31, 'wikibase-entityid'), (143, 'wikibase-entityid'), (214, 'string'), (569, 'time'), (625, 'globecoordinate'))
+DATATYPES = {31: 'wikibase-item', 143: 'wikibase-item', 214: 'string', 569: 'time', 625: 'globe-coordinate'}
+
+
+def makeSnak(rand, pages):
+    (propertyId, valueType) = rand.choice(PROPERTIES)
+    if rand.randint(0, 9) == 0:
+        return ['somevalue', propertyId]
+    elif valueType == 'wikibase-entityid':
+        value = {'entity-type': 'item', 'numeric-id': rand.randint(1, pages)}
+    elif valueType == 'string':
+        value = 'Value ' + str(rand.randint(0, 1000))
+    elif valueType == 'time':
+        value = {'time': '+0000000%04d-01-01T00:00:00Z' % rand.randint(1000, 2013), 'timezone': 0, 'before': 0, 'after': 0,
+                 'precision': 9, 'calendarmodel': 'http://www.wikidata.org/entity/Q1985727'}
+    else:
+        value = {'latitude': rand.randint(-90, 90), 'longitude': rand.randint(-180, 180), 'altitude': None,
+                 'precision': 1, 'globe': 'http://www.wikidata.org/entity/Q2'}
+    return ['value', propertyId, valueType, value]
+
+
+# Return a small MediaWiki XML dump with items, a few properties and
+# other pages, each with several revisions.
+def makeDump(pages):
+    rand = random.Random(0)
+    output = StringIO.StringIO()
+    output.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.8/" version="0.8" xml:lang="en">\n')
+    revId = 1000
+    for pageId in range(1, pages + 1):
+        if pageId % 25 == 0:
+            (title, data) = ('Wikidata:Project chat/' + str(pageId), None)
+        elif pageId % 40 == 7:
+            propertyId = PROPERTIES[(pageId / 40) % len(PROPERTIES)][0]
+            (title, data) = ('Property:P' + str(propertyId), {'datatype': DATATYPES[propertyId]})
+        else:
+            (title, data) = ('Q' + str(pageId), {})
+        output.write('  <page>\n    <title>' + title + '</title>\n    <ns>0</ns>\n    <id>' + str(pageId) + '</id>\n')
+        for revision in range(3):
+            revId += 1
+            if data is None:
+                text = 'discussion ' + str(revision)
+            else:
+                data['label'] = dict([(language, language + ' label ' + str(revision)) for language in ('en', 'de', 'fr')[:revision + 1]])
+                data['links'] = {'enwiki': 'Article ' + str(pageId)}
+                data['claims'] = [{'m': makeSnak(rand, pages), 'q': [makeSnak(rand, pages) for i in range(rand.randint(0, 1))],
+                                   'g': 'q' + str(pageId) + '$' + str(i), 'rank': 1, 'refs': [[makeSnak(rand, pages)]]} for i in range(rand.randint(1, 4))]
+                text = json.dumps(data).replace('"', '&quot;')
+            output.write('    <revision>\n      <id>' + str(revId) + '</id>\n')
+            output.write('      <timestamp>2013-0' + str(revision + 1) + '-' + str(10 + pageId % 15) + 'T12:00:00Z</timestamp>\n      <contributor>\n')
+            if rand.randint(0, 3) == 0:
+                output.write('        <ip>10.0.0.' + str(rand.randint(1, 254)) + '</ip>\n')
+            else:
+                output.write('        <username>User ' + str(rand.randint(0, 9)) + '</username>\n        <id>1</id>\n')
+            output.write('      </contributor>\n      <text xml:space="preserve">' + text + '</text>\n    </revision>\n')
+        output.write('  </page>\n')
+    output.write('</mediawiki>\n')
+    return output.getvalue()
+
+
+def noNetwork(url):
+    raise IOError('no network in tests')
+
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.data = makeDump(300)
+        self.dir = tempfile.mkdtemp()
+        self.urlopen = urllib.urlopen
+        urllib.urlopen = noNetwork
+
+    def tearDown(self):
+        urllib.urlopen = self.urlopen
+        shutil.rmtree(self.dir)
+
+    # Process the dump with the processors returned by makeProcessors,
+    # serially and with several workers and small batches, and return both
+    # lists of processors.
+    def process(self, makeProcessors):
+        results = []
+        for workers in (1, 3):
+            processors = makeProcessors(str(workers))
+            dp = processdump.DumpProcessor()
+            dp.setParallelWorkers(workers, 20)
+            self.assertEqual(dp.canProcessParallel(), workers > 1)
+            for processor in processors:
+                dp.registerProcessor(processor)
+            dp.processFile(StringIO.StringIO(self.data))
+            results.append(processors)
+        return results
+
+    def test_stats_and_edit_counts(self):
+        def makeProcessors(name):
+            return [revisionprocessor.RPStats(), rpedits.RPEditCount(processinghelper.ProcessingHelper())]
+        (serial, parallel) = self.process(makeProcessors)
+        self.assertEqual(parallel[0].endParallelBatch(), serial[0].endParallelBatch())
+        self.assertTrue(serial[0].itemRevisionCount > 0)
+        self.assertEqual(parallel[1].endParallelBatch(), serial[1].endParallelBatch())
+        self.assertTrue(serial[1].humanTotal > 0 and serial[1].anonTotal > 0)
+
+    # The outputs are written to files, which the worker processes must not
+    # write to.
+    def test_turtle_and_kb(self):
+        def makeProcessors(name):
+            rpl = rplatest.RPLatest(processinghelper.ProcessingHelper())
+            rpl.registerEntityProcessor(epTurtleFileWriter.EPTurtleFile(gzip.open(os.path.join(self.dir, name + '.ttl.gz'), 'w'), entityDataFilter.EntityDataFilter()))
+            rpl.registerEntityProcessor(epKbFileWriter.EPKbFile(open(os.path.join(self.dir, name + '.txt'), 'w')))
+            return [rpl]
+        (serial, parallel) = self.process(makeProcessors)
+        self.assertEqual(parallel[0].curRevsFound, serial[0].curRevsFound)
+        for processors in (serial, parallel):
+            processors[0].close()
+        (serialTurtle, serialKb) = serial[0].eps
+        (parallelTurtle, parallelKb) = parallel[0].eps
+        turtles = [[line for line in gzip.open(os.path.join(self.dir, name + '.ttl.gz')).read().splitlines() if not line.startswith('# Generated')] for name in ('1', '3')]
+        self.assertEqual(turtles[1], turtles[0])
+        self.assertEqual(len([line for line in turtles[0] if line.startswith('### Wikidata')]), 1)
+        self.assertTrue(serialTurtle.propertyCount > 0)
+        self.assertEqual(parallelTurtle.propertyCount, serialTurtle.propertyCount)
+        self.assertEqual(parallelTurtle.propertyTypes, serialTurtle.propertyTypes)
+        self.assertEqual((parallelTurtle.entityCount, parallelTurtle.statStatementCount, parallelTurtle.statTripleCount),
+                         (serialTurtle.entityCount, serialTurtle.statStatementCount, serialTurtle.statTripleCount))
+        kbs = [open(os.path.join(self.dir, name + '.txt')).read() for name in ('1', '3')]
+        self.assertEqual(kbs[1], kbs[0])
+        self.assertTrue(len(kbs[0]) > 0)
+        self.assertEqual(parallelKb.entityCount, serialKb.entityCount)
+
+
+if __name__ == '__main__':
+    unittest.main()
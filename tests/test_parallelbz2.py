@@ -0,0 +1,72 @@
+import bz2
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from includes import parallelbz2
+
+
+class TestParallelBZ2File(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(42)
+        lines = []
+        for i in range(20000):
+            lines.append('    <line n="%d">%x</line>\n' % (i, random.getrandbits(128)))
+        self.data = ''.join(lines)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def writeFile(self, name, data):
+        filename = os.path.join(self.dir, name)
+        with open(filename, 'wb') as file:
+            file.write(data)
+        return filename
+
+    def readAll(self, filename):
+        file = parallelbz2.ParallelBZ2File(filename, 2, 2)
+        lines = list(file)
+        file.close()
+        return lines
+
+    def test_single_stream(self):
+        filename = self.writeFile('single.bz2', bz2.compress(self.data, 1))
+        self.assertFalse(parallelbz2.ParallelBZ2File(filename, 2).multistream)
+        self.assertEqual(self.readAll(filename), self.data.splitlines(True))
+
+    def test_multistream(self):
+        half = len(self.data) / 2
+        filename = self.writeFile('multi.bz2', bz2.compress(self.data[:half]) + bz2.compress(self.data[half:]))
+        self.assertTrue(parallelbz2.ParallelBZ2File(filename, 2).multistream)
+        self.assertEqual(self.readAll(filename), self.data.splitlines(True))
+
+    def test_false_boundary(self):
+        compressed = bz2.compress(self.data, 1)
+        filename = self.writeFile('single.bz2', compressed)
+        boundaries = parallelbz2._scanSegment((filename, 0, len(compressed), False))
+        boundaries.append((len(compressed) * 8, False))
+        self.assertTrue(len(boundaries) > 3)
+        boundaries.insert(2, (boundaries[1][0] + 1001, True))
+        (data, end) = parallelbz2._decompressBlocks((filename, boundaries, len(boundaries) - 1, False))
+        self.assertEqual(data, self.data)
+        self.assertEqual(end, len(compressed) * 8)
+
+    def test_seek_position(self):
+        filename = self.writeFile('single.bz2', bz2.compress(self.data, 1))
+        file = parallelbz2.ParallelBZ2File(filename, 2, 2)
+        lines = []
+        for line in file:
+            lines.append(line)
+            if len(lines) == 15000:
+                break
+        position = file.getPosition()
+        file.close()
+        self.assertTrue(position[0] > 0)
+        file = parallelbz2.ParallelBZ2File(filename, 2, 2)
+        file.seekPosition(position)
+        lines += list(file)
+        file.close()
+        self.assertEqual(lines, self.data.splitlines(True))
@@ -0,0 +1,336 @@
+import StringIO
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from includes import dumpgenerator, processdump, revisionprocessor
+
+
+class RecordingProcessor(revisionprocessor.RevisionProcessor):
+
+    def __init__(self):
+        revisionprocessor.RevisionProcessor.__init__(self)
+        self.events = []
+
+    def startPageBlock(self, title, isItem, isNew):
+        self.events.append(('start', title, isItem, isNew))
+
+    def processRevision(self, revId, timestamp, user, isIp, rawContent):
+        if rawContent is not None:
+            rawContent = rawContent.getText()
+        self.events.append(('rev', revId, timestamp, user, isIp, rawContent))
+
+    def endPageBlock(self):
+        self.events.append(('end',))
+
+
+def makePage(title, revisions):
+    lines = ['  <page>\n    <title>' + title + '</title>\n    <ns>0</ns>\n    <id>7</id>\n']
+    for (revId, user, isIp, text) in revisions:
+        lines.append('    <revision>\n      <id>' + str(revId) + '</id>\n      <parentid>1</parentid>\n'
+                     '      <timestamp>2013-05-0' + str(revId % 9 + 1) + 'T10:00:00Z</timestamp>\n'
+                     '      <contributor>\n')
+        if isIp:
+            lines.append('        <ip>' + user + '</ip>\n')
+        else:
+            lines.append('        <username>' + user + '</username>\n        <id>3</id>\n')
+        lines.append('      </contributor>\n      <comment>edit</comment>\n' + text + '      <sha1>x</sha1>\n    </revision>\n')
+    lines.append('  </page>\n')
+    return ''.join(lines)
+
+
+def makeText(text):
+    return '      <text xml:space="preserve">' + text + '</text>\n'
+
+
+DUMP = ''.join([
+    '<mediawiki>\n  <siteinfo>\n    <sitename>Wikidata</sitename>\n  </siteinfo>\n',
+    makePage('Q1', [(11, 'Alice', False, makeText('{&quot;label&quot;:{}}')),
+                    (12, '1.2.3.4', True, makeText('{&quot;label&quot;:{&quot;en&quot;:&quot;x&quot;}}'))]),
+    makePage('Wikidata:Main Page', [(13, 'Bob', False, makeText('Hello'))]),
+    makePage('Property:P2', [(14, 'Bob', False, makeText('{}')),
+                             (15, 'Carol', False, makeText('')),
+                             (16, '5.6.7.8', True, '      <text xml:space="preserve" />\n')]),
+    makePage('Question', [(17, 'Bob', False, makeText('{}'))]),
+    makePage('Q1', [(12, '1.2.3.4', True, makeText('{}')),
+                    (18, 'Alice', False, makeText('{&quot;a&quot;:1}'))]),
+    '  <page>\n    <title>Q4</title>\n    <ns>0</ns>\n    <id>9</id>\n'
+    '    <revision>\n      <id>21</id>\n      <timestamp>2013-05-02T10:00:00Z</timestamp>\n'
+    '      <contributor deleted="deleted" />\n      <minor />\n      <model>wikibase-item</model>\n'
+    '      <text xml:space="preserve">{&quot;c&quot;:3}</text>\n    </revision>\n'
+    '    <revision>\n      <id>22</id>\n      <timestamp>2013-05-03T10:00:00Z</timestamp>\n'
+    '      <contributor>\n        <ip>8.8.8.8</ip>\n      </contributor>\n      <minor />\n'
+    '      <comment>/* wbsetlabel */</comment>\n      <model>wikibase-item</model>\n      <format>application/json</format>\n'
+    '      <text xml:space="preserve">{&quot;d&quot;:4}</text>\n    </revision>\n  </page>\n',
+    makePage('Q3', [(19, 'Dave', False, '      <text xml:space="preserve">{&quot;a&quot;:\n1}</text>\n'),
+                    (20, '9.9.9.9', True, makeText('{&quot;b&quot;:2}'))]),
+    '</mediawiki>\n'])
+
+
+class TestScanners(unittest.TestCase):
+
+    def process(self, scanner, data):
+        processor = RecordingProcessor()
+        dp = processdump.DumpProcessor()
+        dp.setScanner(scanner)
+        dp.registerProcessor(processor)
+        dp.processFile(StringIO.StringIO(data))
+        return (processor.events, dp.linecount, dp.pagecount, dp.revcount, dp.duprevcount)
+
+    def test_same_events(self):
+        expected = self.process('lines', DUMP)
+        self.assertEqual(len([e for e in expected[0] if e[0] == 'rev']), 7)
+        bufferSize = processdump.DumpProcessor.BUFFER_SIZE
+        try:
+            for size in (1, 7, 64, 1000, 1 << 20):
+                processdump.DumpProcessor.BUFFER_SIZE = size
+                self.assertEqual(self.process('buffers', DUMP), expected)
+        finally:
+            processdump.DumpProcessor.BUFFER_SIZE = bufferSize
+
+    def test_unknown_scanner(self):
+        self.assertRaises(ValueError, processdump.DumpProcessor().setScanner, 'xml')
+
+
+class MetadataProcessor(RecordingProcessor):
+
+    def needsContent(self):
+        return False
+
+
+class LatestProcessor(RecordingProcessor):
+
+    def __init__(self, maxTimestamp=None):
+        RecordingProcessor.__init__(self)
+        self.maxTimestamp = maxTimestamp
+
+    def needsLatestRevisionOnly(self):
+        return True
+
+    def getMaxTimestamp(self):
+        return self.maxTimestamp
+
+
+class TestRevisionSelection(unittest.TestCase):
+
+    def process(self, scanner, processors):
+        dp = processdump.DumpProcessor()
+        dp.setScanner(scanner)
+        for processor in processors:
+            dp.registerProcessor(processor)
+        bufferSize = processdump.DumpProcessor.BUFFER_SIZE
+        processdump.DumpProcessor.BUFFER_SIZE = 64
+        try:
+            dp.processFile(StringIO.StringIO(DUMP))
+        finally:
+            processdump.DumpProcessor.BUFFER_SIZE = bufferSize
+        return [processor.events for processor in processors]
+
+    def allEvents(self):
+        return self.process('lines', [RecordingProcessor()])[0]
+
+    def test_metadata_only(self):
+        expected = [e if e[0] != 'rev' else e[:5] + (None,) for e in self.allEvents()]
+        for scanner in ('lines', 'buffers'):
+            self.assertEqual(self.process(scanner, [MetadataProcessor()]), [expected])
+            # content is passed on if any processor needs it
+            events = self.process(scanner, [MetadataProcessor(), RecordingProcessor()])
+            self.assertEqual(events[1], self.allEvents())
+
+    def latestEvents(self, maxTimestamp):
+        events = []
+        for e in self.allEvents():
+            if e[0] == 'start':
+                latest = None
+            elif e[0] == 'rev' and (maxTimestamp is None or e[2] < maxTimestamp):
+                if latest is None or int(e[1]) > int(latest[1]):
+                    latest = e
+            if e[0] == 'end' and latest is not None:
+                events.append(latest)
+            if e[0] != 'rev':
+                events.append(e)
+        return events
+
+    def test_latest_only(self):
+        for scanner in ('lines', 'buffers'):
+            for maxTimestamp in (None, '2013-05-04'):
+                expected = self.latestEvents(maxTimestamp)
+                self.assertEqual(self.process(scanner, [LatestProcessor(maxTimestamp)]), [expected])
+            # processors with different dates need all revisions
+            events = self.process(scanner, [LatestProcessor(), LatestProcessor('2013-05-04')])
+            self.assertEqual(events[0], self.allEvents())
+
+
+class LatestMetadataProcessor(LatestProcessor):
+
+    def needsContent(self):
+        return False
+
+
+def makeStubs(data):
+    # the text that cannot be read in the full dump has no content in the stub dump either
+    data = data.replace('<text xml:space="preserve">{&quot;a&quot;:\n1}</text>', '<text id="19" deleted="deleted" />')
+    data = data.replace('<text xml:space="preserve" />', '<text id="16" bytes="0" />')
+    return re.sub('<text xml:space="preserve">([^<\n]*)</text>', lambda match: '<text id="1" bytes="' + str(len(match.group(1))) + '" />', data)
+
+
+class TestStubs(unittest.TestCase):
+
+    def process(self, scanner, data, stubs, processor):
+        dp = processdump.DumpProcessor()
+        dp.setScanner(scanner)
+        dp.setStubs(stubs)
+        dp.registerProcessor(processor)
+        bufferSize = processdump.DumpProcessor.BUFFER_SIZE
+        processdump.DumpProcessor.BUFFER_SIZE = 64
+        try:
+            dp.processFile(StringIO.StringIO(data))
+        finally:
+            processdump.DumpProcessor.BUFFER_SIZE = bufferSize
+        return (processor.events, dp.pagecount, dp.revcount, dp.duprevcount)
+
+    def test_same_events(self):
+        stubs = makeStubs(DUMP)
+        self.assertFalse('xml:space' in stubs)
+        for scanner in ('lines', 'buffers'):
+            expected = self.process(scanner, DUMP, False, MetadataProcessor())
+            self.assertEqual(self.process(scanner, stubs, True, MetadataProcessor()), expected)
+            latest = self.process(scanner, DUMP, False, LatestMetadataProcessor('2013-05-04'))
+            self.assertEqual(self.process(scanner, stubs, True, LatestMetadataProcessor('2013-05-04')), latest)
+
+    def test_generated_dump(self):
+        generator = dumpgenerator.DumpGenerator(30, 3)
+        full = StringIO.StringIO()
+        generator.writeDump(full)
+        stubs = StringIO.StringIO()
+        generator.writeDump(stubs, True)
+        self.assertTrue(len(stubs.getvalue()) < len(full.getvalue()) / 3)
+        for scanner in ('lines', 'buffers'):
+            self.assertEqual(self.process(scanner, stubs.getvalue(), True, MetadataProcessor()),
+                             self.process(scanner, full.getvalue(), False, MetadataProcessor()))
+
+    def test_content_needed(self):
+        self.assertRaises(ValueError, self.process, 'lines', makeStubs(DUMP), True, RecordingProcessor())
+
+
+class TestIterPages(unittest.TestCase):
+
+    def iterEvents(self, pages):
+        events = []
+        for page in pages:
+            events.append(('start', page.title, page.isItem, page.isNew))
+            for (revId, timestamp, user, isIp, rawContent) in page:
+                events.append(('rev', revId, timestamp, user, isIp, rawContent.getText()))
+            events.append(('end',))
+        return events
+
+    def test_same_events(self):
+        processor = RecordingProcessor()
+        dp = processdump.DumpProcessor()
+        dp.registerProcessor(processor)
+        dp.processFile(StringIO.StringIO(DUMP))
+        for scanner in ('lines', 'buffers'):
+            dp = processdump.DumpProcessor()
+            dp.setScanner(scanner)
+            self.assertEqual(self.iterEvents(dp.iterPages(StringIO.StringIO(DUMP))), processor.events)
+
+    def test_skip_and_stop(self):
+        for scanner in ('lines', 'buffers'):
+            dp = processdump.DumpProcessor()
+            dp.setScanner(scanner)
+            pages = dp.iterPages(StringIO.StringIO(DUMP))
+            titles = []
+            firstRevisions = []
+            for page in pages:
+                titles.append(page.title)
+                if page.title == 'Q1':
+                    # read only the first revision
+                    for revision in page:
+                        firstRevisions.append(revision[0])
+                        break
+                elif page.title == 'Q4':
+                    break
+            pages.close()
+            self.assertEqual(titles, ['Q1', 'P2', 'Q1', 'Q4'])
+            self.assertEqual(firstRevisions, ['11', '18'])
+            self.assertEqual(dp.pagecount, 6)
+
+    def test_max_pages(self):
+        processor = RecordingProcessor()
+        dp = processdump.DumpProcessor()
+        dp.registerProcessor(processor)
+        dp.processFile(StringIO.StringIO(DUMP))
+        ends = [i for (i, event) in enumerate(processor.events) if event == ('end',)]
+        for scanner in ('lines', 'buffers'):
+            limited = RecordingProcessor()
+            dp = processdump.DumpProcessor()
+            dp.setScanner(scanner)
+            dp.setMaxPages(2)
+            dp.registerProcessor(limited)
+            dp.processFile(StringIO.StringIO(DUMP))
+            self.assertEqual(limited.events, processor.events[:ends[1] + 1])
+            # further files are not processed at all
+            dp.processFile(StringIO.StringIO(DUMP))
+            self.assertEqual(limited.events.count(('end',)), 2)
+
+
+class TestPipeline(unittest.TestCase):
+
+    def process(self, pipeline):
+        processor = RecordingProcessor()
+        dp = processdump.DumpProcessor()
+        dp.setPipeline(pipeline, 2)
+        dp.registerProcessor(processor)
+        dp.processFile(StringIO.StringIO(DUMP))
+        # the second run sees the entities and revisions of the first
+        dp.processFile(StringIO.StringIO(DUMP))
+        return (processor.events, dp.linecount, dp.pagecount, dp.revcount, dp.duprevcount)
+
+    def test_same_events(self):
+        sizes = (processdump.DumpProcessor.BUFFER_SIZE, processdump.DumpProcessor.PIPELINE_BATCH_SIZE)
+        processdump.DumpProcessor.BUFFER_SIZE = 64
+        processdump.DumpProcessor.PIPELINE_BATCH_SIZE = 2
+        try:
+            self.assertEqual(self.process(True), self.process(False))
+        finally:
+            (processdump.DumpProcessor.BUFFER_SIZE, processdump.DumpProcessor.PIPELINE_BATCH_SIZE) = sizes
+
+    def test_error(self):
+        dp = processdump.DumpProcessor()
+        dp.setPipeline(True)
+        dp.registerProcessor(RecordingProcessor())
+        data = DUMP.replace('<id>11</id>', '<id>x</id>')
+        self.assertRaises(IOError, dp.processFile, StringIO.StringIO(data))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_metrics_file(self):
+        fileName = os.path.join(self.dir, 'metrics.json')
+        for scanner in ('lines', 'buffers'):
+            dp = processdump.DumpProcessor()
+            dp.setScanner(scanner)
+            dp.registerProcessor(MetadataProcessor())
+            dp.setMetricsFile(fileName)
+            dumpFileName = os.path.join(self.dir, 'dump.xml')
+            with open(dumpFileName, 'w') as file:
+                file.write(DUMP)
+            with open(dumpFileName) as file:
+                dp.processFile(file)
+            metrics = json.load(open(fileName))
+            self.assertEqual(metrics['pages'], dp.pagecount)
+            self.assertEqual(metrics['bytes'], len(DUMP))
+            self.assertEqual(metrics['compressedBytes'], len(DUMP))
+            callbacks = metrics['processors'][0]['callbacks']
+            self.assertEqual(metrics['processors'][0]['name'], 'MetadataProcessor')
+            self.assertEqual(callbacks['processRevision']['calls'], 7)
+            self.assertEqual(callbacks['startPageBlock']['calls'], 5)
+            self.assertTrue(callbacks['endPageBlock']['wallSeconds'] >= 0)
@@ -0,0 +1,115 @@
+import StringIO
+import unittest
+from includes import dumpgenerator, entityDataFilter, epTurtleFileWriter, processdump, processinghelper, revisioncontent, rplatest
+
+
+def makeContent(label):
+    return revisioncontent.RevisionContent('{&quot;label&quot;:{&quot;en&quot;:&quot;' + label + '&quot;}}')
+
+
+class TestProcessingHelper(unittest.TestCase):
+
+    def test_get_val(self):
+        helper = processinghelper.ProcessingHelper()
+        val = helper.getVal('7', makeContent('x'))
+        self.assertEqual(val, {'label': {'en': 'x'}, 'claims': [], 'description': {}, 'aliases': {}, 'links': {}})
+        self.assertTrue(helper.getVal(7, makeContent('x')) is val)
+        self.assertEqual((helper.cacheHits, helper.cacheMisses), (1, 1))
+
+    def test_interleaved_revisions(self):
+        helper = processinghelper.ProcessingHelper()
+        contents = [makeContent(str(i)) for i in range(3)]
+        for i in range(3):
+            for rev in range(3):
+                self.assertEqual(helper.getVal(rev, contents[rev])['label'], {'en': str(rev)})
+        self.assertEqual((helper.cacheHits, helper.cacheMisses, helper.cacheEvictions), (6, 3, 0))
+
+    def test_entry_limit(self):
+        helper = processinghelper.ProcessingHelper()
+        helper.setCacheLimits(2, 1000)
+        helper.getVal(1, makeContent('a'))
+        helper.getVal(2, makeContent('b'))
+        helper.getVal(1, makeContent('a'))
+        helper.getVal(3, makeContent('c')) # evicts 2, the least recently used
+        self.assertEqual(helper.valCache.keys(), [1, 3])
+        self.assertEqual(helper.cacheEvictions, 1)
+        self.assertEqual(helper.getVal(2, makeContent('changed'))['label'], {'en': 'changed'})
+        self.assertEqual((helper.cacheHits, helper.cacheMisses), (1, 4))
+
+    def test_memory_limit(self):
+        helper = processinghelper.ProcessingHelper()
+        size = len(makeContent('a').getRawText())
+        helper.setCacheLimits(100, 2 * size)
+        for rev in range(4):
+            helper.getVal(rev, makeContent('a'))
+        self.assertEqual(helper.valCache.keys(), [2, 3])
+        self.assertEqual(helper.valCacheSize, 2 * size)
+        helper.getVal(4, makeContent('x' * 200))
+        self.assertEqual(helper.valCache.keys(), [2, 3])
+        helper.setCacheLimits(0, 0)
+        self.assertEqual(len(helper.valCache), 0)
+        self.assertEqual(helper.valCacheSize, 0)
+        helper.getVal(5, makeContent('a'))
+        self.assertEqual(len(helper.valCache), 0)
+
+    def test_fields(self):
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(30, 2).writeDump(output)
+        fields = ('label', 'claims', 'datatype')
+        for page in processdump.DumpProcessor().iterPages(StringIO.StringIO(output.getvalue())):
+            (revId, timestamp, user, isIp, rawContent) = list(page)[-1]
+            full = processinghelper.ProcessingHelper().getVal(revId, rawContent.getRawText())
+            val = processinghelper.ProcessingHelper().getVal(revId, rawContent, fields)
+            self.assertEqual(val, dict([(field, full[field]) for field in fields if field in full]))
+            self.assertTrue(rawContent.value is None)
+
+    def test_fields_in_strings(self):
+        text = '{&quot;label&quot;:{&quot;en&quot;:&quot;a,\\&quot;claims\\&quot;:1&quot;},&quot;links&quot; : {&quot;x&quot;:{&quot;a&quot;:[]}} ,&quot;claims&quot;:[{&quot;m&quot;:[&quot;value&quot;,1]}]}'
+        val = processinghelper.ProcessingHelper().getVal(1, text, ['claims', 'links', 'aliases'])
+        self.assertEqual(val, {'claims': [{'m': ['value', 1]}], 'links': {'x': {'a': []}}, 'aliases': {}})
+
+    def test_nested_fields(self):
+        text = '{&quot;label&quot;:{&quot;en&quot;:&quot;x&quot;,&quot;description&quot;:{&quot;datatype&quot;:1}},&quot;claims&quot;:[{&quot;m&quot;:[&quot;value&quot;,1,&quot;x]}&quot;,{&quot;label&quot;:&quot;nested&quot;,&quot;links&quot;:{&quot;a&quot;:1}}]}]}'
+        expected = {'label': {'en': 'x', 'description': {'datatype': 1}}, 'links': {}, 'description': {}}
+        fields = ['label', 'links', 'description', 'datatype']
+        self.assertEqual(processinghelper.ProcessingHelper().getVal(1, text, fields), expected)
+        self.assertEqual(processinghelper.ProcessingHelper().getVal(1, revisioncontent.RevisionContent(text), fields), expected)
+
+    def test_cached_fields(self):
+        helper = processinghelper.ProcessingHelper()
+        content = makeContent('x')
+        val = helper.getVal(1, content, ['claims'])
+        self.assertEqual(val, {'claims': []})
+        self.assertTrue(helper.getVal(1, content, []) is val)
+        self.assertEqual(helper.getVal(1, content, ['label'])['label'], {'en': 'x'})
+        self.assertEqual(helper.valCache[1][2], frozenset(['claims', 'label']))
+        self.assertTrue(helper.getVal(1, content, ['claims', 'label']) is val)
+        self.assertTrue(helper.getVal(1, content) is content.getData())
+        self.assertTrue(helper.getVal(1, content, ['label']) is content.getData())
+        self.assertEqual((helper.cacheHits, helper.cacheMisses), (3, 3))
+
+    def test_turtle_labels(self):
+        output = StringIO.StringIO()
+        dumpgenerator.DumpGenerator(30, 2).writeDump(output)
+        results = []
+        for useFields in (True, False):
+            dataFilter = entityDataFilter.EntityDataFilter()
+            dataFilter.setIncludeSites([])
+            dataFilter.setIncludeStatements(False)
+            turtle = StringIO.StringIO()
+            ep = epTurtleFileWriter.EPTurtleFile(turtle, dataFilter)
+            if useFields:
+                self.assertEqual(sorted(ep.getNeededFields()), ['aliases', 'datatype', 'description', 'label'])
+            else:
+                ep.getNeededFields = lambda: None
+            rpl = rplatest.RPLatest(processinghelper.ProcessingHelper())
+            rpl.registerEntityProcessor(ep)
+            dp = processdump.DumpProcessor()
+            dp.registerProcessor(rpl)
+            dp.processFile(StringIO.StringIO(output.getvalue()))
+            results.append([line for line in turtle.getvalue().splitlines() if not line.startswith('# Generated')])
+        self.assertEqual(results[0], results[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import StringIO
+import cStringIO
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from includes import dumpgenerator, processdump, processinghelper, processjsondump, rplatest, epKbFileWriter
+
+
+class TestJsonDumpProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        generator = dumpgenerator.DumpGenerator(60, 3)
+        output = StringIO.StringIO()
+        generator.writeDump(output)
+        self.xmlDump = output.getvalue()
+        output = StringIO.StringIO()
+        generator.writeJsonDump(output)
+        self.jsonDump = output.getvalue()
+        self.fileName = os.path.join(self.directory, 'wikidata-20141103-all.json')
+        with open(self.fileName, 'w') as file:
+            file.write(self.jsonDump)
+        with open(self.fileName, 'r') as input:
+            with gzip.open(self.fileName + '.gz', 'w') as file:
+                file.write(input.read())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def exportKb(self, file, workers=1):
+        jdp = processjsondump.JsonDumpProcessor()
+        jdp.setParallelWorkers(workers)
+        rpl = rplatest.RPLatest(processinghelper.ProcessingHelper())
+        output = cStringIO.StringIO() # like a file, accepts unicode strings of ASCII characters
+        kb = epKbFileWriter.EPKbFile(output)
+        rpl.registerEntityProcessor(kb)
+        jdp.registerProcessor(rpl)
+        jdp.processFile(file)
+        return (jdp.entitycount, rpl.curRevsFound, kb.entityCount, output.getvalue())
+
+    def test_parse_line(self):
+        self.assertEqual(processjsondump._parseLine('[\n'), None)
+        self.assertEqual(processjsondump._parseLine(']\n'), None)
+        self.assertEqual(processjsondump._parseLine('{"id":"Q1"},\n'), {'id': 'Q1'})
+        self.assertEqual(processjsondump._parseLine('{"id":"Q1"}\n'), {'id': 'Q1'})
+
+    def test_convert_entity(self):
+        helper = processinghelper.ProcessingHelper()
+        xmlEntities = []
+        for page in processdump.DumpProcessor().iterPages(StringIO.StringIO(self.xmlDump)):
+            (revId, timestamp, user, isIp, rawContent) = list(page)[-1]
+            xmlEntities.append((page.title, int(revId), page.isItem, helper.getVal(revId, rawContent)))
+        jsonEntities = []
+        for line in StringIO.StringIO(self.jsonDump):
+            entity = processjsondump._parseLine(line)
+            if entity is not None:
+                jsonEntities.append(processjsondump.convertEntity(entity))
+        self.assertEqual(len(jsonEntities), 54)
+        self.assertEqual(jsonEntities, xmlEntities)
+        self.assertTrue(all(isinstance(entity[0], str) for entity in jsonEntities))
+
+    def test_convert_entity_time(self):
+        entity = {'id': 'Q5', 'type': 'item', 'labels': [], 'claims': {'P569': [{'mainsnak': {'snaktype': 'value', 'property': 'P569',
+            'datavalue': {'type': 'time', 'value': {'time': '-1952-03-11T00:00:00Z'}}}, 'rank': 'preferred'}]}}
+        (title, revision, isItem, data) = processjsondump.convertEntity(entity)
+        self.assertEqual((title, revision, isItem), ('Q5', 0, True))
+        self.assertEqual(data['label'], {})
+        self.assertEqual(data['claims'][0]['m'][3]['time'], '-00000001952-03-11T00:00:00Z')
+        self.assertEqual(data['claims'][0]['rank'], 2)
+
+    def test_read_range(self):
+        size = os.path.getsize(self.fileName)
+        lines = []
+        for start in range(0, size, 1000):
+            lines.extend(processjsondump._readRange(self.fileName, start, min(start + 1000, size)))
+        self.assertEqual(''.join(lines), self.jsonDump)
+
+    def test_parallel(self):
+        with open(self.fileName) as file:
+            expected = self.exportKb(file)
+        self.assertEqual(expected[:3], (54, 54, 54))
+        oldRangeSize = processjsondump.JsonDumpProcessor.RANGE_SIZE
+        oldBatchSize = processjsondump.JsonDumpProcessor.BATCH_SIZE
+        processjsondump.JsonDumpProcessor.RANGE_SIZE = 2000
+        processjsondump.JsonDumpProcessor.BATCH_SIZE = 5
+        try:
+            with open(self.fileName) as file:
+                self.assertEqual(self.exportKb(file, 2), expected)
+            file = processjsondump.openFile(self.fileName + '.gz')
+            self.assertEqual(self.exportKb(file, 2), expected)
+            file.close()
+        finally:
+            processjsondump.JsonDumpProcessor.RANGE_SIZE = oldRangeSize
+            processjsondump.JsonDumpProcessor.BATCH_SIZE = oldBatchSize
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from includes import profiler
+
+
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+
+def work():
+    total = 0
+    for i in range(15):
+        total += fib(18)
+    return total
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def profile(self, mode):
+        profile = profiler.Profiler(mode, 0.001)
+        profile.start()
+        work()
+        profile.stop()
+        prefix = os.path.join(self.directory, mode)
+        profile.writeResults(prefix)
+        folded = open(prefix + '.folded').read().splitlines()
+        summary = open(prefix + '.txt').read()
+        return (folded, summary)
+
+    def test_trace(self):
+        (folded, summary) = self.profile('trace')
+        stacks = [line.rsplit(' ', 1)[0].split(';') for line in folded]
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in folded))
+        self.assertTrue(any(stack[-2:] == ['fib (test_profiler.py:8)', 'fib (test_profiler.py:8)'] for stack in stacks))
+        self.assertTrue(any(stack[-1] == 'range (__builtin__)' for stack in stacks))
+        self.assertTrue('work (test_profiler.py:14)' in summary)
+
+    def test_sample(self):
+        (folded, summary) = self.profile('sample')
+        self.assertTrue(len(folded) > 0)
+        self.assertTrue(any('fib (test_profiler.py:8)' in line for line in folded))
+        self.assertTrue(summary.startswith('Profile of '))
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, profiler.Profiler, 'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+from includes import regression
+
+
+class TestPerformanceHarness(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def makeResults(self, parseTime, parseRss, bytes=1000):
+        return {'corpus': {'pages': 20, 'revisions': 2, 'seed': 0, 'bytes': bytes}, 'machine': 'test', 'time': '',
+                'calibrationSeconds': 1.0,
+                'workloads': {'parse': {'seconds': parseTime, 'relativeTime': parseTime, 'peakRssMb': parseRss},
+                              'editcount': {'seconds': 1.0, 'relativeTime': 1.0, 'peakRssMb': 10.0}}}
+
+    def test_run(self):
+        harness = regression.PerformanceHarness(20, 2, 0, 1)
+        self.assertEqual(harness.getWorkloadNames(), ['parse', 'latest-turtle', 'editcount'])
+        results = harness.run(['parse', 'editcount'])
+        self.assertEqual(sorted(results['workloads']), ['editcount', 'parse'])
+        self.assertTrue(results['calibrationSeconds'] > 0)
+        for result in results['workloads'].values():
+            self.assertTrue(result['seconds'] > 0 and result['peakRssMb'] > 0)
+            self.assertAlmostEqual(result['relativeTime'], result['seconds'] / results['calibrationSeconds'], 2)
+        fileName = os.path.join(self.directory, 'baseline.json')
+        harness.writeResults(fileName)
+        self.assertEqual(regression.loadResults(fileName), results)
+        report = StringIO.StringIO()
+        harness.writeReport(report, results)
+        self.assertEqual(len(report.getvalue().splitlines()), 4)
+
+    def test_compare(self):
+        harness = regression.PerformanceHarness(20, 2)
+        baseline = self.makeResults(2.0, 10.0)
+        harness.results = self.makeResults(2.1, 11.0)
+        self.assertEqual(harness.compare(baseline, 0.1, 0.2), [])
+        harness.results = self.makeResults(2.5, 11.0)
+        messages = harness.compare(baseline, 0.1, 0.2)
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith('Workload parse is 25.0% slower'))
+        self.assertEqual(harness.compare(baseline, 0.3, 0.2), [])
+        harness.results = self.makeResults(2.0, 13.0)
+        self.assertEqual(len(harness.compare(baseline, 0.1, 0.2)), 1)
+        # workloads that are not in the baseline are not compared
+        del baseline['workloads']['parse']
+        self.assertEqual(harness.compare(baseline, 0.1, 0.2), [])
+
+    def test_different_corpus(self):
+        harness = regression.PerformanceHarness(20, 2)
+        harness.results = self.makeResults(2.0, 10.0, 2000)
+        self.assertEqual(len(harness.compare(self.makeResults(2.0, 10.0), 0.1, 0.2)), 1)
+
+    def test_database_workload(self):
+        harness = regression.PerformanceHarness()
+        harness.setDatabaseWorkload(True)
+        harness.setDatabaseWorkload(True)
+        self.assertEqual(harness.getWorkloadNames(), ['parse', 'latest-turtle', 'editcount', 'dbstat'])
+        harness.setDatabaseWorkload(False)
+        self.assertEqual(harness.getWorkloadNames(), ['parse', 'latest-turtle', 'editcount'])
+
+
+if __name__ == '__main__':
+    unittest.main()
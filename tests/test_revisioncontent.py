@@ -0,0 +1,43 @@
+import cPickle as pickle
+import unittest
+from includes import revisioncontent, processinghelper
+
+
+class TestRevisionContent(unittest.TestCase):
+
+    LINE = '      <text xml:space="preserve">{&quot;label&quot;:{&quot;en&quot;:&quot;x&quot;}}</text>\n'
+
+    def makeContent(self):
+        return revisioncontent.RevisionContent(self.LINE, 33, len(self.LINE) - 8)
+
+    def test_text(self):
+        content = self.makeContent()
+        self.assertEqual(content.getRawText(), '{&quot;label&quot;:{&quot;en&quot;:&quot;x&quot;}}')
+        self.assertEqual(content.getText(), '{"label":{"en":"x"}}')
+        self.assertTrue(content.getText() is content.getText())
+        self.assertEqual(str(content), '{"label":{"en":"x"}}')
+
+    def test_data_is_shared(self):
+        content = self.makeContent()
+        self.assertEqual(content.getData(), {'label': {'en': 'x'}})
+        self.assertTrue(content.getData() is content.getData())
+        val = processinghelper.ProcessingHelper().getVal(5, content)
+        self.assertTrue(val is content.getData())
+        self.assertEqual(val['claims'], [])
+        self.assertTrue(processinghelper.ProcessingHelper().getVal(5, content) is val)
+        # strings as found in the dump can still be used
+        self.assertEqual(processinghelper.ProcessingHelper().getVal(5, content.getRawText()), val)
+
+    def test_pickle(self):
+        content = self.makeContent()
+        content.getData()
+        data = pickle.dumps(content, pickle.HIGHEST_PROTOCOL)
+        self.assertTrue(len(data) < len(self.LINE) + 100)
+        self.assertFalse('preserve' in data)
+        copy = pickle.loads(data)
+        self.assertEqual(copy.getRawText(), content.getRawText())
+        self.assertEqual(copy.getData(), {'label': {'en': 'x'}})
+
+
+if __name__ == '__main__':
+    unittest.main()
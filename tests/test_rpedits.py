@@ -0,0 +1,39 @@
+import urllib
+import unittest
+from includes import rpedits, processinghelper
+
+
+class TestEditCount(unittest.TestCase):
+
+    REVISIONS = [('1', '2013-05-01T10:00:00Z', 'Alice', False), ('2', '2013-05-01T11:00:00Z', 'Alice', False),
+                 ('3', '2013-05-01T12:00:00Z', '1.2.3.4', True), ('4', '2013-05-02T10:00:00Z', 'Alice', False),
+                 ('5', '2013-05-02T11:00:00Z', 'BotX', False), ('6', '2013-05-02T12:00:00Z', 'BotX', False),
+                 ('7', '2013-05-02T13:00:00Z', 'Alice', False)]
+
+    def makeProcessor(self):
+        def urlopen(url):
+            raise IOError('no network in tests')
+        original = urllib.urlopen
+        urllib.urlopen = urlopen
+        try:
+            processor = rpedits.RPEditCount(processinghelper.ProcessingHelper())
+        finally:
+            urllib.urlopen = original
+        processor.bots = ['BotX']
+        processor.startPageBlock('Q1', True, True)
+        return processor
+
+    def test_batch_counts_like_single_revisions(self):
+        single = self.makeProcessor()
+        for (revId, timestamp, user, isIp) in self.REVISIONS:
+            single.processRevision(revId, timestamp, user, isIp, None)
+        batch = self.makeProcessor()
+        columns = zip(*self.REVISIONS)
+        batch.processRevisionBatch(columns[0], columns[1], columns[2], columns[3], (None,) * len(self.REVISIONS))
+        self.assertEqual(batch.endParallelBatch(), single.endParallelBatch())
+        self.assertEqual((single.botTotal, single.humanTotal, single.anonTotal), (2, 4, 1))
+        self.assertEqual(single.editsByUser, {'AliceU': 4, 'BotXU': 2, '1.2.3.4I': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+from includes import timing
+
+
+class TestTimings(unittest.TestCase):
+
+    def test_add_and_merge(self):
+        timings = timing.Timings()
+        (wall, cpu) = timings.start()
+        timings.stop('a', wall, cpu, 3)
+        timings.add('a', 1, 2.0, 1.0)
+        other = timing.Timings()
+        other.add('a', 2, 1.0, 0.5)
+        other.add('b', 1, 0.25, 0.25)
+        timings.merge(other)
+        snapshot = timings.getSnapshot()
+        self.assertEqual(snapshot['a']['calls'], 6)
+        self.assertTrue(3.0 <= snapshot['a']['wallSeconds'] < 3.5)
+        self.assertTrue(1.5 <= snapshot['a']['cpuSeconds'] < 2.0)
+        self.assertEqual(snapshot['b'], {'calls': 1, 'wallSeconds': 0.25, 'cpuSeconds': 0.25})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,8 +8,11 @@
 # console).
 
 import includes.datafetcher as datafetcher
+import includes.checkpoint as checkpoint
 import includes.processdump as processdump
 import includes.processinghelper as processinghelper
+import includes.profiler as profiler
+import includes.logging as logging
 import includes.revisionprocessor as revisionprocessor
 import includes.rpedits as rpedit
 import os
@@ -21,11 +24,58 @@ parser.add_argument('--offline', dest='offlineMode', action='store_const',\
 		const=True, default=False,\
 		help='use only previously downloaded files (default: get most recent data)')
 
-args = parser.parse_args()
+parser.add_argument('--stubs', dest='stubs', action='store_const',\
+		const=True, default=False,\
+		help='use stub dumps, which contain all data needed for edit statistics but no revision texts, and are much smaller (default: use full dumps)')
 
+parser.add_argument('-w', '--workers', metavar='N', dest='workers', type=int, default=1,\
+		help='process pages with N parallel worker processes (default: 1)')
+parser.add_argument('--download-workers', metavar='N', dest='downloadWorkers', type=int, default=4,\
+		help='download dump files with N parallel connections; interrupted downloads are continued when started again (default: 4)')
+parser.add_argument('--decompression-workers', metavar='N', dest='decompressionWorkers', type=int, default=1,\
+		help='decompress dump files with N parallel worker processes (default: 1)')
+parser.add_argument('--prefetch', metavar='N', dest='prefetch', type=int, default=0,\
+		help='download and decompress the next N daily dumps in the background while one is processed (default: 0, download all dailies first)')
+parser.add_argument('--transcode', dest='transcode', action='store_const',\
+		const=True, default=False,\
+		help='after downloading, transcode dumps into block files that decompress much faster when they are processed again, e.g., with --offline (default: use the downloaded files only)')
+parser.add_argument('--bundles', dest='useBundles', action='store_const',\
+		const=True, default=False,\
+		help='process bundles of compacted dailies with all revisions instead of these dailies (see wda-compact-dailies.py) (default: process the dailies)')
+parser.add_argument('--scanner', dest='scanner', choices=['lines', 'buffers'], default='lines',\
+		help='read dumps line by line, or in large buffers, which is faster (default: lines)')
+parser.add_argument('--pipeline', dest='pipeline', action='store_const',\
+		const=True, default=False,\
+		help='decompress, parse and process dumps in three separate processes (default: all in one process)')
+parser.add_argument('--checkpoint', metavar='FILE', dest='checkpointFile', type=str, default=None,\
+		help='regularly save the state of processing to FILE, and continue from FILE if it exists (default: no checkpoints)')
+parser.add_argument('--checkpoint-interval', metavar='SECONDS', dest='checkpointInterval', type=int, default=900,\
+		help='minimal time between two checkpoints (default: 900)')
+parser.add_argument('--metrics', metavar='FILE', dest='metricsFile', type=str, default=None,\
+		help='measure the time needed by each processor, and regularly write these and other metrics to FILE as JSON (default: no metrics file)')
+parser.add_argument('--max-pages', metavar='N', dest='maxPages', type=int, default=None,\
+		help='stop after processing N pages of items and properties, e.g., for profiling (default: process all pages)')
+parser.add_argument('--profile', metavar='MODE', dest='profile', choices=['sample', 'trace'], default=None,\
+		help='profile the run by sampling the running code (low overhead) or by tracing all function calls (slow, use with --max-pages) (default: no profiling)')
+parser.add_argument('--profile-output', metavar='PREFIX', dest='profileOutput', type=str, default='results/profile',\
+		help='write the profile as folded stacks for flame graphs to PREFIX.folded and as a summary to PREFIX.txt; relative to the directory of this script (default: results/profile)')
+
+args = parser.parse_args()
+# Make the given paths absolute before changing the directory:
+if args.checkpointFile is not None:
+	args.checkpointFile = os.path.abspath(args.checkpointFile)
+if args.metricsFile is not None:
+	args.metricsFile = os.path.abspath(args.metricsFile)
 
 # Define which processing should happen on the data:
 dp = processdump.DumpProcessor()
+dp.setParallelWorkers(args.workers)
+dp.setScanner(args.scanner)
+dp.setPipeline(args.pipeline)
+if args.metricsFile is not None:
+	dp.setMetricsFile(args.metricsFile)
+if args.maxPages is not None:
+	dp.setMaxPages(args.maxPages)
 ph = processinghelper.ProcessingHelper() # Collects common helper functions for processing dumps
 
 dp.registerProcessor(revisionprocessor.RPStats()) # Gather basic statistics
@@ -34,8 +84,30 @@ dp.registerProcessor(rpedcount)
 #dp.registerProcessor(revisionprocessor.RPDebugLogger()) # Only for debugging
 
 # Iterate through all daily dumps, newest first:
-df = datafetcher.DataFetcher(args.offlineMode)
-df.processRecentDumps(dp)
+df = datafetcher.DataFetcher(args.offlineMode,False,args.stubs)
+df.setDownloadWorkers(args.downloadWorkers)
+df.setDecompressionWorkers(args.decompressionWorkers)
+df.setPrefetch(args.prefetch)
+df.setTranscode(args.transcode)
+df.setUseBundles(args.useBundles)
+if args.checkpointFile and args.maxPages is not None:
+	logging.log('*** Warning: checkpoints are not used when only some pages are processed.')
+	args.checkpointFile = None
+cp = None
+if args.checkpointFile:
+	cp = checkpoint.Checkpoint(args.checkpointFile,args.checkpointInterval)
+	cp.load(df.getDumpFileList())
+profile = None
+if args.profile is not None:
+	profileOutput = os.path.join(os.path.dirname(os.path.realpath(__file__)), args.profileOutput)
+	if not os.path.exists(os.path.dirname(profileOutput)):
+		os.makedirs(os.path.dirname(profileOutput))
+	profile = profiler.Profiler(args.profile)
+	profile.start()
+df.processRecentDumps(dp,cp)
+if profile is not None:
+	profile.stop()
+	profile.writeResults(profileOutput)
 
 ### For testing: just do one fixed daily (needs to be downloaded first if not recent)
 #file = df.getDailyFile("20130531")
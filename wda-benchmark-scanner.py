@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# This script compares the speed of the scanners of the
+# DumpProcessor (see DumpProcessor.setScanner()) on a
+# given MediaWiki dump file. The (decompressed) data is
+# loaded into memory first, so that only the time for
+# scanning is measured. The script also checks that all
+# scanners produce the same events.
+
+import includes.processdump as processdump
+import includes.revisionprocessor as revisionprocessor
+import includes.logging as logging
+import bz2, gzip, zlib, time, cStringIO
+import argparse
+
+# Revision processor that computes a checksum of all
+# events, used to compare the results of the scanners.
+class RPChecksum(revisionprocessor.RevisionProcessor):
+
+	def __init__(self):
+		self.checksum = 0
+
+	def startPageBlock(self,title,isItem,isNew):
+		self.checksum = zlib.crc32(title + str(isItem) + str(isNew), self.checksum)
+
+	def processRevision(self,revId,timestamp,user,isIp,rawContent):
+		self.checksum = zlib.crc32(revId + timestamp + user + str(isIp) + rawContent.getText(), self.checksum)
+
+	def endPageBlock(self):
+		self.checksum = zlib.crc32('end', self.checksum)
+
+parser = argparse.ArgumentParser(description='Compare the speed of the dump scanners on a MediaWiki dump file.')
+parser.add_argument('file', metavar='FILE', type=str,\
+		help='dump file to scan (.xml, .xml.bz2 or .xml.gz)')
+parser.add_argument('--max-mb', metavar='MB', dest='maxMb', type=int, default=500,\
+		help='only use the first MB megabytes of decompressed data (default: 500)')
+parser.add_argument('-r', '--repeat', metavar='N', dest='repeat', type=int, default=3,\
+		help='scan the data N times with each scanner and report the best time (default: 3)')
+args = parser.parse_args()
+
+if args.file.endswith('.bz2'):
+	file = bz2.BZ2File(args.file)
+elif args.file.endswith('.gz'):
+	file = gzip.open(args.file)
+else:
+	file = open(args.file)
+logging.log('Loading data from ' + args.file + ' ...')
+data = file.read(args.maxMb * 1024 * 1024)
+file.close()
+# Only use complete pages:
+end = data.rfind('\n  </page>\n')
+if end >= 0:
+	data = data[:end + 11]
+mb = len(data) / 1024.0 / 1024.0
+logging.log(' ... loaded ' + str(round(mb,2)) + ' MB.')
+
+results = {}
+for scanner in ('lines', 'buffers'):
+	bestTime = None
+	for i in range(args.repeat):
+		dp = processdump.DumpProcessor()
+		dp.setScanner(scanner)
+		rpchecksum = RPChecksum()
+		dp.registerProcessor(rpchecksum)
+		startTime = time.time()
+		dp.processFile(cStringIO.StringIO(data))
+		timeNeeded = time.time() - startTime
+		if bestTime is None or timeNeeded < bestTime:
+			bestTime = timeNeeded
+	results[scanner] = (bestTime, rpchecksum.checksum, dp.pagecount)
+
+print '\nScanner   Seconds      MB/s   Pages/s'
+for scanner in ('lines', 'buffers'):
+	(timeNeeded, checksum, pages) = results[scanner]
+	print '%-7s %9.2f %9.2f %9.0f' % (scanner, timeNeeded, mb / timeNeeded, pages / timeNeeded)
+print 'Speedup of buffers over lines: ' + str(round(results['lines'][0] / results['buffers'][0], 2))
+if results['lines'][1] != results['buffers'][1]:
+	print '*** Error: the scanners produced different events!'
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# This script measures the throughput of the main parts of
+# the processing (see includes/benchmark.py) on a synthetic
+# Wikidata dump, so that the effect of changes can be seen
+# without downloading real dumps. The dump only depends on
+# the given options, so results are reproducible. Instead,
+# an existing MediaWiki dump file can also be used.
+
+import includes.dumpgenerator as dumpgenerator
+import includes.benchmark as benchmark
+import includes.logging as logging
+import bz2, gzip, sys, cStringIO
+import argparse
+
+parser = argparse.ArgumentParser(description='Measure the throughput of dump processing on a synthetic or given dump.')
+parser.add_argument('-p', '--pages', metavar='N', dest='pages', type=int, default=2000,\
+		help='generate a dump with N pages (default: 2000)')
+parser.add_argument('--revisions', metavar='N', dest='revisions', type=int, default=3,\
+		help='generate N revisions per page (default: 3)')
+parser.add_argument('--seed', metavar='N', dest='seed', type=int, default=0,\
+		help='seed for generating the dump (default: 0)')
+parser.add_argument('--file', metavar='FILE', dest='file', type=str, default=None,\
+		help='use the given dump file (.xml, .xml.bz2 or .xml.gz) instead of generating one (default: generate a dump)')
+parser.add_argument('--save', metavar='FILE', dest='saveFile', type=str, default=None,\
+		help='also write the generated dump to FILE (default: keep it in memory only)')
+parser.add_argument('-r', '--repeat', metavar='N', dest='repeat', type=int, default=3,\
+		help='run each benchmark N times and report the best time (default: 3)')
+parser.add_argument('-b', '--benchmark', metavar='NAME', dest='benchmarks', action='append', default=None,\
+		help='only run the benchmark of the given name; can be given more than once (default: run all benchmarks)')
+args = parser.parse_args()
+
+if args.file is not None:
+	if args.file.endswith('.bz2'):
+		file = bz2.BZ2File(args.file)
+	elif args.file.endswith('.gz'):
+		file = gzip.open(args.file)
+	else:
+		file = open(args.file)
+	logging.log('Loading data from ' + args.file + ' ...')
+	data = file.read()
+	file.close()
+else:
+	logging.log('Generating dump with ' + str(args.pages) + ' pages and ' + str(args.revisions) + ' revisions per page ...')
+	output = cStringIO.StringIO()
+	dumpgenerator.DumpGenerator(args.pages, args.revisions, args.seed).writeDump(output)
+	data = output.getvalue()
+	if args.saveFile is not None:
+		file = open(args.saveFile, 'w')
+		file.write(data)
+		file.close()
+logging.log(' ... using ' + str(round(len(data) / 1024.0 / 1024.0, 2)) + ' MB of data.')
+
+bm = benchmark.Benchmark(data, args.repeat)
+if args.benchmarks is not None:
+	for name in args.benchmarks:
+		if name not in bm.getNames():
+			logging.log('*** Error: unknown benchmark "' + name + '"; known benchmarks are: ' + ', '.join(bm.getNames()))
+			exit(1)
+bm.run(args.benchmarks)
+
+print ''
+bm.writeReport(sys.stdout)
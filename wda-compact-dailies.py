@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# This script compacts the daily dumps that are newer than the
+# latest main dump into one bundle without duplicate revisions
+# (see includes/dailybundle.py). The other scripts process the
+# bundle instead of these dailies when called with --bundles.
+
+import includes.datafetcher as datafetcher
+import includes.logging as logging
+import os
+import argparse
+
+parser = argparse.ArgumentParser(description='Compact Wikidata daily dump files into one bundle.')
+parser.add_argument('--offline', dest='offlineMode', action='store_const',\
+		const=True, default=False,\
+		help='use only previously downloaded files (default: get most recent data)')
+parser.add_argument('--current', dest='useCurrent', action='store_const',\
+		const=True, default=False,\
+		help='compact the dailies that are newer than the main dump with only current revisions, as used by wda-export-data.py (default: newer than the main dump with all revisions)')
+parser.add_argument('--stubs', dest='stubs', action='store_const',\
+		const=True, default=False,\
+		help='compact the stub dailies, as used by wda-analyze-edits.py --stubs (default: compact full dailies)')
+parser.add_argument('--from', metavar='DATE', dest='fromDate', type=str, default=None,\
+		help='compact the dailies from DATE (YYYYMMDD) on (default: from the oldest daily that is newer than the main dump)')
+parser.add_argument('--to', metavar='DATE', dest='toDate', type=str, default=None,\
+		help='compact the dailies up to DATE (YYYYMMDD) (default: up to the newest daily)')
+parser.add_argument('--latest-only', dest='latestOnly', action='store_const',\
+		const=True, default=False,\
+		help='keep only the latest revision of every entity; such bundles are only used by exports, see wda-export-data.py --bundles (default: keep all revisions)')
+parser.add_argument('--download-workers', metavar='N', dest='downloadWorkers', type=int, default=4,\
+		help='download dump files with N parallel connections; interrupted downloads are continued when started again (default: 4)')
+args = parser.parse_args()
+
+os.chdir(os.path.dirname(os.path.realpath(__file__))) # change back into our base directory if needed
+
+df = datafetcher.DataFetcher(args.offlineMode,args.useCurrent,args.stubs)
+df.setDownloadWorkers(args.downloadWorkers)
+dirName = df.compactDailies(args.fromDate,args.toDate,args.latestOnly)
+if dirName is None:
+	logging.log('No bundle was made.')
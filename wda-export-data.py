@@ -8,13 +8,16 @@
 # console).
 
 import includes.datafetcher as datafetcher
+import includes.checkpoint as checkpoint
 import includes.processdump as processdump
+import includes.processjsondump as processjsondump
 import includes.processinghelper as processinghelper
+import includes.profiler as profiler
 import includes.logging as logging
 import includes.revisionprocessor as revisionprocessor
 import includes.rplatest
 import includes.epKbFileWriter, includes.epTurtleFileWriter, includes.entityDataFilter
-import os, gzip
+import os, re, gzip, time
 import argparse
 
 ## Process command line arguments:
@@ -39,10 +42,54 @@ parser.add_argument('--no-refs', dest='includeRefs', action='store_const',\
 parser.add_argument('--no-current', dest='useCurrent', action='store_const',\
 		const=False, default=True,\
 		help='work with dumps containing all revisions (default: use dumps that contain only current revisions)')
+parser.add_argument('-w', '--workers', metavar='N', dest='workers', type=int, default=1,\
+		help='process pages with N parallel worker processes (default: 1)')
+parser.add_argument('--download-workers', metavar='N', dest='downloadWorkers', type=int, default=4,\
+		help='download dump files with N parallel connections; interrupted downloads are continued when started again (default: 4)')
+parser.add_argument('--decompression-workers', metavar='N', dest='decompressionWorkers', type=int, default=1,\
+		help='decompress dump files with N parallel worker processes (default: 1)')
+parser.add_argument('--prefetch', metavar='N', dest='prefetch', type=int, default=0,\
+		help='download and decompress the next N daily dumps in the background while one is processed (default: 0, download all dailies first)')
+parser.add_argument('--transcode', dest='transcode', action='store_const',\
+		const=True, default=False,\
+		help='after downloading, transcode dumps into block files that decompress much faster when they are processed again, e.g., with --offline (default: use the downloaded files only)')
+parser.add_argument('--bundles', dest='useBundles', action='store_const',\
+		const=True, default=False,\
+		help='process bundles of compacted dailies, also with only the latest revisions, instead of these dailies (see wda-compact-dailies.py) (default: process the dailies)')
+parser.add_argument('--scanner', dest='scanner', choices=['lines', 'buffers'], default='lines',\
+		help='read dumps line by line, or in large buffers, which is faster (default: lines)')
+parser.add_argument('--pipeline', dest='pipeline', action='store_const',\
+		const=True, default=False,\
+		help='decompress, parse and process dumps in three separate processes (default: all in one process)')
+parser.add_argument('--checkpoint', metavar='FILE', dest='checkpointFile', type=str, default=None,\
+		help='regularly save the state of processing to FILE, and continue from FILE if it exists (default: no checkpoints)')
+parser.add_argument('--checkpoint-interval', metavar='SECONDS', dest='checkpointInterval', type=int, default=900,\
+		help='minimal time between two checkpoints (default: 900)')
+parser.add_argument('--metrics', metavar='FILE', dest='metricsFile', type=str, default=None,\
+		help='measure the time needed by each processor, and regularly write these and other metrics to FILE as JSON (default: no metrics file)')
+parser.add_argument('--max-pages', metavar='N', dest='maxPages', type=int, default=None,\
+		help='stop after processing N pages of items and properties, e.g., for profiling (default: process all pages)')
+parser.add_argument('--cache-entries', metavar='N', dest='cacheEntries', type=int, default=processinghelper.ProcessingHelper.CACHE_ENTRIES,\
+		help='keep up to N decoded revisions so that all exports decode each revision only once; 0 disables the cache (default: ' + str(processinghelper.ProcessingHelper.CACHE_ENTRIES) + ')')
+parser.add_argument('--cache-mb', metavar='MB', dest='cacheMb', type=int, default=processinghelper.ProcessingHelper.CACHE_BYTES / 1048576,\
+		help='keep decoded revisions only up to a total JSON size of MB megabytes (default: ' + str(processinghelper.ProcessingHelper.CACHE_BYTES / 1048576) + ')')
+parser.add_argument('--profile', metavar='MODE', dest='profile', choices=['sample', 'trace'], default=None,\
+		help='profile the run by sampling the running code (low overhead) or by tracing all function calls (slow, use with --max-pages) (default: no profiling)')
+parser.add_argument('--profile-output', metavar='PREFIX', dest='profileOutput', type=str, default='results/profile',\
+		help='write the profile as folded stacks for flame graphs to PREFIX.folded and as a summary to PREFIX.txt; relative to the directory of this script (default: results/profile)')
+parser.add_argument('--json-dump', metavar='FILE', dest='jsonDump', type=str, default=None,\
+		help='export the entities of the given Wikidata JSON dump (e.g., wikidata-20141103-all.json.gz) instead of downloading and processing the XML dumps (default: use XML dumps)')
 parser.add_argument('--max-date', metavar='YYYYMMDD', dest='maxDate', type=str, default=True,\
 		help='only consider dumps up to this date (default: consider all dumps up to now); note that older (daily) dumps may no longer be available online')
 
 args = parser.parse_args()
+# Make the given paths absolute before changing the directory:
+if args.jsonDump is not None:
+	args.jsonDump = os.path.abspath(args.jsonDump)
+if args.checkpointFile is not None:
+	args.checkpointFile = os.path.abspath(args.checkpointFile)
+if args.metricsFile is not None:
+	args.metricsFile = os.path.abspath(args.metricsFile)
 
 #print str(args.export)
 #exit(1)
@@ -53,14 +100,57 @@ if not os.path.exists('results') :
 	os.makedirs('results')
 
 ## Fetch and process data:
-df = datafetcher.DataFetcher(args.offlineMode,args.useCurrent)
-if args.maxDate != True:
-	df.setMaxDumpDate(args.maxDate)
-curdate = df.getLatestDate()
+if args.jsonDump is None:
+	df = datafetcher.DataFetcher(args.offlineMode,args.useCurrent)
+	df.setDownloadWorkers(args.downloadWorkers)
+	df.setDecompressionWorkers(args.decompressionWorkers)
+	df.setPrefetch(args.prefetch)
+	df.setTranscode(args.transcode)
+	df.setUseBundles(args.useBundles,True)
+	if args.maxDate != True:
+		df.setMaxDumpDate(args.maxDate)
+	curdate = df.getLatestDate()
+else:
+	# Name the results after the date of the JSON dump, if it has one
+	match = re.search('[0-9]{8}', os.path.basename(args.jsonDump))
+	curdate = match.group(0) if match else time.strftime('%Y%m%d')
+	if args.checkpointFile:
+		logging.log('*** Warning: checkpoints are not used for JSON dumps.')
+		args.checkpointFile = None
+	if args.maxPages is not None:
+		logging.log('*** Warning: --max-pages is not used for JSON dumps.')
+		args.maxPages = None
+	if args.metricsFile is not None:
+		logging.log('*** Warning: --metrics is not used for JSON dumps.')
+		args.metricsFile = None
+	if args.scanner != 'lines':
+		logging.log('*** Warning: --scanner is not used for JSON dumps.')
+	if args.pipeline:
+		logging.log('*** Warning: --pipeline is not used for JSON dumps.')
+
+# Output files are appended to when continuing from a checkpoint; the
+# processors then cut off anything written after the checkpoint.
+if args.checkpointFile and args.maxPages is not None:
+	logging.log('*** Warning: checkpoints are not used when only some pages are processed.')
+	args.checkpointFile = None
+cp = None
+outputMode = 'w'
+if args.checkpointFile:
+	cp = checkpoint.Checkpoint(args.checkpointFile,args.checkpointInterval)
+	if cp.load(df.getDumpFileList()):
+		outputMode = 'ab'
 
 # Define which processing should happen on the data:
 dp = processdump.DumpProcessor()
+dp.setParallelWorkers(args.workers)
+dp.setScanner(args.scanner)
+dp.setPipeline(args.pipeline)
+if args.metricsFile is not None:
+	dp.setMetricsFile(args.metricsFile)
+if args.maxPages is not None:
+	dp.setMaxPages(args.maxPages)
 ph = processinghelper.ProcessingHelper() # Collects common helper functions for processing dumps
+ph.setCacheLimits(args.cacheEntries,args.cacheMb * 1048576)
 
 dp.registerProcessor(revisionprocessor.RPStats()) # Gather basic statistics
 
@@ -81,7 +171,7 @@ for ef in args.export:
 			extraName = '-' + dataFilter.getHashCode()
 		filename = 'results/turtle-' + curdate + extraName + '.ttl.gz'
 		logging.log('Exporting Turtle to file ' + filename)
-		turtleFile = gzip.open(filename, 'w')
+		turtleFile = gzip.open(filename, outputMode)
 		epTurtle = includes.epTurtleFileWriter.EPTurtleFile(turtleFile,dataFilter)
 		rplatest.registerEntityProcessor(epTurtle)
 	elif ef == 'turtle-stats':
@@ -91,7 +181,7 @@ for ef in args.export:
 			extraName = '-' + dataFilter.getHashCode()
 		filename = 'results/turtle-' + curdate + '-statements' + extraName + '.ttl.gz'
 		logging.log('Exporting Turtle (statements only) to file ' + filename)
-		turtleFile = gzip.open(filename, 'w')
+		turtleFile = gzip.open(filename, outputMode)
 		epTurtle = includes.epTurtleFileWriter.EPTurtleFile(turtleFile,dataFilter)
 		rplatest.registerEntityProcessor(epTurtle)
 	elif ef == 'turtle-links':
@@ -101,7 +191,7 @@ for ef in args.export:
 			extraName = '-' + dataFilter.getHashCode()
 		filename = 'results/turtle-' + curdate + '-links' + extraName + '.ttl.gz'
 		logging.log('Exporting Turtle (links only) to file ' + filename)
-		turtleFile = gzip.open(filename, 'w')
+		turtleFile = gzip.open(filename, outputMode)
 		epTurtle = includes.epTurtleFileWriter.EPTurtleFile(turtleFile,dataFilter)
 		rplatest.registerEntityProcessor(epTurtle)
 	elif ef == 'turtle-labels':
@@ -111,14 +201,14 @@ for ef in args.export:
 			extraName = '-' + dataFilter.getHashCode()
 		filename = 'results/turtle-' + curdate + '-labels' + extraName + '.ttl.gz'
 		logging.log('Exporting Turtle (labels etc. only) to file ' + filename)
-		turtleFile = gzip.open(filename, 'w')
+		turtleFile = gzip.open(filename, outputMode)
 		epTurtle = includes.epTurtleFileWriter.EPTurtleFile(turtleFile,dataFilter)
 		rplatest.registerEntityProcessor(epTurtle)
 	elif ef == 'kb':
 		# TODO no support for filtering right now
 		filename = 'results/kb-' + curdate + '.txt.gz'
 		logging.log('Exporting KB format to file ' + filename)
-		kbFile = gzip.open(filename, 'w')
+		kbFile = gzip.open(filename, outputMode)
 		epKb = includes.epKbFileWriter.EPKbFile(kbFile)
 		rplatest.registerEntityProcessor(epKb)
 	else:
@@ -129,7 +219,25 @@ for ef in args.export:
 #dp.registerProcessor(revisionprocessor.RPDebugLogger()) # Only for debugging
 
 # Iterate through all dumps, newest first:
-df.processRecentDumps(dp)
+profile = None
+if args.profile is not None:
+	profileOutput = os.path.join(os.path.dirname(os.path.realpath(__file__)), args.profileOutput)
+	if not os.path.exists(os.path.dirname(profileOutput)):
+		os.makedirs(os.path.dirname(profileOutput))
+	profile = profiler.Profiler(args.profile)
+	profile.start()
+if args.jsonDump is None:
+	df.processRecentDumps(dp,cp)
+else:
+	jdp = processjsondump.JsonDumpProcessor()
+	jdp.setParallelWorkers(args.workers)
+	jdp.registerProcessor(rplatest)
+	jsonFile = processjsondump.openFile(args.jsonDump)
+	jdp.processFile(jsonFile)
+	jsonFile.close()
+if profile is not None:
+	profile.stop()
+	profile.writeResults(profileOutput)
 
 rplatest.close()
 
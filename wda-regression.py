@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# This script runs fixed workloads on a generated corpus
+# (see includes/regression.py) and compares their times and
+# peak memory to a baseline file, to find performance
+# regressions. The script fails (exit code 1) if there is a
+# regression. Times are compared relative to a calibration
+# workload, so the baseline can come from another machine.
+
+import includes.regression as regression
+import includes.logging as logging
+import os, sys
+import argparse
+
+parser = argparse.ArgumentParser(description='Compare the performance of fixed workloads to a baseline.')
+parser.add_argument('--baseline', metavar='FILE', dest='baselineFile', type=str, default='results/performance-baseline.json',\
+		help='baseline file to compare with; relative to the directory of this script (default: results/performance-baseline.json)')
+parser.add_argument('--update', dest='update', action='store_const',\
+		const=True, default=False,\
+		help='write the results to the baseline file instead of comparing them (default: compare)')
+parser.add_argument('-t', '--tolerance', metavar='PERCENT', dest='tolerance', type=float, default=10,\
+		help='report a regression if a workload is more than PERCENT percent slower than the baseline (default: 10)')
+parser.add_argument('--memory-tolerance', metavar='PERCENT', dest='memoryTolerance', type=float, default=20,\
+		help='report a regression if a workload needs more than PERCENT percent more memory than the baseline (default: 20)')
+parser.add_argument('-p', '--pages', metavar='N', dest='pages', type=int, default=2000,\
+		help='generate a corpus with N pages (default: 2000)')
+parser.add_argument('--revisions', metavar='N', dest='revisions', type=int, default=3,\
+		help='generate N revisions per page (default: 3)')
+parser.add_argument('--seed', metavar='N', dest='seed', type=int, default=0,\
+		help='seed for generating the corpus (default: 0)')
+parser.add_argument('-r', '--repeat', metavar='N', dest='repeat', type=int, default=3,\
+		help='run each workload N times and keep the best result (default: 3)')
+parser.add_argument('-w', '--workload', metavar='NAME', dest='workloads', action='append', default=None,\
+		help='only run the workload of the given name; can be given more than once (default: run all workloads)')
+parser.add_argument('--database', dest='database', action='store_const',\
+		const=True, default=False,\
+		help='also run the workload dbstat on the MySQL database of wda.ini; its tables are dropped and recreated (default: no database workload)')
+args = parser.parse_args()
+
+os.chdir(os.path.dirname(os.path.realpath(__file__))) # the database configuration and the baseline are found here
+
+harness = regression.PerformanceHarness(args.pages, args.revisions, args.seed, args.repeat)
+harness.setDatabaseWorkload(args.database)
+if args.workloads is not None:
+	for name in args.workloads:
+		if name not in harness.getWorkloadNames():
+			logging.log('*** Error: unknown workload "' + name + '"; known workloads are: ' + ', '.join(harness.getWorkloadNames()))
+			sys.exit(1)
+
+baseline = None
+if not args.update:
+	if not os.path.exists(args.baselineFile):
+		logging.log('*** Error: baseline file ' + args.baselineFile + ' not found; use --update to create it.')
+		sys.exit(1)
+	baseline = regression.loadResults(args.baselineFile)
+
+harness.run(args.workloads)
+
+print ''
+harness.writeReport(sys.stdout, baseline)
+print ''
+if args.update:
+	if not os.path.exists(os.path.dirname(os.path.abspath(args.baselineFile))):
+		os.makedirs(os.path.dirname(os.path.abspath(args.baselineFile)))
+	harness.writeResults(args.baselineFile)
+	logging.log('Wrote baseline to ' + args.baselineFile + '.')
+else:
+	regressions = harness.compare(baseline, args.tolerance / 100.0, args.memoryTolerance / 100.0)
+	for message in regressions:
+		logging.log('*** Regression: ' + message)
+	if regressions:
+		sys.exit(1)
+	logging.log('No regressions found.')